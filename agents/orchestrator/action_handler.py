@@ -1,241 +1,360 @@
 # agents/orchestrator/action_handler.py
 import json
-import boto3
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-# Initialize AWS clients
-lambda_client = boto3.client('lambda', region_name='us-east-1')
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
+from action_schema import ActionError, Dispatcher, project
+from threadher_common import clients, logs, metrics, resilience, warmup
 
+try:
+    from threadher_tools import carbon, circular, garment
+except ImportError:
+    # Older layer without the tools library - every tool call goes remote
+    carbon = circular = garment = None
+
+# Initialize AWS clients (created on first use unless CLIENT_INIT_MODE=primed)
+lambda_client = clients.client('lambda', region_name='us-east-1', config_options=resilience.client_config('lambda'))
+dynamodb = clients.resource('dynamodb', region_name='us-east-1')
+
+clients.init()
+
+# Warm-up opens a connection for each client, the in-process tools' included
+warm_clients = [lambda_client, dynamodb]
+if garment:
+    warm_clients += [garment.s3_client, garment.rekognition, garment.bedrock_runtime, garment.dynamodb]
+if carbon:
+    warm_clients += [carbon.dynamodb, carbon.s3]
+if circular:
+    warm_clients.append(circular.dynamodb)
+
+# Tool Lambdas write results, so remote calls are retried only when rejected, never hedged
+lambda_dependency = resilience.Dependency('lambda', idempotent=False)
+
+# Tools run in-process by default; TOOL_EXECUTION=remote restores the
+# synchronous Lambda invokes. With TOOL_REMOTE_FALLBACK a tool that
+# raises in-process is retried through its Lambda.
+TOOL_EXECUTION = os.environ.get('TOOL_EXECUTION', 'local').lower()
+TOOL_REMOTE_FALLBACK = os.environ.get('TOOL_REMOTE_FALLBACK', 'true').lower() == 'true'
+
+# Phase suffix per tool: tool_<name> in-process, invoke_<name> remote
+TOOL_PHASES = {
+    'ThreadHer-ImageAnalyzer': 'image_analyzer',
+    'ThreadHer-CarbonCalculator': 'carbon_calculator',
+    'ThreadHer-CircularOptions': 'circular_options'
+}
+
+# compact: the agent gets each action's x-agent-response fields from
+# tools-schema.json; full: the whole tool result
+ACTION_RESPONSE_PROJECTION = os.environ.get('ACTION_RESPONSE_PROJECTION', 'compact').lower()
+
+# Shared across warm invocations; /assess-garment runs the carbon
+# calculation and circular options side by side on it
+TOOL_POOL_SIZE = int(os.environ.get('TOOL_POOL_SIZE', 4))
+tool_pool = ThreadPoolExecutor(max_workers=TOOL_POOL_SIZE, thread_name_prefix='tool')
+
+logger = logs.get_logger('ActionHandler')
+
+# Parameter decoding and routing compiled from tools-schema.json
+actions = Dispatcher()
+
+@metrics.timed('ActionHandler')
 def lambda_handler(event, context):
     """
     Action handler for Bedrock Agent
     Routes requests to appropriate Lambda functions
     """
     
-    print(f"Received event from Bedrock Agent: {json.dumps(event)}")
+    if warmup.is_warmup_event(event):
+        return warmup.handle_warmup(event, 'ActionHandler', warm_clients)
+    
+    logger.start_invocation(context, metrics.current().correlation_id)
+    resilience.start(context, event)
+    logger.debug("Received event from Bedrock Agent", event=event)
+    
+    # Extract action information from Bedrock Agent event
+    action_group = event.get('actionGroup', '')
+    api_path = event.get('apiPath', '')
+    http_method = event.get('httpMethod', 'POST')
     
     try:
-        # Extract action information from Bedrock Agent event
-        agent = event.get('agent', '')
-        action_group = event.get('actionGroup', '')
-        api_path = event.get('apiPath', '')
-        http_method = event.get('httpMethod', 'POST')
-        request_body = event.get('requestBody', {})
-        
-        # Parse parameters from request body
-        parameters = {}
-        if 'content' in request_body:
-            for content_item in request_body['content'].values():
-                for prop in content_item:
-                    if 'properties' in prop:
-                        for param in prop['properties']:
-                            param_name = param.get('name', '')
-                            param_value = param.get('value', '')
-                            parameters[param_name] = param_value
-        
-        print(f"Action: {api_path}, Parameters: {parameters}")
-        
-        # Route to appropriate function
-        result = route_action(api_path, parameters)
+        metrics.current().set_property('Action', api_path)
+        result = route_action(api_path, event.get('requestBody', {}))
         
         # Return in Bedrock Agent format
-        response = {
-            "messageVersion": "1.0",
-            "response": {
-                "actionGroup": action_group,
-                "apiPath": api_path,
-                "httpMethod": http_method,
-                "httpStatusCode": 200,
-                "responseBody": {
-                    "application/json": {
-                        "body": json.dumps(result)
-                    }
-                }
-            }
-        }
+        response = agent_response(action_group, api_path, http_method, 200, result)
         
-        print(f"Returning response: {json.dumps(response)}")
+        logger.debug("Returning response", response=response)
         return response
         
+    except ActionError as e:
+        # Malformed call - the agent gets every problem back and can retry
+        logger.warning("Rejected action", api_path=api_path, problems=e.problems)
+        metrics.current().count('rejected_actions')
+        return agent_response(action_group, api_path, http_method, 400, {"error": str(e), "problems": e.problems})
+        
     except Exception as e:
-        print(f"Error in action handler: {str(e)}")
+        logger.exception("Error in action handler", api_path=api_path, error=str(e))
         
         # Return error in Bedrock Agent format
-        return {
-            "messageVersion": "1.0",
-            "response": {
-                "actionGroup": action_group,
-                "apiPath": api_path,
-                "httpMethod": http_method,
-                "httpStatusCode": 500,
-                "responseBody": {
-                    "application/json": {
-                        "body": json.dumps({
-                            "error": str(e)
-                        })
-                    }
+        return agent_response(action_group, api_path, http_method, 500, {"error": str(e)})
+
+
+def agent_response(action_group, api_path, http_method, status_code, body):
+    """Action group response in Bedrock Agent format"""
+    
+    return {
+        "messageVersion": "1.0",
+        "response": {
+            "actionGroup": action_group,
+            "apiPath": api_path,
+            "httpMethod": http_method,
+            "httpStatusCode": status_code,
+            "responseBody": {
+                "application/json": {
+                    "body": json.dumps(body)
                 }
             }
         }
+    }
 
 
-def route_action(api_path, parameters):
-    """Route to the appropriate action handler"""
+def route_action(api_path, request_body):
+    """Decode the call against its schema operation and dispatch it"""
     
-    if api_path == '/analyze-garment':
-        return analyze_garment(parameters)
+    route = actions.route(api_path)
+    if route is None:
+        return {"error": f"Unknown action: {api_path}"}
     
-    elif api_path == '/calculate-carbon':
-        return calculate_carbon(parameters)
+    # Raises ActionError before any tool runs
+    parameters = route.decode(request_body)
+    logger.info("Action", api_path=api_path, parameters=parameters)
     
-    elif api_path == '/get-circular-options':
-        return get_circular_options(parameters)
+    return route(parameters)
+
+
+def timing(route, params, call_next):
+    """Middleware: one phase per action, e.g. action_calculate_carbon"""
     
-    else:
-        return {"error": f"Unknown action: {api_path}"}
+    with metrics.phase('action' + route.api_path.replace('/', '_').replace('-', '_')):
+        return call_next(params)
+
 
+def projection(route, params, call_next):
+    """Middleware: reduce a result to the fields the agent needs; errors pass through"""
+    
+    result = call_next(params)
+    if route.projection is None or ACTION_RESPONSE_PROJECTION == 'full' or 'error' in result:
+        return result
+    
+    projected = project(result, route.projection)
+    
+    # What the agent would have re-read on every later turn, and what it reads now
+    timer = metrics.current()
+    timer.count('response_chars', len(json.dumps(result, default=str)))
+    timer.count('agent_response_chars', len(json.dumps(projected)))
+    return projected
 
+
+@actions.operation('analyzeGarment')
 def analyze_garment(params):
-    """Call the Image Analyzer Lambda"""
+    """Analyze a garment image (in-process, or through the Image Analyzer Lambda)"""
     
-    print(f"Calling ThreadHer-ImageAnalyzer with params: {params}")
+    logger.info("Analyzing garment", params=params, execution=TOOL_EXECUTION)
     
     try:
-        response = lambda_client.invoke(
-            FunctionName='ThreadHer-ImageAnalyzer',
-            InvocationType='RequestResponse',
-            Payload=json.dumps(params)
+        status_code, body = run_tool(
+            'ThreadHer-ImageAnalyzer',
+            garment.analyze if garment else None,
+            params,
+            params
         )
-        
-        result = json.loads(response['Payload'].read())
-        print(f"Image Analyzer response: {result}")
+        logger.debug("Image Analyzer response", status_code=status_code, body=body)
         
         # Parse the response
-        if result.get('statusCode') == 200:
-            body = json.loads(result['body'])
+        if status_code == 200:
             return body
         else:
             return {"error": "Image analysis failed"}
+    
+    except resilience.DependencyUnavailable as e:
+        return {"error": str(e), "degraded": True}
             
     except Exception as e:
-        print(f"Error calling Image Analyzer: {e}")
+        logger.warning("Error calling Image Analyzer", error=str(e))
         return {"error": str(e)}
 
 
+@actions.operation('calculateCarbon')
 def calculate_carbon(params):
-    """Call the Carbon Calculator Lambda"""
+    """Calculate the carbon footprint (in-process, or through the Carbon Calculator Lambda)"""
     
-    print(f"Calling ThreadHer-CarbonCalculator with params: {params}")
+    logger.info("Calculating carbon", params=params, execution=TOOL_EXECUTION)
     
     try:
-        # Format for Carbon Calculator
-        payload = {
-            "body": json.dumps(params)
-        }
-        
-        response = lambda_client.invoke(
-            FunctionName='ThreadHer-CarbonCalculator',
-            InvocationType='RequestResponse',
-            Payload=json.dumps(payload)
+        status_code, body = run_tool(
+            'ThreadHer-CarbonCalculator',
+            carbon.calculate if carbon else None,
+            params,
+            {"body": json.dumps(params)}  # Format for Carbon Calculator
         )
+        logger.debug("Carbon Calculator response", status_code=status_code, body=body)
         
-        result = json.loads(response['Payload'].read())
-        print(f"Carbon Calculator response: {result}")
-        
-        if result.get('statusCode') == 200:
-            body = json.loads(result['body'])
+        if status_code == 200:
             return body
         else:
             return {"error": "Carbon calculation failed"}
+    
+    except resilience.DependencyUnavailable as e:
+        return {"error": str(e), "degraded": True}
             
     except Exception as e:
-        print(f"Error calling Carbon Calculator: {e}")
+        logger.warning("Error calling Carbon Calculator", error=str(e))
         return {"error": str(e)}
 
 
+@actions.operation('assessGarment')
+def assess_garment(params):
+    """
+    Analyze the image, then calculate carbon and circular options concurrently
+    One tool round trip for the agent instead of three
+    """
+    
+    analyzed = analyze_garment(params)
+    if 'error' in analyzed:
+        return analyzed
+    
+    analysis = analyzed.get('analysis', {})
+    
+    # The agent's own values win over what the image analysis found
+    carbon_params = {
+        "garment_type": params.get('garment_type') or tool_key(analysis.get('garment_type'), ''),
+        "material": params.get('material') or tool_key(analysis.get('material'), '_'),
+        "origin": params.get('origin', 'unknown'),
+        "estimated_age_years": params.get('estimated_age_years') or age_in_years(analysis.get('claude_analysis', {}).get('estimated_age'))
+    }
+    circular_params = {
+        "garment_type": params.get('garment_type') or analysis.get('garment_type', ''),
+        "condition": params.get('condition') or analysis.get('condition', ''),
+        "user_location": params.get('user_location') or 'US'
+    }
+    
+    carbon_result = submit(calculate_carbon, carbon_params)
+    circular_result = submit(get_circular_options, circular_params)
+    
+    return {
+        "garment_id": analyzed.get('garment_id'),
+        "analysis": analysis,
+        "carbon": result_in_time(carbon_result, 'carbon calculation'),
+        "circular": result_in_time(circular_result, 'circular options')
+    }
+
+
+def submit(fn, *args):
+    """Run fn on the tool pool with this invocation's metrics timer, log ids and deadline"""
+    
+    return resilience.submit(tool_pool, fn, *args)
+
+
+def result_in_time(future, step):
+    """A fan-out step's result, or a degraded error once the deadline passes"""
+    
+    remaining = resilience.remaining_ms()
+    try:
+        return future.result(timeout=None if remaining is None else max(0, remaining) / 1000)
+    except TimeoutError:
+        logger.warning("Step ran out of time", step=step)
+        return {"error": f"{step} timed out", "degraded": True}
+
+
+def tool_key(value, separator):
+    """'T-Shirt' -> 'tshirt', 'Organic Cotton' -> 'organic_cotton' (the carbon table keys)"""
+    return re.sub(r'[\s-]+', separator, (value or '').strip().lower())
+
+
+def age_in_years(estimated_age):
+    """First number in the analyzer's age estimate ('1-2 years' -> 1), else 0"""
+    match = re.search(r'\d+(\.\d+)?', str(estimated_age or ''))
+    return float(match.group()) if match else 0
+
+
+def run_tool(function_name, local_tool, params, payload):
+    """
+    Run a tool and return its (status_code, body)
+    In-process through the tools library unless TOOL_EXECUTION=remote or
+    the library is missing; the Lambda gets payload, the library params
+    """
+    phase = TOOL_PHASES[function_name]
+    
+    if local_tool and TOOL_EXECUTION != 'remote':
+        try:
+            with metrics.phase(f"tool_{phase}"):
+                return local_tool(params)
+        except Exception as e:
+            # A dependency that is down for the library is down for its Lambda too
+            if not TOOL_REMOTE_FALLBACK or isinstance(e, resilience.DependencyUnavailable):
+                raise
+            logger.warning("In-process tool failed, invoking its Lambda", function=function_name, error=str(e))
+    
+    # The tool gets what is left of this invocation's deadline
+    payload = resilience.propagate(dict(payload, correlation_id=metrics.current().correlation_id))
+    
+    with metrics.phase(f"invoke_{phase}"):
+        result = lambda_dependency.call(invoke_lambda, function_name, payload)
+    
+    body = result.get('body')
+    return result.get('statusCode'), json.loads(body) if isinstance(body, str) else body
+
+
+def invoke_lambda(function_name, payload):
+    """Synchronous Lambda invoke, returning the decoded response payload"""
+    
+    response = lambda_client.invoke(
+        FunctionName=function_name,
+        InvocationType='RequestResponse',
+        Payload=json.dumps(payload)
+    )
+    return json.loads(response['Payload'].read())
+
+
+@actions.operation('getCircularOptions')
 def get_circular_options(params):
-    """Provide circular economy options"""
-    
-    garment_type = params.get('garment_type', '')
-    condition = params.get('condition', '').lower()
-    location = params.get('user_location', 'unknown')
-    
-    options = []
-    
-    # Based on condition, suggest options
-    if condition in ['damaged', 'worn', 'fair']:
-        options.append({
-            "option": "Repair",
-            "description": f"Find a local tailor to repair your {garment_type}",
-            "estimated_cost": "$15-40",
-            "environmental_benefit": "Extends garment life, saves carbon from producing new item",
-            "resources": [
-                "Search 'clothing repair near me'",
-                "Check if brand offers repair services"
-            ]
-        })
-        
-        options.append({
-            "option": "Upcycle",
-            "description": f"Transform your {garment_type} into something new",
-            "estimated_cost": "$0-20",
-            "environmental_benefit": "Creative reuse, prevents textile waste",
-            "resources": [
-                f"YouTube: 'upcycle {garment_type}'",
-                "Local craft workshops"
-            ]
-        })
-        
-        options.append({
-            "option": "Recycle",
-            "description": "Textile recycling to create new materials",
-            "estimated_cost": "$0",
-            "environmental_benefit": "Prevents landfill waste, materials recovery",
-            "resources": [
-                "H&M Garment Collecting program",
-                "The North Face Clothes The Loop",
-                "Local textile recycling centers"
-            ]
-        })
-        
-    elif condition in ['good', 'new']:
-        options.append({
-            "option": "Resell",
-            "description": f"Sell your {garment_type} on secondhand marketplace",
-            "estimated_value": "$20-100",
-            "environmental_benefit": "Extends product life, reduces new production demand",
-            "platforms": [
-                "Poshmark",
-                "ThredUp",
-                "Depop",
-                "Vestiaire Collective",
-                "Facebook Marketplace"
-            ]
-        })
-        
-        options.append({
-            "option": "Donate",
-            "description": "Give to someone who needs it",
-            "estimated_cost": "$0",
-            "environmental_benefit": "Helps others, keeps clothing in use",
-            "resources": [
-                "Goodwill",
-                "The Salvation Army",
-                "Local homeless shelters",
-                "Dress for Success"
-            ]
-        })
+    """Provide circular economy options (in-process, or through the Circular Options Lambda)"""
+    
+    logger.info("Getting circular options", params=params, execution=TOOL_EXECUTION)
+    
+    try:
+        status_code, body = run_tool(
+            'ThreadHer-CircularOptions',
+            render_circular_options if circular else None,
+            params,
+            {"body": json.dumps(params)}  # Format for Circular Options
+        )
+        logger.debug("Circular Options response", status_code=status_code, body=body)
         
-        options.append({
-            "option": "Keep Wearing",
-            "description": f"Your {garment_type} is in good condition - keep using it!",
-            "environmental_benefit": "Most sustainable choice is to use what you have",
-            "tip": "Each additional year of use significantly reduces environmental impact"
-        })
+        if status_code == 200:
+            return body
+        else:
+            return {"error": "Circular options failed"}
     
-    return {
-        "circular_options": options,
-        "recommended_action": options[0]["option"] if options else "Keep wearing",
-        "location_note": f"Options available in your area: {location}" if location != 'unknown' else None
-    }
\ No newline at end of file
+    except resilience.DependencyUnavailable as e:
+        return {"error": str(e), "degraded": True}
+            
+    except Exception as e:
+        logger.warning("Error calling Circular Options", error=str(e))
+        return {"error": str(e)}
+
+
+def render_circular_options(params):
+    """The Circular Options Lambda's pre-rendered body, decoded for projection"""
+    
+    status_code, body = circular.render_options(params)
+    return status_code, json.loads(body) if isinstance(body, bytes) else body
+
+
+actions.use(timing)
+actions.use(projection)
+
+for operation_id in actions.unbound():
+    logger.warning("Schema operation has no handler", operation_id=operation_id)
\ No newline at end of file
@@ -0,0 +1,258 @@
+# agents/orchestrator/action_schema.py
+"""
+Action group decoding and dispatch, compiled from tools-schema.json
+
+The OpenAPI schema the agent is configured with is read once at import.
+Every operation becomes a Route holding one decoder per request body
+property, so a call is typed and validated in a single pass before any
+tool runs:
+
+    string           str (stripped)
+    number           float
+    integer          int
+    boolean          true/false, yes/no, 1/0
+    array / object   JSON text
+
+Bedrock sends each property as {"name", "type", "value"} with the value
+as text. Properties the schema does not declare are dropped. Missing or
+empty required properties and values that do not parse reject the call
+with an ActionError listing every problem.
+
+An operation may declare "x-agent-response": {output key: "dotted.path"}.
+project() reduces a handler result to those fields, flat, with floats
+rounded and empty values dropped - what the agent reads back on every
+later turn, while the full record stays in storage. A part may keep the
+first items of a list ("options[:3]"), and the parts after a list apply
+to each item ("options[:3].name" -> the first three names).
+
+Handlers are bound by operationId and run through a middleware chain.
+A middleware is called as middleware(route, params, call_next) and can
+time, cache or short-circuit the call:
+
+    actions = Dispatcher()
+    
+    @actions.operation('calculateCarbon')
+    def calculate_carbon(params): ...
+    
+    actions.use(timing)                        # every route
+    actions.use(cache, ['calculateCarbon'])    # one route
+"""
+import json
+import math
+import os
+import re
+
+SCHEMA_PATH = os.environ.get(
+    'TOOLS_SCHEMA_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tools-schema.json')
+)
+
+# Decimal places kept in projected responses
+FLOAT_DIGITS = 2
+
+# "name" or "name[:3]" in an x-agent-response path
+PATH_PART = re.compile(r'(?P<name>[^\[\]]+)(?:\[:(?P<limit>\d+)\])?')
+
+TRUE_VALUES = {'true', 'yes', '1'}
+FALSE_VALUES = {'false', 'no', '0'}
+
+class ActionError(Exception):
+    """A malformed action call - answered with a 400 before any tool runs"""
+    
+    def __init__(self, api_path, problems):
+        super().__init__(f"Invalid call to {api_path}: {'; '.join(problems)}")
+        self.api_path = api_path
+        self.problems = problems
+
+def decode_string(value):
+    return value.strip() if isinstance(value, str) else json.dumps(value)
+
+def decode_number(value):
+    if isinstance(value, bool):
+        raise ValueError('expected a number')
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError('expected a finite number')
+    return number
+
+def decode_integer(value):
+    number = decode_number(value)
+    if not number.is_integer():
+        raise ValueError('expected an integer')
+    return int(number)
+
+def decode_boolean(value):
+    if isinstance(value, bool):
+        return value
+    text = str(value).strip().lower()
+    if text in TRUE_VALUES:
+        return True
+    if text in FALSE_VALUES:
+        return False
+    raise ValueError('expected true or false')
+
+def json_decoder(kind):
+    def decode(value):
+        if isinstance(value, str):
+            value = json.loads(value)
+        if not isinstance(value, kind):
+            raise ValueError(f"expected a JSON {'array' if kind is list else 'object'}")
+        return value
+    return decode
+
+DECODERS = {
+    'string': decode_string,
+    'number': decode_number,
+    'integer': decode_integer,
+    'boolean': decode_boolean,
+    'array': json_decoder(list),
+    'object': json_decoder(dict)
+}
+
+def raw_properties(request_body):
+    """{name: value} from a Bedrock requestBody, whichever content shape it uses"""
+    raw = {}
+    for content_item in (request_body or {}).get('content', {}).values():
+        # Bedrock sends {"properties": [...]} per content type
+        items = content_item if isinstance(content_item, list) else [content_item]
+        for item in items:
+            for prop in item.get('properties', []):
+                raw[prop.get('name', '')] = prop.get('value', '')
+    return raw
+
+def is_empty(value):
+    return value is None or (isinstance(value, (str, list, dict)) and not value)
+
+def compact(value):
+    """Round floats and drop empty values, recursively"""
+    if isinstance(value, float):
+        return round(value, FLOAT_DIGITS)
+    if isinstance(value, dict):
+        return {k: compact(v) for k, v in value.items() if not is_empty(v)}
+    if isinstance(value, list):
+        return [compact(v) for v in value]
+    return value
+
+def project(result, projection):
+    """The projected fields of a result; paths that are missing are left out"""
+    projected = {}
+    for key, path in projection:
+        value = resolve(result, path)
+        if not is_empty(value):
+            projected[key] = compact(value)
+    return projected
+
+def resolve(value, path):
+    """The value at path parts [(name, limit)] - mapped over the items of a list"""
+    for index, (name, limit) in enumerate(path):
+        if isinstance(value, list):
+            return [item for item in (resolve(v, path[index:]) for v in value) if not is_empty(item)]
+        value = value.get(name) if isinstance(value, dict) else None
+        if limit is not None and isinstance(value, list):
+            value = value[:limit]
+    return value
+
+def parse_path(path):
+    """'a.b[:3].c' -> (('a', None), ('b', 3), ('c', None))"""
+    parts = []
+    for part in path.split('.'):
+        match = PATH_PART.fullmatch(part)
+        if match is None:
+            raise ValueError(f"bad x-agent-response path: {path}")
+        limit = match.group('limit')
+        parts.append((match.group('name'), int(limit) if limit else None))
+    return tuple(parts)
+
+class Route:
+    """One schema operation: its decoders, handler and middleware chain"""
+    
+    def __init__(self, api_path, operation_id, schema, projection=None):
+        self.api_path = api_path
+        self.operation_id = operation_id
+        # [(output key, ((part, list limit), ...))], or None to return results as they are
+        self.projection = [(key, parse_path(path)) for key, path in projection.items()] if projection else None
+        self.required = tuple(schema.get('required', []))
+        self.decoders = {
+            name: (spec.get('type', 'string'), DECODERS.get(spec.get('type'), decode_string))
+            for name, spec in schema.get('properties', {}).items()
+        }
+        self.handler = None
+        self.middleware = []
+        self._chain = None
+    
+    def decode(self, request_body):
+        """Typed parameters for this operation, or ActionError"""
+        raw = raw_properties(request_body)
+        params = {}
+        problems = []
+        
+        for name, (type_name, decoder) in self.decoders.items():
+            value = raw.get(name)
+            if value is None or value == '':
+                if name in self.required:
+                    problems.append(f"{name} is required")
+                continue
+            try:
+                params[name] = decoder(value)
+            except (ValueError, TypeError) as e:
+                problems.append(f"{name} must be {type_name} ({e})")
+        
+        if problems:
+            raise ActionError(self.api_path, problems)
+        return params
+    
+    def __call__(self, params):
+        if self._chain is None:
+            self._chain = self._build_chain()
+        return self._chain(params)
+    
+    def _build_chain(self):
+        call = self.handler
+        for middleware in reversed(self.middleware):
+            call = self._wrap(middleware, call)
+        return call
+    
+    def _wrap(self, middleware, call_next):
+        return lambda params: middleware(self, params, call_next)
+
+class Dispatcher:
+    """Routes by apiPath, compiled once from the OpenAPI schema"""
+    
+    def __init__(self, schema_path=SCHEMA_PATH):
+        with open(schema_path) as f:
+            schema = json.load(f)
+        
+        self.routes = {}
+        self.operations = {}
+        for api_path, methods in schema.get('paths', {}).items():
+            for operation in methods.values():
+                content = (operation.get('requestBody') or {}).get('content', {})
+                body_schema = (content.get('application/json') or {}).get('schema', {})
+                route = Route(api_path, operation['operationId'], body_schema, operation.get('x-agent-response'))
+                self.routes[api_path] = route
+                self.operations[route.operation_id] = route
+    
+    def operation(self, operation_id):
+        """Decorator binding a handler to a schema operationId"""
+        def bind(handler):
+            route = self.operations[operation_id]
+            route.handler = handler
+            route._chain = None
+            return handler
+        return bind
+    
+    def use(self, middleware, operation_ids=None):
+        """Add a middleware to the given operations (every operation by default)"""
+        for operation_id in operation_ids or self.operations:
+            route = self.operations[operation_id]
+            route.middleware.append(middleware)
+            route._chain = None
+    
+    def route(self, api_path):
+        """The bound Route for an apiPath, or None"""
+        route = self.routes.get(api_path)
+        return route if route and route.handler else None
+    
+    def unbound(self):
+        """Schema operations with no handler - reported at import"""
+        return [r.operation_id for r in self.operations.values() if r.handler is None]
\ No newline at end of file
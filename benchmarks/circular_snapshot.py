@@ -0,0 +1,85 @@
+# benchmarks/circular_snapshot.py
+"""
+Per-call cost of the circular options tool: built vs pre-rendered bodies
+
+Runs both paths of threadher_tools.circular over every condition branch,
+garment type and location bucket, each with the Lambda's own
+http_response, and reports microseconds per call:
+
+    build      get_options - build the dicts, then json.dumps
+    snapshot   render_options - snapshot lookup, splice the volatile fields
+
+Before timing, every combination is checked to render the same bytes as
+json.dumps of the built body (with the same timestamp). Logging and usage
+counting are switched off so only the response work is measured.
+
+Usage:
+    python benchmarks/circular_snapshot.py
+    python benchmarks/circular_snapshot.py --calls 200000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from init_duration import LAYER_PATH
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ['LOG_LEVEL'] = 'ERROR'
+os.environ['COUNTERS_ENABLED'] = 'false'
+sys.path.insert(0, LAYER_PATH)
+
+from threadher_tools import circular, http_response
+
+EVENTS = [
+    {'garment_type': garment_type, 'condition': condition, 'user_location': location}
+    for garment_type in ('T-shirt', 'Skinny jeans', 'dress', 'Sneakers', 'Denim jacket', 'kimono')
+    for condition in ('Excellent', 'good', 'fair', 'damaged', 'poor')
+    for location in ('US', 'DE', 'São Paulo "centro"', '40.7128,-74.0060')
+]
+
+def check():
+    """Every snapshot renders what json.dumps makes of the built body"""
+    for event in EVENTS:
+        _, built = circular.get_options(event)
+        garment_type, condition, user_location, _ = circular.options_parameters(event)
+        nearby = built['circular_options'].get('nearby_services')
+        rendered, _ = circular.SNAPSHOTS[circular.snapshot_key(garment_type, condition, user_location, nearby)]
+        body = rendered.render(
+            garment_type=garment_type,
+            condition=condition,
+            user_location=user_location,
+            nearby=nearby,
+            generated_at=built['generated_at']
+        )
+        if body != json.dumps(built).encode('utf-8'):
+            raise SystemExit(f"snapshot differs for {event}")
+
+def per_call_us(tool, calls):
+    started = time.perf_counter()
+    for i in range(calls):
+        status_code, body = tool(EVENTS[i % len(EVENTS)])
+        http_response(status_code, body)
+    return (time.perf_counter() - started) / calls * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare built and pre-rendered circular options responses')
+    parser.add_argument('--calls', type=int, default=50000)
+    args = parser.parse_args()
+
+    check()
+    # One warm-up pass each, then the measured runs
+    per_call_us(circular.get_options, len(EVENTS))
+    per_call_us(circular.render_options, len(EVENTS))
+    build_us = per_call_us(circular.get_options, args.calls)
+    snapshot_us = per_call_us(circular.render_options, args.calls)
+
+    print(f"{len(circular.SNAPSHOTS)} snapshots, {len(EVENTS)} event shapes, {args.calls} calls each")
+    print(f"{'path':<10} {'us/call':>8}")
+    print(f"{'build':<10} {build_us:>8.2f}")
+    print(f"{'snapshot':<10} {snapshot_us:>8.2f}")
+    print(f"speedup    {build_us / snapshot_us:>7.1f}x")
+
+if __name__ == '__main__':
+    main()
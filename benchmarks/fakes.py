@@ -0,0 +1,300 @@
+# benchmarks/fakes.py
+"""
+In-memory stand-ins for the AWS clients the handlers use
+
+Every fake answers the calls the handlers make with realistic payloads
+and can sleep a configurable number of milliseconds per call, so replay
+runs measure either pure handler CPU (latency 0) or a service profile.
+
+install() swaps them into the threadher_common client registry, which
+covers every client a handler module (and its helpers) declared, without
+ever building a boto3 client.
+"""
+import io
+import json
+import re
+import time
+import uuid
+
+# Per-service latency profile used with --latency realistic
+REALISTIC_LATENCY_MS = {
+    's3': 25,
+    'rekognition': 250,
+    'bedrock-runtime': 2500,
+    'bedrock-agent-runtime': 150,
+    'lambda': 40,
+    'dynamodb': 8
+}
+
+class Service:
+    """Base fake: one sleep per call, plus a call counter"""
+
+    service = None
+
+    def __init__(self, latency_ms=0):
+        self.latency_ms = latency_ms
+        self.calls = 0
+
+    def wait(self, latency_ms=None):
+        self.calls += 1
+        delay = self.latency_ms if latency_ms is None else latency_ms
+        if delay:
+            time.sleep(delay / 1000)
+
+class FakeS3(Service):
+    service = 's3'
+    IMAGE = b'\xff\xd8\xff\xe0' + bytes(range(256)) * 64  # ~16 KB "jpeg"
+
+    def get_object(self, Bucket, Key):
+        self.wait()
+        return {'Body': io.BytesIO(self.IMAGE), 'ContentLength': len(self.IMAGE)}
+
+    def head_object(self, Bucket, Key):
+        self.wait()
+        # Content keys ending in 0 "already exist" - exercises both branches
+        if Key.rsplit('.', 1)[0].endswith('0'):
+            return {'ContentLength': len(self.IMAGE)}
+        from botocore.exceptions import ClientError
+        raise ClientError({'Error': {'Code': '404', 'Message': 'Not Found'}}, 'HeadObject')
+
+    def list_objects_v2(self, Bucket, Prefix='', ContinuationToken=None, **kwargs):
+        self.wait()
+        # Every prefix holds a few images and one non-image, two keys per page
+        keys = [f"{Prefix}{i:03d}.jpg" for i in range(5)] + [f"{Prefix}notes.txt"]
+        start = int(ContinuationToken or 0)
+        page = {'Contents': [{'Key': key, 'Size': len(self.IMAGE)} for key in keys[start:start + 2]], 'IsTruncated': start + 2 < len(keys)}
+        if page['IsTruncated']:
+            page['NextContinuationToken'] = str(start + 2)
+        return page
+
+    def generate_presigned_url(self, ClientMethod, Params=None, ExpiresIn=3600, **kwargs):
+        # Presigning is local signing work, not a network call
+        key = (Params or {}).get('Key', '')
+        return f"https://bucket.s3.amazonaws.com/{key}?X-Amz-Signature={uuid.uuid4().hex}"
+
+    def create_multipart_upload(self, **kwargs):
+        self.wait()
+        return {'UploadId': uuid.uuid4().hex}
+
+    def complete_multipart_upload(self, **kwargs):
+        self.wait()
+        return {}
+
+    def abort_multipart_upload(self, **kwargs):
+        self.wait()
+        return {}
+
+class FakeRekognition(Service):
+    service = 'rekognition'
+
+    def detect_labels(self, **kwargs):
+        self.wait()
+        return {'Labels': [
+            {'Name': name, 'Confidence': confidence}
+            for name, confidence in [('Clothing', 99.8), ('Apparel', 99.8), ('T-Shirt', 97.2), ('Sleeve', 92.4), ('Cotton', 71.0)]
+        ]}
+
+class FakeBedrockRuntime(Service):
+    service = 'bedrock-runtime'
+    ANALYSIS = {
+        'garment_type': 't-shirt',
+        'material': 'cotton',
+        'condition': 'good',
+        'style_category': 'casual',
+        'estimated_age': '1-2 years',
+        'brand_visible': False
+    }
+
+    def invoke_model(self, **kwargs):
+        self.wait()
+        payload = {'content': [{'type': 'text', 'text': json.dumps(self.ANALYSIS)}],
+                   'usage': {'input_tokens': 1600, 'output_tokens': 120}}
+        return {'body': io.BytesIO(json.dumps(payload).encode('utf-8'))}
+
+class FakeBedrockAgent(Service):
+    service = 'bedrock-agent-runtime'
+    ANSWER = (
+        "A cotton t-shirt has a carbon footprint of about 7 kg CO2e. Keeping it "
+        "for two more years is the most sustainable choice - wash it cold, air dry "
+        "it, and repair small holes early. If it no longer fits, resell or donate it."
+    )
+
+    def __init__(self, latency_ms=0, chunk_count=12):
+        super().__init__(latency_ms)
+        self.chunk_count = chunk_count
+
+    def invoke_agent(self, **kwargs):
+        self.wait()
+        return {'completion': self._completion(kwargs.get('enableTrace')), 'sessionId': kwargs.get('sessionId')}
+
+    def _completion(self, trace):
+        if trace:
+            for step in range(2):
+                trace_id = f"trace-{step}"
+                yield {'trace': {'trace': {'orchestrationTrace': {
+                    'modelInvocationOutput': {'traceId': trace_id, 'metadata': {'usage': {'inputTokens': 900, 'outputTokens': 80}}}
+                }}}}
+                yield {'trace': {'trace': {'orchestrationTrace': {
+                    'invocationInput': {'traceId': trace_id, 'actionGroupInvocationInput': {'apiPath': '/calculate-carbon'}}
+                }}}}
+
+        words = self.ANSWER.split(' ')
+        size = max(1, len(words) // self.chunk_count)
+        for start in range(0, len(words), size):
+            # Chunks trickle in - spread the latency over them
+            if self.latency_ms:
+                time.sleep(self.latency_ms / 1000 / self.chunk_count)
+            yield {'chunk': {'bytes': (' '.join(words[start:start + size]) + ' ').encode('utf-8')}}
+
+class FakeLambda(Service):
+    """Answers the action handler's tool invocations with canned tool responses"""
+
+    service = 'lambda'
+    RESPONSES = {
+        'ThreadHer-ImageAnalyzer': {'garment_id': 'g-1', 'analysis': dict(FakeBedrockRuntime.ANALYSIS, garment_id='g-1')},
+        'ThreadHer-CarbonCalculator': {
+            'total_carbon_footprint_kg': 7.0, 'carbon_per_year_kg': 3.5, 'potential_savings_kg': 7.0,
+            'remaining_recommended_years': 2, 'sustainability_score': 72, 'garment_type': 'tshirt', 'material': 'cotton'
+        },
+        'ThreadHer-CircularOptions': {
+            'garment_type': 'tshirt', 'condition': 'good',
+            'circular_options': {'recommended_action': 'resale', 'priority_options': ['resale', 'donation', 'keep']}
+        },
+    }
+
+    def invoke(self, FunctionName, InvocationType='RequestResponse', Payload=b'{}'):
+        self.wait()
+        body = self.RESPONSES.get(FunctionName, {'status': 'warm'})
+        payload = {'statusCode': 200, 'body': json.dumps(body)}
+        return {'StatusCode': 200, 'Payload': io.BytesIO(json.dumps(payload).encode('utf-8'))}
+
+class FakeTable(Service):
+    service = 'dynamodb'
+
+    def __init__(self, name, latency_ms=0):
+        super().__init__(latency_ms)
+        self.name = name
+        self.items = {}
+
+    def _key(self, key):
+        return json.dumps(key, sort_keys=True, default=str)
+
+    def get_item(self, Key, **kwargs):
+        self.wait()
+        # Items are keyed on their first attribute - enough for single-key tables
+        item = self.items.get(self._key(Key))
+        return {'Item': item} if item else {}
+
+    def put_item(self, Item, **kwargs):
+        self.wait()
+        first = next(iter(Item))
+        self.items[self._key({first: Item[first]})] = Item
+        return {}
+
+    def update_item(self, Key, UpdateExpression='', ExpressionAttributeNames=None, ExpressionAttributeValues=None, **kwargs):
+        self.wait()
+        # Enough of ADD / SET for the counters: "ADD #n :v SET #a = :b, ..."
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+        item = self.items.setdefault(self._key(Key), dict(Key))
+        for action, clauses in re.findall(r'(ADD|SET)\s+(.*?)(?=\s+(?:ADD|SET)\s|$)', UpdateExpression):
+            for clause in clauses.split(','):
+                parts = clause.replace('=', ' ').split()
+                name = names.get(parts[0], parts[0])
+                if action == 'ADD':
+                    item[name] = item.get(name, 0) + values[parts[1]]
+                else:
+                    item[name] = values[parts[1]]
+        return {'Attributes': {}}
+
+    def query(self, KeyConditionExpression='', ExpressionAttributeValues=None, **kwargs):
+        self.wait()
+        # Partition key equality plus an optional begins_with on the sort key
+        values = ExpressionAttributeValues or {}
+        hash_name, hash_value = re.match(r'(\w+) = (:\w+)', KeyConditionExpression).groups()
+        prefix = re.search(r'begins_with\((\w+), (:\w+)\)', KeyConditionExpression)
+        items = [
+            item for item in self.items.values()
+            if item.get(hash_name) == values[hash_value]
+            and (not prefix or str(item.get(prefix.group(1), '')).startswith(values[prefix.group(2)]))
+        ]
+        return {'Items': items, 'Count': len(items)}
+
+    def batch_writer(self, **kwargs):
+        return FakeBatchWriter(self)
+
+class FakeBatchWriter:
+    def __init__(self, table):
+        self.table = table
+        self.pending = []
+
+    def put_item(self, Item):
+        self.pending.append(Item)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        # One BatchWriteItem round trip per 25 items
+        for start in range(0, len(self.pending), 25):
+            self.table.wait()
+            for item in self.pending[start:start + 25]:
+                first = next(iter(item))
+                self.table.items[self.table._key({first: item[first]})] = item
+        self.pending = []
+
+class FakeDynamoResource(Service):
+    service = 'dynamodb'
+
+    def __init__(self, latency_ms=0):
+        super().__init__(latency_ms)
+        self.tables = {}
+        self.meta = type('Meta', (), {'client': self})()
+
+    def Table(self, name):
+        if name not in self.tables:
+            self.tables[name] = FakeTable(name, self.latency_ms)
+        return self.tables[name]
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        self.wait()
+        for name, requests in RequestItems.items():
+            for request in requests:
+                item = request['PutRequest']['Item']
+                self.Table(name).items[self.Table(name)._key({next(iter(item)): item[next(iter(item))]})] = item
+        return {'UnprocessedItems': {}}
+
+FAKES = {
+    's3': FakeS3,
+    'rekognition': FakeRekognition,
+    'bedrock-runtime': FakeBedrockRuntime,
+    'bedrock-agent-runtime': FakeBedrockAgent,
+    'lambda': FakeLambda,
+}
+
+def install(latency_ms=None):
+    """
+    Swap a fake into every registered client proxy
+    latency_ms maps service name -> milliseconds per call
+    Returns {proxy name: fake} so callers can inspect call counts
+    """
+    from threadher_common import clients
+
+    latency_ms = latency_ms or {}
+    dynamodb = FakeDynamoResource(latency_ms.get('dynamodb', 0))
+    installed = {}
+
+    for proxy in clients.registered():
+        name = proxy._name
+        if name.startswith('table:'):
+            fake = dynamodb.Table(name.split(':', 1)[1])
+        elif name == 'dynamodb-resource':
+            fake = dynamodb
+        elif name in FAKES:
+            fake = FAKES[name](latency_ms.get(name, 0))
+        else:
+            continue
+        proxy._instance = fake
+        installed[name] = fake
+
+    return installed
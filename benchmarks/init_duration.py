@@ -0,0 +1,120 @@
+# benchmarks/init_duration.py
+"""
+Init-duration benchmark for the client registry modes
+
+Each run starts a fresh interpreter (a cold container), imports the
+handler module with CLIENT_INIT_MODE set, then builds every registered
+client as the first request would. Reports per handler and mode:
+
+    init_ms       - module import (the Lambda init phase)
+    first_use_ms  - building the clients still missing after init
+    total_ms      - init + first use
+
+Usage:
+    python benchmarks/init_duration.py --runs 10
+    python benchmarks/init_duration.py --handlers api-handler --no-connect
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAYER_PATH = os.path.join(REPO_ROOT, 'layers', 'threadher-common', 'python')
+
+# name -> (directory, handler module)
+HANDLERS = {
+    'api-handler': ('lambdas/api-handler', 'lambda_function'),
+    'action-handler': ('agents/orchestrator', 'action_handler'),
+    'image-analyzer': ('lambdas/tools/image-analyzer', 'lambda_function'),
+    'carbon-calculator': ('lambdas/tools/carbon-calculator', 'lambda_function'),
+    'circular-options': ('lambdas/tools/get-circular-options', 'lambda_function'),
+}
+
+MODES = ['lazy', 'primed']
+
+CHILD = """
+import json, time
+start = time.perf_counter()
+import {module}
+init_ms = (time.perf_counter() - start) * 1000
+from threadher_common import clients
+start = time.perf_counter()
+for proxy in clients.registered():
+    proxy._get()
+first_use_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({{'init_ms': init_ms, 'first_use_ms': first_use_ms, 'report': clients.report()}}))
+"""
+
+def run_once(handler, mode, connect):
+    directory, module = HANDLERS[handler]
+    env = dict(os.environ)
+    env.update({
+        'CLIENT_INIT_MODE': mode,
+        'CLIENT_PRIME_CONNECTIONS': 'true' if connect else 'false',
+        'PYTHONPATH': LAYER_PATH,
+        'AWS_DEFAULT_REGION': env.get('AWS_DEFAULT_REGION', 'us-east-1'),
+    })
+    result = subprocess.run(
+        [sys.executable, '-c', CHILD.format(module=module)],
+        cwd=os.path.join(REPO_ROOT, directory),
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{handler} ({mode}): {result.stderr.strip().splitlines()[-1]}")
+    # The handler may print during init - the measurement is the last line
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def summarize(samples, field):
+    values = sorted(s[field] for s in samples)
+    return {
+        'p50': round(statistics.median(values), 1),
+        'max': round(values[-1], 1)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure handler init duration per client init mode')
+    parser.add_argument('--runs', type=int, default=5, help='Cold starts per handler and mode')
+    parser.add_argument('--handlers', nargs='+', choices=sorted(HANDLERS), default=sorted(HANDLERS))
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    parser.add_argument('--no-connect', action='store_true', help='Skip TLS priming (offline runs)')
+    parser.add_argument('--json', action='store_true', help='Print raw results as JSON')
+    args = parser.parse_args()
+
+    results = []
+    for handler in args.handlers:
+        for mode in args.modes:
+            try:
+                samples = [run_once(handler, mode, not args.no_connect) for _ in range(args.runs)]
+            except RuntimeError as e:
+                print(f"Skipping: {e}", file=sys.stderr)
+                continue
+
+            for sample in samples:
+                sample['total_ms'] = sample['init_ms'] + sample['first_use_ms']
+
+            results.append({
+                'handler': handler,
+                'mode': mode,
+                'runs': args.runs,
+                'init_ms': summarize(samples, 'init_ms'),
+                'first_use_ms': summarize(samples, 'first_use_ms'),
+                'total_ms': summarize(samples, 'total_ms'),
+                'connect_ms': samples[-1]['report']['connect_ms']
+            })
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'handler':<18} {'mode':<7} {'init p50':>9} {'init max':>9} {'first use':>10} {'total p50':>10}")
+    for r in results:
+        print(f"{r['handler']:<18} {r['mode']:<7} {r['init_ms']['p50']:>9} {r['init_ms']['max']:>9} "
+              f"{r['first_use_ms']['p50']:>10} {r['total_ms']['p50']:>10}")
+
+if __name__ == '__main__':
+    main()
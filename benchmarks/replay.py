@@ -0,0 +1,235 @@
+# benchmarks/replay.py
+"""
+Offline replay benchmark for every Lambda handler
+
+Each handler runs in its own interpreter with the AWS clients replaced
+by the in-memory fakes in benchmarks/fakes.py, then replays an event
+corpus (benchmarks/events/<handler>.json by default) and reports:
+
+    throughput    events per second over the measured replay
+    p50 / p99     per-event latency in ms
+    peak_rss_mb   peak resident memory of the process
+    alloc_kb      peak memory allocated while handling one event (tracemalloc, separate pass)
+    retained_kb   memory still held after that pass (leak check)
+    aws_calls     fake AWS calls made over the whole run
+
+Latency per AWS call is 0 by default, which measures handler CPU only.
+--latency realistic or --latency s3=25 dynamodb=8 adds simulated
+service time.
+
+Usage:
+    python benchmarks/replay.py
+    python benchmarks/replay.py --handlers api-handler --iterations 500
+    python benchmarks/replay.py --events test-events/test-api-event.json --handlers api-handler
+    python benchmarks/replay.py --save baseline.json
+    python benchmarks/replay.py --baseline baseline.json --max-regression 0.2
+"""
+import argparse
+import gc
+import importlib
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from fakes import REALISTIC_LATENCY_MS, install
+from init_duration import HANDLERS, LAYER_PATH, REPO_ROOT
+
+EVENTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'events')
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def load_events(path):
+    """A JSON list, a single JSON event or JSON lines - in any of the encodings test-events/ uses"""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    encoding = 'utf-16' if raw[:2] in (b'\xff\xfe', b'\xfe\xff') else 'utf-8-sig'
+    text = raw.decode(encoding).strip()
+
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = [json.loads(line) for line in text.splitlines() if line.strip()]
+    return data if isinstance(data, list) else [data]
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+def replay(handler_name, events, iterations, latency_ms, warmup_rounds=1):
+    """Child side: import the handler, install fakes, replay and measure"""
+    directory, module_name = HANDLERS[handler_name]
+    handler_dir = os.path.join(REPO_ROOT, directory)
+    os.chdir(handler_dir)
+    sys.path[:0] = [handler_dir, LAYER_PATH]
+
+    # Handlers log every request - keep the serialization cost, drop the output
+    real_stdout = sys.stdout
+    sys.stdout = open(os.devnull, 'w')
+    try:
+        module = importlib.import_module(module_name)
+        fakes = install(latency_ms)
+
+        from threadher_common import metrics
+        metrics.set_exporter(lambda record: None)
+
+        class Context:
+            aws_request_id = 'replay'
+            function_name = f"ThreadHer-{handler_name}"
+
+        context = Context()
+        errors = 0
+
+        for _ in range(warmup_rounds):
+            for event in events:
+                module.lambda_handler(event, context)
+
+        gc.collect()
+        timings = []
+        start = time.perf_counter()
+        for _ in range(iterations):
+            for event in events:
+                t0 = time.perf_counter()
+                try:
+                    module.lambda_handler(event, context)
+                except Exception:
+                    errors += 1
+                timings.append((time.perf_counter() - t0) * 1000)
+        elapsed = time.perf_counter() - start
+
+        # Allocation pass - tracemalloc slows everything down, so it is
+        # kept out of the timed replay
+        gc.collect()
+        tracemalloc.start()
+        baseline_bytes = tracemalloc.get_traced_memory()[0]
+        allocated = 0
+        for event in events:
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            module.lambda_handler(event, context)
+            allocated += tracemalloc.get_traced_memory()[1] - before
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0] - baseline_bytes
+        tracemalloc.stop()
+    finally:
+        sys.stdout.close()
+        sys.stdout = real_stdout
+
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return {
+        'handler': handler_name,
+        'events': len(events),
+        'iterations': iterations,
+        'errors': errors,
+        'throughput': round(len(timings) / elapsed, 1) if elapsed else None,
+        'p50_ms': round(statistics.median(timings), 3),
+        'p99_ms': round(percentile(timings, 0.99), 3),
+        'peak_rss_mb': round(peak_rss_kb / 1024, 1),
+        'alloc_kb': round(allocated / 1024 / len(events), 1),
+        'retained_kb': round(retained / 1024, 1),
+        'aws_calls': {name: fake.calls for name, fake in fakes.items() if fake.calls}
+    }
+
+def run_child(handler_name, events_path, iterations, latency_ms):
+    """Parent side: one fresh interpreter per handler"""
+    env = dict(os.environ)
+    env.update({
+        'AWS_DEFAULT_REGION': env.get('AWS_DEFAULT_REGION', 'us-east-1'),
+        'AWS_ACCESS_KEY_ID': env.get('AWS_ACCESS_KEY_ID', 'replay'),
+        'AWS_SECRET_ACCESS_KEY': env.get('AWS_SECRET_ACCESS_KEY', 'replay'),
+        'CLIENT_INIT_MODE': 'lazy',
+        'LOG_SAMPLE_RATE': '0',
+        'PYTHONPATH': os.pathsep.join([BENCHMARKS_DIR, LAYER_PATH])
+    })
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', handler_name,
+         '--events', events_path, '--iterations', str(iterations),
+         '--latency-json', json.dumps(latency_ms)],
+        env=env,
+        capture_output=True,
+        text=True
+    )
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines() or ['no output']
+        raise RuntimeError(f"{handler_name}: {lines[-1]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+def parse_latency(values):
+    if values == ['realistic']:
+        return dict(REALISTIC_LATENCY_MS)
+    latency = {}
+    for value in values or []:
+        service, _, ms = value.partition('=')
+        latency[service] = float(ms)
+    return latency
+
+def compare(results, baseline_path, max_regression):
+    """Return the regressions against a saved run (p50, p99 and alloc per event)"""
+    with open(baseline_path) as f:
+        baseline = {r['handler']: r for r in json.load(f)}
+
+    regressions = []
+    for result in results:
+        before = baseline.get(result['handler'])
+        if not before:
+            continue
+        for field in ('p50_ms', 'p99_ms', 'alloc_kb'):
+            if before[field] and result[field] > before[field] * (1 + max_regression):
+                regressions.append(f"{result['handler']} {field}: {before[field]} -> {result[field]}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay event corpora against every handler with fake AWS clients')
+    parser.add_argument('--handlers', nargs='+', choices=sorted(HANDLERS), default=sorted(HANDLERS))
+    parser.add_argument('--events', help='Event file to replay instead of benchmarks/events/<handler>.json')
+    parser.add_argument('--iterations', type=int, default=200, help='Passes over the corpus')
+    parser.add_argument('--latency', nargs='*', default=[], metavar='SERVICE=MS',
+                        help="Simulated latency per AWS call, or 'realistic'")
+    parser.add_argument('--save', help='Write results to this JSON file')
+    parser.add_argument('--baseline', help='Fail when results regress against this saved run')
+    parser.add_argument('--max-regression', type=float, default=0.2, help='Allowed slowdown vs baseline (0.2 = 20%%)')
+    parser.add_argument('--json', action='store_true', help='Print raw results as JSON')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--latency-json', default='{}', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        events = load_events(args.events)
+        result = replay(args.child, events, args.iterations, json.loads(args.latency_json))
+        print(json.dumps(result))
+        return
+
+    latency = parse_latency(args.latency)
+    results = []
+    for handler in args.handlers:
+        events_path = os.path.abspath(args.events or os.path.join(EVENTS_DIR, f"{handler}.json"))
+        try:
+            results.append(run_child(handler, events_path, args.iterations, latency))
+        except RuntimeError as e:
+            print(f"Skipping: {e}", file=sys.stderr)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'handler':<18} {'events/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'rss MB':>7} {'alloc KB':>9} {'kept KB':>8} {'errors':>6}")
+        for r in results:
+            print(f"{r['handler']:<18} {r['throughput']:>9} {r['p50_ms']:>8} {r['p99_ms']:>8} {r['peak_rss_mb']:>7} "
+                  f"{r['alloc_kb']:>9} {r['retained_kb']:>8} {r['errors']:>6}")
+
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.max_regression)
+        for regression in regressions:
+            print(f"REGRESSION {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
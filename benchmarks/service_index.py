@@ -0,0 +1,99 @@
+# benchmarks/service_index.py
+"""
+Query latency of the service location index
+
+Builds a synthetic index (setup/build_service_index.py --synthetic) in a
+temporary file, maps it the way the circular options tool does, and
+reports:
+
+    load_ms       opening and mapping the index (the first query's extra cost)
+    nearest       k-nearest per service type, p50 / p99 in microseconds
+    within        within-radius per service type, p50 / p99 in microseconds
+
+Queries are spread around the synthetic clusters, so most land in dense
+areas - the expensive case. Results are checked against a brute-force
+scan of the same rows before timing.
+
+Usage:
+    python benchmarks/service_index.py
+    python benchmarks/service_index.py --rows 500000 --k 5 --radius-km 2
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from init_duration import LAYER_PATH, REPO_ROOT
+from replay import percentile
+
+sys.path.insert(0, LAYER_PATH)
+sys.path.insert(0, os.path.join(REPO_ROOT, 'setup'))
+
+import build_service_index
+from threadher_tools import services
+
+def queries(count, seed=11):
+    rng = random.Random(seed)
+    points = []
+    for _ in range(count):
+        latitude, longitude = rng.choice(build_service_index.SYNTHETIC_CENTERS)
+        points.append((latitude + rng.gauss(0, 0.5), longitude + rng.gauss(0, 0.6)))
+    return points
+
+def check(index, rows, points, k, radius_km):
+    """The index answers what a full scan does"""
+    for latitude, longitude in points:
+        for service_type in build_service_index.SYNTHETIC_TYPES:
+            by_distance = sorted(
+                (services.distance_km(latitude, longitude, row[2], row[3]), row[1])
+                for row in rows if row[0] == service_type
+            )
+            nearest = [row['name'] for row in index.nearest(service_type, latitude, longitude, k=k, max_km=radius_km * 100)]
+            if nearest != [name for _, name in by_distance[:k]]:
+                raise SystemExit(f"nearest differs at {latitude}, {longitude} ({service_type})")
+            within = index.within(service_type, latitude, longitude, radius_km)
+            if len(within) != sum(1 for distance, _ in by_distance if distance <= radius_km):
+                raise SystemExit(f"within differs at {latitude}, {longitude} ({service_type})")
+
+def time_us(query, points):
+    samples = []
+    for latitude, longitude in points:
+        for service_type in build_service_index.SYNTHETIC_TYPES:
+            started = time.perf_counter()
+            query(service_type, latitude, longitude)
+            samples.append((time.perf_counter() - started) * 1e6)
+    return round(percentile(samples, 0.5), 1), round(percentile(samples, 0.99), 1)
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure service location index queries')
+    parser.add_argument('--rows', type=int, default=300000)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--k', type=int, default=3)
+    parser.add_argument('--radius-km', type=float, default=2.0)
+    args = parser.parse_args()
+
+    rows = build_service_index.synthetic_rows(args.rows)
+    data, _ = build_service_index.build(rows)
+    with tempfile.NamedTemporaryFile(suffix='.idx', delete=False) as f:
+        f.write(data)
+    try:
+        started = time.perf_counter()
+        index = services.ServiceIndex(f.name)
+        load_ms = (time.perf_counter() - started) * 1000
+
+        points = queries(args.queries)
+        check(index, rows, points[:20], args.k, args.radius_km)
+        nearest = time_us(lambda t, lat, lon: index.nearest(t, lat, lon, k=args.k), points)
+        within = time_us(lambda t, lat, lon: index.within(t, lat, lon, args.radius_km), points)
+    finally:
+        os.unlink(f.name)
+
+    print(f"{args.rows} rows, {len(data) / 1e6:.1f} MB, load {load_ms:.2f} ms")
+    print(f"{'query':<22} {'p50 us':>8} {'p99 us':>8}")
+    print(f"{f'nearest k={args.k}':<22} {nearest[0]:>8} {nearest[1]:>8}")
+    print(f"{f'within {args.radius_km} km':<22} {within[0]:>8} {within[1]:>8}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+# lambdas/api-handler/agent_trace.py
+"""
+Agent trace capture for /chat
+
+With enableTrace=True, invoke_agent interleaves trace events with the
+completion chunks. A TraceCollector consumes them as they arrive and
+reduces them to a compact summary per chat:
+
+    steps            orchestration steps (one model turn each)
+    model_calls      model invocations incl. pre/post-processing
+    tool_calls       action group calls per apiPath
+    repeated_calls   tool calls with the same apiPath and parameters as an earlier one
+    input_tokens / output_tokens
+    step_ms          duration of each step
+
+The summary is logged and added to the invocation's metrics. Tracing
+makes the agent stream larger, so it is opt-in and sampled:
+
+    AGENT_TRACE_SAMPLE_RATE    fraction of chats traced (default 0)
+    AGENT_TRACE_ALLOW_REQUEST  honour {"trace": true} in the request body (default true);
+                               traced requests also get the summary back
+"""
+import json
+import os
+import random
+import time
+
+from threadher_common import logs, metrics
+
+AGENT_TRACE_SAMPLE_RATE = float(os.environ.get('AGENT_TRACE_SAMPLE_RATE', 0))
+AGENT_TRACE_ALLOW_REQUEST = os.environ.get('AGENT_TRACE_ALLOW_REQUEST', 'true').lower() == 'true'
+
+STEP_TRACES = ('preProcessingTrace', 'orchestrationTrace', 'postProcessingTrace')
+
+logger = logs.get_logger('APIHandler')
+
+class TraceCollector:
+    """Reduces the agent trace stream of one chat to a summary"""
+    
+    def __init__(self, requested=False):
+        self.requested = requested
+        self.started = time.perf_counter()
+        self.steps = {}  # traceId -> {'kind', 'last', 'ms'}, in arrival order
+        self.model_calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.tool_calls = {}
+        self.repeated_calls = 0
+        self.failures = 0
+        self._seen_calls = set()
+    
+    def add(self, trace_event):
+        """Consume one 'trace' event from the completion stream"""
+        now = (time.perf_counter() - self.started) * 1000
+        trace = (trace_event or {}).get('trace') or {}
+        
+        if 'failureTrace' in trace:
+            self.failures += 1
+        
+        for kind in STEP_TRACES:
+            if kind in trace:
+                self._add_step(kind, trace[kind], now)
+    
+    def _add_step(self, kind, part, now):
+        # Every part of a step carries the same traceId
+        inner = next((v for v in part.values() if isinstance(v, dict) and 'traceId' in v), {})
+        trace_id = inner.get('traceId', f"{kind}-{len(self.steps)}")
+        
+        step = self.steps.setdefault(trace_id, {'kind': kind, 'last': now, 'ms': None})
+        step['last'] = now
+        
+        output = part.get('modelInvocationOutput')
+        if output:
+            self.model_calls += 1
+            usage = (output.get('metadata') or {}).get('usage') or {}
+            self.input_tokens += usage.get('inputTokens', 0)
+            self.output_tokens += usage.get('outputTokens', 0)
+            # Newer runtimes report the model latency themselves
+            total_ms = (output.get('metadata') or {}).get('totalTimeMs')
+            if total_ms is not None:
+                step['ms'] = total_ms
+        
+        action = (part.get('invocationInput') or {}).get('actionGroupInvocationInput')
+        if action:
+            api_path = action.get('apiPath') or action.get('function') or 'unknown'
+            self.tool_calls[api_path] = self.tool_calls.get(api_path, 0) + 1
+            
+            signature = json.dumps([api_path, action.get('parameters'), action.get('requestBody')], sort_keys=True, default=str)
+            if signature in self._seen_calls:
+                self.repeated_calls += 1
+            self._seen_calls.add(signature)
+    
+    def summary(self):
+        # Trace events arrive when a step ends, so without a reported
+        # latency a step lasts from the previous step's end to its own
+        step_ms = []
+        previous_end = 0.0
+        for step in self.steps.values():
+            step_ms.append(round(step['ms'] if step['ms'] is not None else step['last'] - previous_end, 1))
+            previous_end = step['last']
+        
+        return {
+            'steps': sum(1 for s in self.steps.values() if s['kind'] == 'orchestrationTrace'),
+            'model_calls': self.model_calls,
+            'tool_calls': dict(self.tool_calls),
+            'repeated_calls': self.repeated_calls,
+            'input_tokens': self.input_tokens,
+            'output_tokens': self.output_tokens,
+            'step_ms': step_ms,
+            'failures': self.failures
+        }
+    
+    def finish(self, query=None):
+        """
+        Log the summary and add it to the invocation's metrics
+        Returns it only when the client asked for the trace
+        """
+        summary = self.summary()
+        
+        timer = metrics.current()
+        timer.count('agent_steps', summary['steps'])
+        timer.count('agent_model_calls', summary['model_calls'])
+        timer.count('agent_tool_calls', sum(summary['tool_calls'].values()))
+        timer.count('agent_repeated_calls', summary['repeated_calls'])
+        timer.count('agent_input_tokens', summary['input_tokens'])
+        timer.count('agent_output_tokens', summary['output_tokens'])
+        timer.set_property('AgentToolCalls', summary['tool_calls'])
+        
+        # The query is what makes redundant tool calls actionable
+        logger.info("Agent trace", query=(query or '')[:200], **summary)
+        return summary if self.requested else None
+
+def start(body):
+    """A collector when this chat should be traced, else None"""
+    requested = AGENT_TRACE_ALLOW_REQUEST and body.get('trace') is True
+    if requested or (AGENT_TRACE_SAMPLE_RATE and random.random() < AGENT_TRACE_SAMPLE_RATE):
+        return TraceCollector(requested)
+    return None
\ No newline at end of file
@@ -1,34 +1,93 @@
 # lambdas/api-handler/lambda_function.py
 import json
-import boto3
 import uuid
 import os
+import math
+import re
 import base64
 from datetime import datetime
 
-# Initialize clients
-bedrock_agent = boto3.client('bedrock-agent-runtime', region_name='us-east-1')
-s3_client = boto3.client('s3')
+import agent_trace
+import response_cache
+from threadher_common import clients, logs, metrics, resilience, warmup
+
+# Initialize clients (created on first use unless CLIENT_INIT_MODE=primed)
+bedrock_agent = clients.client('bedrock-agent-runtime', region_name='us-east-1', config_options=resilience.client_config('bedrock-agent-runtime'))
+# SigV4 + regional endpoint so presigned URLs work straight from the browser
+s3_client = clients.client('s3', region_name='us-east-1', config_options=resilience.client_config('s3', signature_version='s3v4'))
+
+# A chat turn changes agent session state: never hedged, and not resent after a timeout
+agent_dependency = resilience.Dependency('bedrock-agent-runtime', idempotent=False)
+s3_dependency = resilience.Dependency('s3', hedge=True)
 
 # Get agent details from environment variables
 AGENT_ID = os.environ.get('AGENT_ID', 'ZWOLVYWCJ1')
 AGENT_ALIAS_ID = os.environ.get('AGENT_ALIAS_ID', 'EDAOMXHJBL')
 S3_BUCKET = os.environ.get('S3_BUCKET', 'threadher-garment-images-2025')
 
+# Direct-to-S3 upload settings
+UPLOAD_PREFIX = 'uploads/'
+CONTENT_PREFIX = 'uploads/sha256/'  # Content-addressed keys: same bytes, same key
+SHA256_HEX = re.compile(r'^[0-9a-f]{64}$')
+UPLOAD_URL_EXPIRES = int(os.environ.get('UPLOAD_URL_EXPIRES', 900))
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 20 * 1024 * 1024))
+MULTIPART_THRESHOLD = int(os.environ.get('MULTIPART_THRESHOLD', 8 * 1024 * 1024))
+MULTIPART_PART_SIZE = int(os.environ.get('MULTIPART_PART_SIZE', 8 * 1024 * 1024))  # S3 minimum is 5 MiB
+# Only what the ImageAnalyzer can read - Rekognition takes JPEG and PNG
+IMAGE_EXTENSIONS = {
+    'image/jpeg': 'jpg',
+    'image/png': 'png'
+}
+
+# Shown when the agent is unavailable or out of time and nothing was streamed yet
+DEGRADED_RESPONSE = (
+    "ThreadHer is taking longer than usual to answer right now. "
+    "Please try again in a moment."
+)
+
+clients.init()
+
+logger = logs.get_logger('APIHandler')
+
+@metrics.timed('APIHandler')
 def lambda_handler(event, context):
     """
     API handler for ThreadHer frontend
     Routes requests to Bedrock Agent with image support
     """
     
-    print(f"Received event: {json.dumps(event)}")
+    # Keeper pings and the frontend connectivity check never reach the agent
+    if warmup.is_warmup_event(event):
+        return {
+            'statusCode': 200,
+            'headers': get_cors_headers(),
+            'body': json.dumps(warmup.handle_warmup(event, 'APIHandler', [bedrock_agent, s3_client, response_cache.dynamodb]))
+        }
+    
+    logger.start_invocation(context, metrics.current().correlation_id)
+    resilience.start(context, event)
+    # Full event only at DEBUG; bodies are redacted and bounded either way
+    logger.debug("Received event", event=event)
+    logger.info("Request", method=event.get('httpMethod'), path=event.get('path'), body_chars=len(event.get('body') or ''))
+    
+    # /upload-url is served by the same function
+    if (event.get('path') or '').rstrip('/').endswith('/upload-url'):
+        return upload_url_handler(event, context)
     
     try:
         # Parse request body
-        body = json.loads(event.get('body', '{}'))
+        body = json.loads(event.get('body') or '{}')
+        if not isinstance(body, dict):
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({
+                    'error': 'Request body must be a JSON object'
+                })
+            }
+        
         user_query = body.get('query', '')
         session_id = body.get('session_id', str(uuid.uuid4()))
-        image_data = body.get('image', None)  # Base64 image from frontend
         
         if not user_query:
             return {
@@ -39,64 +98,43 @@ def lambda_handler(event, context):
                 })
             }
         
-        # Prepare input text
-        input_text = user_query
-        image_key = None
+        if body.get('image'):
+            return {
+                'statusCode': 400,
+                'headers': get_cors_headers(),
+                'body': json.dumps({
+                    'error': 'Inline images are not accepted, upload via /upload-url and send s3_key'
+                })
+            }
+        
+        # Prepare input text (adds the uploaded image reference if present)
+        input_text, image_key = prepare_agent_input(body, session_id)
         
-        # Handle image if present
-        if image_data:
-            try:
-                print("Processing image upload...")
-                
-                # Create unique image key
-                timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
-                image_key = f'uploads/{session_id}/{timestamp}.jpg'
-                
-                # Decode base64 image
-                # Handle both formats: "data:image/jpeg;base64,..." and raw base64
-                if ',' in image_data:
-                    image_bytes = base64.b64decode(image_data.split(',')[1])
-                else:
-                    image_bytes = base64.b64decode(image_data)
-                
-                # Upload to S3
-                s3_client.put_object(
-                    Bucket=S3_BUCKET,
-                    Key=image_key,
-                    Body=image_bytes,
-                    ContentType='image/jpeg'
-                )
-                
-                print(f"Image uploaded to s3://{S3_BUCKET}/{image_key}")
-                
-                # Add image reference to query for the agent
-                input_text = f"{user_query}\n\n[IMAGE UPLOADED: s3://{S3_BUCKET}/{image_key}]\nPlease analyze the garment in the uploaded image."
-                
-            except Exception as img_error:
-                print(f"Image upload error: {str(img_error)}")
-                # Continue without image if upload fails
-                input_text = f"{user_query}\n\n[Note: Image upload failed, proceeding with text-only analysis]"
-        
-        print(f"Invoking agent with query: {input_text[:200]}...")
-        
-        # Invoke Bedrock Agent
-        response = bedrock_agent.invoke_agent(
-            agentId=AGENT_ID,
-            agentAliasId=AGENT_ALIAS_ID,
-            sessionId=session_id,
-            inputText=input_text,
-            enableTrace=False  # Set to True for debugging
-        )
+        # Serve repeat questions from the answer cache
+        cache_key = response_cache.cache_key_for(body, image_key)
+        full_response, cache_tier = response_cache.get(cache_key)
+        trace_summary = None
+        degraded = None
         
-        # Collect streaming response
-        full_response = ""
-        for event_chunk in response['completion']:
-            if 'chunk' in event_chunk:
-                chunk = event_chunk['chunk']
-                if 'bytes' in chunk:
-                    full_response += chunk['bytes'].decode('utf-8')
+        if full_response is None:
+            # Collect streaming response
+            chunks = []
+            trace = agent_trace.start(body)
+            try:
+                with metrics.phase('agent'):
+                    for text in iter_agent_chunks(input_text, session_id, trace):
+                        chunks.append(text)
+            except resilience.DependencyUnavailable as e:
+                # Keep whatever arrived in time; never cache a partial answer
+                degraded = e.reason
+            
+            full_response = ''.join(chunks) or DEGRADED_RESPONSE
+            if not degraded:
+                response_cache.put(cache_key, full_response)
+            if trace:
+                trace_summary = trace.finish(user_query)
         
-        print(f"Agent response: {full_response[:200]}...")
+        logger.info("Agent response", source=cache_tier or 'agent', chars=len(full_response), preview=full_response[:200], degraded=degraded)
         
         # Return response
         return {
@@ -105,14 +143,15 @@ def lambda_handler(event, context):
             'body': json.dumps({
                 'response': full_response,
                 'session_id': session_id,
-                'image_stored': image_key if image_key else None
+                'image_stored': image_key if image_key else None,
+                'cached': cache_tier,
+                'trace': trace_summary,
+                'degraded': degraded
             })
         }
-        
+    
     except Exception as e:
-        print(f"Error: {str(e)}")
-        import traceback
-        print(f"Traceback: {traceback.format_exc()}")
+        logger.exception("Chat request failed", error=str(e))
         
         return {
             'statusCode': 500,
@@ -123,6 +162,440 @@ def lambda_handler(event, context):
             })
         }
 
+def stream_chat(body):
+    """
+    Streaming variant of /chat, served by stream_server.py
+    Yields server-sent event frames as soon as each agent chunk arrives:
+    'start' with the session id, one 'chunk' per completion chunk, then
+    'done' with the session metadata (or 'error' if anything fails)
+    """
+    
+    timer = metrics.start('APIHandler', body)
+    logger.start_invocation(correlation_id=timer.correlation_id)
+    # No Lambda context behind the stream server - DEFAULT_DEADLINE_MS applies
+    resilience.start(None, body)
+    
+    # Early returns stay inside the try so finally ends the invocation's metrics
+    try:
+        if not isinstance(body, dict):
+            yield format_sse('error', {'error': 'Request body must be a JSON object'})
+            return
+        
+        user_query = body.get('query', '')
+        session_id = body.get('session_id', str(uuid.uuid4()))
+        
+        if not user_query:
+            yield format_sse('error', {'error': 'No query provided'})
+            return
+        
+        if body.get('image'):
+            yield format_sse('error', {'error': 'Inline images are not accepted, upload via /upload-url and send s3_key'})
+            return
+        
+        input_text, image_key = prepare_agent_input(body, session_id)
+        
+        yield format_sse('start', {'session_id': session_id})
+        
+        cache_key = response_cache.cache_key_for(body, image_key)
+        cached_response, cache_tier = response_cache.get(cache_key)
+        trace_summary = None
+        degraded = None
+        
+        if cached_response is not None:
+            yield format_sse('chunk', {'text': cached_response})
+        else:
+            chunks = []
+            trace = agent_trace.start(body)
+            try:
+                with timer.phase('agent'):
+                    for text in iter_agent_chunks(input_text, session_id, trace):
+                        chunks.append(text)
+                        yield format_sse('chunk', {'text': text})
+            except resilience.DependencyUnavailable as e:
+                degraded = e.reason
+                if not chunks:
+                    yield format_sse('chunk', {'text': DEGRADED_RESPONSE})
+            
+            if not degraded:
+                response_cache.put(cache_key, ''.join(chunks))
+            if trace:
+                trace_summary = trace.finish(user_query)
+        
+        yield format_sse('done', {
+            'session_id': session_id,
+            'image_stored': image_key if image_key else None,
+            'cached': cache_tier,
+            'trace': trace_summary,
+            'degraded': degraded
+        })
+    
+    except Exception as e:
+        logger.exception("Streaming chat failed", error=str(e))
+        
+        yield format_sse('error', {
+            'error': str(e),
+            'type': type(e).__name__
+        })
+    
+    finally:
+        metrics.finish()
+
+def stream_analyze_batch(body):
+    """
+    Bulk wardrobe onboarding, served by stream_server.py as /analyze-batch
+    Analyzes "image_s3_keys" (or every image under "image_s3_prefix") in
+    the upload bucket and yields 'start' with the batch id and image count,
+    one 'result' per image as soon as it is analyzed, then 'done' with the
+    batch summary (or 'error' if the batch can't run)
+    """
+    # Only the streaming server analyzes images itself
+    from threadher_tools import garment
+    
+    timer = metrics.start('APIHandler', body)
+    logger.start_invocation(correlation_id=timer.correlation_id)
+    # No Lambda context behind the stream server - DEFAULT_DEADLINE_MS applies
+    resilience.start(None, body)
+    
+    batch = None
+    try:
+        keys = body.get('image_s3_keys')
+        requested = keys if isinstance(keys, list) else [body.get('image_s3_prefix') or '']
+        if any(not isinstance(key, str) or not key.startswith(UPLOAD_PREFIX) or '..' in key for key in requested):
+            logger.warning("Rejected batch outside upload prefix", prefix=UPLOAD_PREFIX)
+            yield format_sse('error', {'error': f'Images must be under {UPLOAD_PREFIX}'})
+            return
+        
+        bucket_name, keys, user_id = garment.batch_keys(dict(body, bucket_name=S3_BUCKET))
+        batch_id = str(uuid.uuid4())
+        yield format_sse('start', {'batch_id': batch_id, 'images': len(keys)})
+        
+        batch = garment.iter_batch(bucket_name, keys, user_id, batch_id)
+        for event_name, data in batch:
+            yield format_sse(event_name, data)
+    
+    except ValueError as e:
+        yield format_sse('error', {'error': str(e)})
+    
+    except Exception as e:
+        logger.exception("Streaming batch failed", error=str(e))
+        
+        yield format_sse('error', {
+            'error': str(e),
+            'type': type(e).__name__
+        })
+    
+    finally:
+        # Client gone: stop starting images, store the finished ones
+        if batch is not None:
+            batch.close()
+        metrics.finish()
+
+def prepare_agent_input(body, session_id):
+    """
+    Build the agent input text for a chat request
+    Returns (input_text, image_key) - image_key is None for text-only chats
+    """
+    
+    user_query = body.get('query', '')
+    image_key = (body.get('s3_key') or '').strip() or None  # Set by the browser after a direct S3 upload
+    
+    if not image_key:
+        return user_query, None
+    
+    if not image_key.startswith(UPLOAD_PREFIX) or '..' in image_key:
+        logger.warning("Rejected image key outside upload prefix", prefix=UPLOAD_PREFIX, key=image_key)
+        return f"{user_query}\n\n[Note: Image reference was invalid, proceeding with text-only analysis]", None
+    
+    # Add image reference to query for the agent
+    input_text = f"{user_query}\n\n[IMAGE UPLOADED: s3://{S3_BUCKET}/{image_key}]\nPlease analyze the garment in the uploaded image."
+    
+    return input_text, image_key
+
+def upload_url_handler(event, context):
+    """
+    Issue presigned S3 URLs so the browser uploads raw image bytes directly
+    
+    Request body:
+        {"filename", "contentType", "size", "sha256", "session_id"} - start an upload
+        {"action": "complete", "key", "upload_id", "parts": [{"PartNumber", "ETag"}]}
+        {"action": "abort", "key", "upload_id"}
+    With a sha256 (hex digest computed in the browser) the image is stored
+    under a content key; if that object already exists the response has
+    "exists": true and no upload URL, so duplicate bytes are never re-sent.
+    Files above MULTIPART_THRESHOLD get one presigned URL per part
+    """
+    
+    try:
+        body = json.loads(event.get('body') or '{}')
+        action = body.get('action', 'create')
+        
+        if action == 'complete':
+            return complete_multipart_upload(body)
+        elif action == 'abort':
+            return abort_multipart_upload(body)
+        
+        content_type = (body.get('contentType') or 'image/jpeg').lower()
+        session_id = body.get('session_id') or str(uuid.uuid4())
+        sha256 = (body.get('sha256') or '').lower()
+        
+        try:
+            size = int(body.get('size') or 0)
+        except (ValueError, TypeError):
+            size = 0
+        
+        # Validation
+        if content_type not in IMAGE_EXTENSIONS:
+            return upload_error(400, f'Unsupported content type: {content_type}')
+        
+        if size <= 0 or size > MAX_UPLOAD_BYTES:
+            return upload_error(400, f'Image size must be between 1 byte and {MAX_UPLOAD_BYTES} bytes')
+        
+        if sha256 and not SHA256_HEX.match(sha256):
+            return upload_error(400, 'sha256 must be a 64 character hex digest')
+        
+        if sha256 and size <= MULTIPART_THRESHOLD:
+            image_key = f'{CONTENT_PREFIX}{sha256}.{IMAGE_EXTENSIONS[content_type]}'
+            
+            with metrics.phase('s3_head'):
+                # Unknown counts as missing - the browser just uploads again
+                exists = s3_dependency.call(image_exists, image_key, fallback=lambda e: False)
+            
+            if exists:
+                logger.info("Duplicate upload skipped", bucket=S3_BUCKET, key=image_key)
+                return {
+                    'statusCode': 200,
+                    'headers': get_cors_headers(),
+                    'body': json.dumps({
+                        'success': True,
+                        'exists': True,
+                        'key': image_key,
+                        'bucket': S3_BUCKET
+                    })
+                }
+            
+            # S3 rejects the PUT unless the bytes hash to the signed checksum,
+            # so a content key can never hold anything but its own content
+            with metrics.phase('presign'):
+                result = presign_put(image_key, content_type, size, sha256)
+        else:
+            # Multipart parts can't carry a whole-object checksum, so large
+            # (or unhashed) uploads keep a unique per-session key
+            timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+            image_key = f'{UPLOAD_PREFIX}{session_id}/{timestamp}-{uuid.uuid4().hex[:8]}.{IMAGE_EXTENSIONS[content_type]}'
+            
+            with metrics.phase('presign'):
+                if size > MULTIPART_THRESHOLD:
+                    result = create_multipart_upload(image_key, content_type, size)
+                else:
+                    result = presign_put(image_key, content_type, size)
+        
+        logger.info("Issued upload URL", upload='multipart' if 'multipart' in result else 'single', bucket=S3_BUCKET, key=image_key)
+        
+        result.update({
+            'success': True,
+            'key': image_key,
+            'bucket': S3_BUCKET,
+            'expires_in': UPLOAD_URL_EXPIRES
+        })
+        
+        return {
+            'statusCode': 200,
+            'headers': get_cors_headers(),
+            'body': json.dumps(result)
+        }
+        
+    except Exception as e:
+        logger.exception("Upload URL error", error=str(e))
+        return upload_error(500, str(e))
+
+def presign_put(image_key, content_type, size, sha256=None):
+    """
+    Presign a single PUT of exactly size bytes (Content-Length is signed, so
+    MAX_UPLOAD_BYTES holds for what is sent, not just what was claimed),
+    pinned to the content checksum when one is given
+    """
+    
+    params = {
+        'Bucket': S3_BUCKET,
+        'Key': image_key,
+        'ContentType': content_type,
+        'ContentLength': size
+    }
+    headers = {'Content-Type': content_type}
+    
+    if sha256:
+        checksum = base64.b64encode(bytes.fromhex(sha256)).decode('ascii')
+        params['ChecksumSHA256'] = checksum
+        headers['x-amz-checksum-sha256'] = checksum
+    
+    url = s3_client.generate_presigned_url(
+        'put_object',
+        Params=params,
+        ExpiresIn=UPLOAD_URL_EXPIRES
+    )
+    
+    return {
+        'upload': {
+            'method': 'PUT',
+            'url': url,
+            'headers': headers
+        }
+    }
+
+def image_exists(image_key):
+    """HEAD check for an already uploaded content-addressed image"""
+    from botocore.exceptions import ClientError
+    
+    try:
+        s3_client.head_object(Bucket=S3_BUCKET, Key=image_key)
+        return True
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return False
+        raise
+
+def create_multipart_upload(image_key, content_type, size):
+    """Start a multipart upload and presign one URL per part"""
+    
+    upload = s3_client.create_multipart_upload(
+        Bucket=S3_BUCKET,
+        Key=image_key,
+        ContentType=content_type
+    )
+    upload_id = upload['UploadId']
+    
+    part_count = math.ceil(size / MULTIPART_PART_SIZE)
+    parts = []
+    for part_number in range(1, part_count + 1):
+        # Each part's length is signed, so the parts add up to the size that was checked
+        part_size = min(MULTIPART_PART_SIZE, size - (part_number - 1) * MULTIPART_PART_SIZE)
+        parts.append({
+            'part_number': part_number,
+            'url': s3_client.generate_presigned_url(
+                'upload_part',
+                Params={
+                    'Bucket': S3_BUCKET,
+                    'Key': image_key,
+                    'UploadId': upload_id,
+                    'PartNumber': part_number,
+                    'ContentLength': part_size
+                },
+                ExpiresIn=UPLOAD_URL_EXPIRES
+            )
+        })
+    
+    return {
+        'multipart': {
+            'upload_id': upload_id,
+            'part_size': MULTIPART_PART_SIZE,
+            'parts': parts
+        }
+    }
+
+def complete_multipart_upload(body):
+    """Assemble the parts the browser uploaded (ETags come from the part PUT responses)"""
+    
+    image_key = body.get('key', '')
+    upload_id = body.get('upload_id', '')
+    parts = body.get('parts') or []
+    
+    if not image_key.startswith(UPLOAD_PREFIX) or not upload_id or not parts:
+        return upload_error(400, 'key, upload_id and parts are required')
+    
+    with metrics.phase('s3_complete_multipart'):
+        s3_client.complete_multipart_upload(
+            Bucket=S3_BUCKET,
+            Key=image_key,
+            UploadId=upload_id,
+            MultipartUpload={
+                'Parts': sorted(
+                    [{'PartNumber': int(p['PartNumber']), 'ETag': p['ETag']} for p in parts],
+                    key=lambda p: p['PartNumber']
+                )
+            }
+        )
+    
+    logger.info("Completed multipart upload", bucket=S3_BUCKET, key=image_key)
+    
+    return {
+        'statusCode': 200,
+        'headers': get_cors_headers(),
+        'body': json.dumps({'success': True, 'key': image_key})
+    }
+
+def abort_multipart_upload(body):
+    """Drop the parts of an upload the browser gave up on"""
+    
+    image_key = body.get('key', '')
+    upload_id = body.get('upload_id', '')
+    
+    if not image_key.startswith(UPLOAD_PREFIX) or not upload_id:
+        return upload_error(400, 'key and upload_id are required')
+    
+    s3_client.abort_multipart_upload(Bucket=S3_BUCKET, Key=image_key, UploadId=upload_id)
+    
+    return {
+        'statusCode': 200,
+        'headers': get_cors_headers(),
+        'body': json.dumps({'success': True, 'key': image_key})
+    }
+
+def upload_error(status_code, message):
+    """Error response for /upload-url"""
+    return {
+        'statusCode': status_code,
+        'headers': get_cors_headers(),
+        'body': json.dumps({
+            'success': False,
+            'error': message
+        })
+    }
+
+def iter_agent_chunks(input_text, session_id, trace=None):
+    """
+    Invoke the Bedrock Agent and yield completion text as it arrives
+    With a TraceCollector the agent trace is enabled and fed to it
+    """
+    
+    logger.info("Invoking agent", session_id=session_id, query=input_text[:200])
+    
+    timer = metrics.current()
+    
+    # Invoke Bedrock Agent - the correlation id rides along as a session
+    # attribute so the action group and tools report under the same id
+    with timer.phase('agent_invoke'):
+        response = agent_dependency.call(
+            bedrock_agent.invoke_agent,
+            agentId=AGENT_ID,
+            agentAliasId=AGENT_ALIAS_ID,
+            sessionId=session_id,
+            inputText=input_text,
+            sessionState={'sessionAttributes': {metrics.CORRELATION_FIELD: timer.correlation_id}},
+            enableTrace=trace is not None,
+            # Without it the agent sends the finished answer as one chunk at the end
+            streamingConfigurations={'streamFinalResponse': True}
+        )
+    
+    for event_chunk in response['completion']:
+        # Each read is bounded by the client's read timeout; stop between
+        # chunks once the invocation is out of time
+        remaining = resilience.remaining_ms()
+        if remaining is not None and remaining <= 0:
+            raise resilience.DeadlineExceeded('bedrock-agent-runtime', 'deadline exceeded while streaming')
+        
+        if trace is not None and 'trace' in event_chunk:
+            trace.add(event_chunk['trace'])
+        
+        if 'chunk' in event_chunk:
+            chunk = event_chunk['chunk']
+            if 'bytes' in chunk:
+                timer.mark('agent_first_chunk')
+                yield chunk['bytes'].decode('utf-8')
+
+def format_sse(event_name, data):
+    """Encode one server-sent event frame"""
+    return f"event: {event_name}\ndata: {json.dumps(data)}\n\n".encode('utf-8')
+
 def options_handler(event, context):
     """Handle OPTIONS requests for CORS"""
     return {
@@ -136,6 +609,13 @@ def get_cors_headers():
     return {
         'Content-Type': 'application/json',
         'Access-Control-Allow-Origin': '*',
-        'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token',
+        'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,X-Amz-Security-Token,X-Correlation-Id',
         'Access-Control-Allow-Methods': 'POST, OPTIONS, GET'
-    }
\ No newline at end of file
+    }
+
+def get_sse_headers():
+    """Return CORS headers for the streaming /chat endpoint"""
+    headers = get_cors_headers()
+    headers['Content-Type'] = 'text/event-stream'
+    headers['Cache-Control'] = 'no-cache'
+    return headers
\ No newline at end of file
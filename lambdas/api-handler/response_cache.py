@@ -0,0 +1,177 @@
+# lambdas/api-handler/response_cache.py
+"""
+Answer cache for /chat
+
+Tier 1 is an in-memory LRU that lives as long as the warm container.
+Tier 2 is a DynamoDB table shared by every container, expired by TTL.
+Entries are keyed on the normalized query plus the content hash of the
+attached image, so the canned quick questions and repeat analyses of the
+same photo skip the agent round trip.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from threadher_common import clients, logs, metrics, resilience
+
+CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() == 'true'
+CACHE_TABLE = os.environ.get('RESPONSE_CACHE_TABLE', 'ThreadHer-ResponseCache')
+CACHE_TTL_SECONDS = int(os.environ.get('RESPONSE_CACHE_TTL_SECONDS', 24 * 3600))
+CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 256))
+CACHE_MAX_QUERY_CHARS = int(os.environ.get('RESPONSE_CACHE_MAX_QUERY_CHARS', 300))
+# A lookup slower than this is a miss - the cache must never slow a chat down
+CACHE_TIMEOUT_MS = int(os.environ.get('RESPONSE_CACHE_TIMEOUT_MS', 300))
+# Bump to drop every cached answer (e.g. after changing agent instructions)
+CACHE_VERSION = os.environ.get('RESPONSE_CACHE_VERSION', '1')
+
+dynamodb = clients.resource('dynamodb', region_name='us-east-1')
+table = clients.table(dynamodb, CACHE_TABLE)
+
+cache_reads = resilience.Dependency('dynamodb', timeout_ms=CACHE_TIMEOUT_MS, hedge=True, max_retries=0)
+cache_writes = resilience.Dependency('dynamodb', max_retries=1)
+
+logger = logs.get_logger('APIHandler')
+
+# Content-addressed upload keys: uploads/sha256/<hex digest>.<ext>
+CONTENT_KEY = re.compile(r'(?:^|/)sha256/([0-9a-f]{64})\.[a-z0-9]+$')
+
+# Words that point back at earlier turns of the conversation. The agent
+# answers those from its session memory, so a cached answer would be wrong.
+FOLLOW_UP_WORDS = re.compile(
+    r"\b(again|previous|previously|earlier|before|above|last|same|also|instead|"
+    r"more|else|another|other|it|its|they|them|those|these|you said|we discussed)\b"
+)
+# "this"/"that" refer to the attached photo when there is one
+DEMONSTRATIVE_WORDS = re.compile(r"\b(this|that)\b")
+
+_memory = OrderedDict()  # cache_key -> (expires_at, response)
+# The local stream server answers chats on several threads at once
+_lock = threading.Lock()
+
+stats = {'memory_hits': 0, 'dynamodb_hits': 0, 'misses': 0, 'bypasses': 0}
+
+def normalize_query(query):
+    """Case-fold, strip punctuation and collapse whitespace"""
+    text = unicodedata.normalize('NFKC', query).casefold()
+    text = re.sub(r"[^\w\s'-]", ' ', text)
+    return ' '.join(text.split())
+
+def cache_key_for(body, image_key):
+    """
+    Return the cache key for a chat request, or None when it must bypass
+    the cache (explicit opt-out, follow-up questions, uncacheable images)
+    """
+    if not CACHE_ENABLED:
+        return None
+    
+    reason = bypass_reason(body, image_key)
+    if reason:
+        stats['bypasses'] += 1
+        logger.info("Response cache bypass", reason=reason)
+        record_lookup('bypass')
+        return None
+    
+    image_hash = CONTENT_KEY.search(image_key).group(1) if image_key else ''
+    raw_key = '|'.join([CACHE_VERSION, os.environ.get('AGENT_ALIAS_ID', ''), normalize_query(body.get('query', '')), image_hash])
+    return hashlib.sha256(raw_key.encode('utf-8')).hexdigest()
+
+def bypass_reason(body, image_key):
+    """Explain why a request can't be served from cache (None if it can)"""
+    if body.get('cache') is False:
+        return 'client opted out'
+    
+    if body.get('trace') is True:
+        return 'trace requested'
+    
+    query = normalize_query(body.get('query', ''))
+    
+    if len(query) > CACHE_MAX_QUERY_CHARS:
+        return 'query too long to repeat'
+    
+    if image_key and not CONTENT_KEY.search(image_key):
+        return 'image is not content-addressed'
+    
+    if FOLLOW_UP_WORDS.search(query):
+        return 'session-dependent follow-up'
+    
+    if not image_key and DEMONSTRATIVE_WORDS.search(query):
+        return 'refers to an earlier turn'
+    
+    return None
+
+def get(cache_key):
+    """Return (response, tier) for a cached answer, or (None, None)"""
+    if not cache_key:
+        return None, None
+    
+    now = time.time()
+    
+    with _lock:
+        entry = _memory.get(cache_key)
+        if entry and entry[0] <= now:
+            del _memory[cache_key]
+            entry = None
+        if entry:
+            _memory.move_to_end(cache_key)
+    if entry:
+        stats['memory_hits'] += 1
+        record_lookup('hit', 'memory')
+        return entry[1], 'memory'
+    
+    try:
+        with metrics.phase('cache_dynamodb_get'):
+            item = cache_reads.call(table.get_item, Key={'cache_key': cache_key}).get('Item')
+        # DynamoDB TTL deletes lazily, so check expiry ourselves
+        if item and int(item['expires_at']) > now:
+            response = item['response']
+            remember(cache_key, response, int(item['expires_at']))
+            stats['dynamodb_hits'] += 1
+            record_lookup('hit', 'dynamodb')
+            return response, 'dynamodb'
+    except Exception as e:
+        logger.warning("Response cache read error", error=str(e))
+    
+    stats['misses'] += 1
+    record_lookup('miss')
+    return None, None
+
+def put(cache_key, response):
+    """Store an agent answer in both tiers"""
+    if not cache_key or not response.strip():
+        return
+    
+    expires_at = int(time.time()) + CACHE_TTL_SECONDS
+    remember(cache_key, response, expires_at)
+    
+    try:
+        with metrics.phase('cache_dynamodb_put'):
+            cache_writes.call(table.put_item, Item={
+                'cache_key': cache_key,
+                'response': response,
+                'expires_at': expires_at
+            })
+    except Exception as e:
+        logger.warning("Response cache write error", error=str(e))
+
+def remember(cache_key, response, expires_at):
+    """Insert into the in-memory LRU, evicting the oldest entry when full"""
+    with _lock:
+        _memory[cache_key] = (expires_at, response)
+        _memory.move_to_end(cache_key)
+        while len(_memory) > CACHE_MAX_ENTRIES:
+            _memory.popitem(last=False)
+
+def record_lookup(result, tier=None):
+    """Count one lookup (cache_hit, cache_miss or cache_bypass) on the invocation's metrics record"""
+    lookups = stats['memory_hits'] + stats['dynamodb_hits'] + stats['misses']
+    hits = stats['memory_hits'] + stats['dynamodb_hits']
+    
+    timer = metrics.current()
+    timer.count(f"cache_{result}")
+    timer.set_property('CacheTier', tier)
+    if lookups:
+        timer.set_property('CacheContainerHitRate', round(hits / lookups, 3))
\ No newline at end of file
@@ -0,0 +1,3 @@
+#!/bin/bash
+# Lambda Web Adapter entrypoint for the streaming /chat endpoint
+exec python3 stream_server.py --port "${AWS_LWA_PORT:-8080}"
@@ -0,0 +1,128 @@
+# lambdas/api-handler/stream_server.py
+"""
+Streaming /chat server for ThreadHer
+
+Serves POST /chat as server-sent events so the browser renders agent
+chunks as they arrive instead of waiting for the whole answer, and POST
+/analyze-batch the same way so each image of a bulk upload shows up as
+soon as it is analyzed.
+
+In Lambda it runs behind the Lambda Web Adapter layer with
+AWS_LWA_INVOKE_MODE=response_stream (handler: run.sh) and is exposed
+through a Function URL with InvokeMode=RESPONSE_STREAM.
+
+Locally it is the stand-in for that endpoint:
+    python stream_server.py --port 8080 --fake-agent
+"""
+import argparse
+import json
+import os
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import lambda_function
+
+# POST path -> generator of server-sent event frames
+STREAMS = {
+    '': lambda_function.stream_chat,
+    '/chat': lambda_function.stream_chat,
+    '/analyze-batch': lambda_function.stream_analyze_batch
+}
+
+class ChatStreamHandler(BaseHTTPRequestHandler):
+    """Streams lambda_function.stream_chat() (or another STREAMS entry) frames with chunked encoding"""
+    
+    protocol_version = 'HTTP/1.1'
+    
+    def do_OPTIONS(self):
+        self.send_response(200)
+        for name, value in lambda_function.get_cors_headers().items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+    
+    def do_GET(self):
+        # Lambda Web Adapter readiness check
+        if self.path == '/health':
+            payload = b'{"status": "ok"}'
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        else:
+            self.send_error(404)
+    
+    def do_POST(self):
+        stream = STREAMS.get(self.path.rstrip('/'))
+        if stream is None:
+            self.send_error(404)
+            return
+        
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+        except (ValueError, json.JSONDecodeError):
+            body = {}
+        
+        self.send_response(200)
+        for name, value in lambda_function.get_sse_headers().items():
+            self.send_header(name, value)
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        
+        frames = stream(body)
+        try:
+            for frame in frames:
+                self.write_chunk(frame)
+            self.write_chunk(b'')
+        except (BrokenPipeError, ConnectionResetError):
+            # Browser went away - stop reading from the agent (or starting images)
+            lambda_function.logger.info("Client disconnected, closing stream", path=self.path)
+            frames.close()
+            self.close_connection = True
+    
+    def write_chunk(self, data):
+        """Write one HTTP/1.1 chunk and flush it to the client immediately"""
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b"\r\n")
+        self.wfile.flush()
+
+class FakeAgentClient:
+    """Stand-in for bedrock-agent-runtime that streams a canned answer"""
+    
+    ANSWER = (
+        "A cotton t-shirt has a carbon footprint of about 7 kg CO2e. "
+        "Keeping it for two more years is the most sustainable choice - "
+        "wash it cold, air dry it, and repair small holes early."
+    )
+    
+    def __init__(self, chunk_delay=0.05):
+        self.chunk_delay = chunk_delay
+    
+    def invoke_agent(self, **kwargs):
+        return {'completion': self._completion(), 'sessionId': kwargs.get('sessionId')}
+    
+    def _completion(self):
+        for word in self.ANSWER.split(' '):
+            time.sleep(self.chunk_delay)
+            yield {'chunk': {'bytes': (word + ' ').encode('utf-8')}}
+
+def main():
+    parser = argparse.ArgumentParser(description='ThreadHer streaming /chat server')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', 8080)))
+    parser.add_argument('--fake-agent', action='store_true',
+                        help='Stream a canned answer instead of calling Bedrock')
+    parser.add_argument('--chunk-delay', type=float, default=0.05,
+                        help='Seconds between fake agent chunks')
+    args = parser.parse_args()
+    
+    if args.fake_agent:
+        lambda_function.bedrock_agent = FakeAgentClient(args.chunk_delay)
+    
+    server = ThreadingHTTPServer((args.host, args.port), ChatStreamHandler)
+    print(f"Streaming /chat on http://{args.host}:{args.port}/chat")
+    server.serve_forever()
+
+if __name__ == '__main__':
+    main()
\ No newline at end of file
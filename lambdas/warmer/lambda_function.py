@@ -0,0 +1,69 @@
+# lambdas/warmer/lambda_function.py
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from threadher_common import clients, logs
+
+# Initialize Lambda client (created on first use unless CLIENT_INIT_MODE=primed)
+lambda_client = clients.client('lambda', region_name='us-east-1')
+
+clients.init()
+
+logger = logs.get_logger('Warmer')
+
+# Functions to keep warm and how many containers of each
+WARM_FUNCTIONS = [
+    name.strip() for name in os.environ.get(
+        'WARM_FUNCTIONS',
+        'ThreadHer-APIHandler,ThreadHer-ActionHandler,ThreadHer-ImageAnalyzer,'
+        'ThreadHer-CarbonCalculator,ThreadHer-CircularOptions'
+    ).split(',') if name.strip()
+]
+WARM_CONCURRENCY = int(os.environ.get('WARM_CONCURRENCY', 1))
+# Long enough that concurrent pings overlap and land on separate containers
+WARM_DELAY_MS = int(os.environ.get('WARM_DELAY_MS', 150))
+
+def ping(function_name):
+    """Send one warm-up event and return the container's report"""
+    try:
+        response = lambda_client.invoke(
+            FunctionName=function_name,
+            InvocationType='RequestResponse',
+            Payload=json.dumps({
+                'threadher_warmup': True,
+                'delay_ms': WARM_DELAY_MS if WARM_CONCURRENCY > 1 else 0
+            })
+        )
+        result = json.loads(response['Payload'].read() or b'{}')
+        
+        # API Gateway style handlers wrap the report in a body
+        if isinstance(result.get('body'), str):
+            result = json.loads(result['body'])
+        
+        return {'function': function_name, 'ok': result.get('status') == 'warm', 'cold_start': result.get('cold_start')}
+    
+    except Exception as e:
+        logger.warning("Warm-up ping failed", target=function_name, error=str(e))
+        return {'function': function_name, 'ok': False, 'error': str(e)}
+
+def lambda_handler(event, context):
+    """
+    Scheduled keeper: pings every ThreadHer function so containers stay warm
+    Cost is fixed at len(WARM_FUNCTIONS) * WARM_CONCURRENCY short invocations per run
+    """
+    logger.start_invocation(context)
+    targets = [name for name in WARM_FUNCTIONS for _ in range(WARM_CONCURRENCY)]
+    
+    with ThreadPoolExecutor(max_workers=min(32, len(targets) or 1)) as pool:
+        results = list(pool.map(ping, targets))
+    
+    summary = {
+        'pinged': len(results),
+        'failed': sum(1 for r in results if not r['ok']),
+        'cold_starts': sum(1 for r in results if r.get('cold_start')),
+        'results': results
+    }
+    
+    logger.info("Warm-up summary", pinged=summary['pinged'], failed=summary['failed'], cold_starts=summary['cold_starts'], results=results)
+    return summary
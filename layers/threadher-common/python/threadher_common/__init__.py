@@ -0,0 +1,2 @@
+# layers/threadher-common/python/threadher_common/__init__.py
+"""Shared helpers for the ThreadHer Lambda functions (deployed as a Lambda layer)"""
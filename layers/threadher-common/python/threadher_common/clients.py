@@ -0,0 +1,162 @@
+# layers/threadher-common/python/threadher_common/clients.py
+"""
+Shared boto3 client registry
+
+Handlers declare their clients at module level exactly as before, but
+through this registry so the init strategy can be picked per function
+with the CLIENT_INIT_MODE environment variable:
+
+    lazy   - (default) nothing is built at import; each client is created
+             on first use, so a text-only /chat never pays for S3
+    primed - every client is built during the init phase and one TLS
+             connection per endpoint is opened in parallel, so the first
+             request starts on a hot connection
+
+Usage:
+    s3_client = clients.client('s3', region_name='us-east-1')
+    dynamodb = clients.resource('dynamodb', region_name='us-east-1')
+    table = clients.table(dynamodb, 'ThreadHerGarments')
+    clients.init()  # at the end of module init; primes in primed mode
+
+Measure both modes per handler with benchmarks/init_duration.py.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+CLIENT_INIT_MODE = os.environ.get('CLIENT_INIT_MODE', 'lazy').lower()
+PRIME_CONNECTIONS = os.environ.get('CLIENT_PRIME_CONNECTIONS', 'true').lower() == 'true'
+
+_lock = threading.RLock()
+_session = None
+_proxies = []
+_by_key = {}  # identical declarations share one proxy
+
+# name -> milliseconds, for the init report and the benchmark
+timings = {'build_ms': {}, 'connect_ms': {}}
+
+class LazyClient:
+    """Stands in for a boto3 client/resource/table until it is first used"""
+    
+    def __init__(self, name, factory):
+        self._name = name
+        self._factory = factory
+        self._instance = None
+    
+    def _get(self):
+        if self._instance is None:
+            with _lock:
+                if self._instance is None:
+                    start = time.perf_counter()
+                    self._instance = self._factory()
+                    timings['build_ms'][self._name] = round((time.perf_counter() - start) * 1000, 2)
+        return self._instance
+    
+    def __getattr__(self, attr):
+        return getattr(self._get(), attr)
+    
+    def __repr__(self):
+        state = 'built' if self._instance is not None else 'lazy'
+        return f"<LazyClient {self._name} ({state})>"
+
+def session():
+    """One boto3 session per container so service models load only once"""
+    global _session
+    with _lock:
+        if _session is None:
+            # Imported here so lazy mode doesn't pay for boto3 at init either
+            import boto3.session
+            _session = boto3.session.Session()
+        return _session
+
+def client(service_name, config_options=None, **kwargs):
+    """
+    Register a boto3 client
+    config_options become a botocore Config when the client is built, so
+    declaring a client never imports botocore
+    """
+    def build():
+        if config_options:
+            from botocore.config import Config
+            kwargs['config'] = Config(**config_options)
+        return session().client(service_name, **kwargs)
+    
+    return _register(service_name, build, ('client', service_name, _freeze(kwargs), _freeze(config_options)))
+
+def resource(service_name, **kwargs):
+    """Register a boto3 resource"""
+    return _register(f"{service_name}-resource", lambda: session().resource(service_name, **kwargs),
+                     ('resource', service_name, _freeze(kwargs)))
+
+def table(dynamodb_resource, table_name):
+    """Register a DynamoDB Table from a registered resource"""
+    return _register(f"table:{table_name}", lambda: dynamodb_resource.Table(table_name),
+                     ('table', id(dynamodb_resource), table_name))
+
+def _register(name, factory, key):
+    # The handler and the tool modules it imports often declare the same
+    # client - they share it, so primed mode builds and connects it once
+    with _lock:
+        if key in _by_key:
+            return _by_key[key]
+        proxy = LazyClient(name, factory)
+        _proxies.append(proxy)
+        _by_key[key] = proxy
+    return proxy
+
+def _freeze(options):
+    return tuple(sorted((k, repr(v)) for k, v in (options or {}).items()))
+
+def init():
+    """Call once at the end of module init - builds and primes in primed mode"""
+    if CLIENT_INIT_MODE == 'primed':
+        prime()
+
+def prime():
+    """Build every registered client now and pre-open their connections"""
+    # Building shares one session, which is not thread-safe - do it serially
+    with _lock:
+        proxies = list(_proxies)
+    for proxy in proxies:
+        proxy._get()
+    
+    if not PRIME_CONNECTIONS:
+        return
+    
+    # Connecting is pure network wait, so endpoints are opened in parallel
+    from threadher_common.warmup import open_connection
+    
+    def connect(proxy):
+        start = time.perf_counter()
+        if open_connection(proxy):
+            timings['connect_ms'][proxy._name] = round((time.perf_counter() - start) * 1000, 2)
+    
+    # Tables share their resource's endpoint - one connection is enough
+    endpoints = {}
+    for proxy in proxies:
+        if not proxy._name.startswith('table:'):
+            endpoints.setdefault(endpoint_url(proxy._get()), proxy)
+    
+    with ThreadPoolExecutor(max_workers=max(1, len(endpoints))) as pool:
+        list(pool.map(connect, endpoints.values()))
+
+def endpoint_url(obj):
+    """Endpoint of a boto3 client or resource"""
+    if hasattr(obj.meta, 'client'):
+        obj = obj.meta.client
+    return obj.meta.endpoint_url
+
+def registered():
+    """All registered clients (proxies)"""
+    with _lock:
+        return list(_proxies)
+
+def report():
+    """Init mode and per-client timings"""
+    return {
+        'mode': CLIENT_INIT_MODE,
+        'built': sorted(p._name for p in registered() if p._instance is not None),
+        'build_ms': dict(timings['build_ms']),
+        'connect_ms': dict(timings['connect_ms'])
+    }
@@ -0,0 +1,271 @@
+# layers/threadher-common/python/threadher_common/counters.py
+"""
+Aggregated usage counters in DynamoDB, written in batches off the request path
+
+A tool that only needs "how often" (which actions get recommended for
+which garments) keeps one counter per label combination per day instead
+of one item per call. add() bumps an in-process tally that lives across
+warm invocations, sent as atomic UpdateItem ADDs - one per combination
+however many calls it covered - once COUNTER_FLUSH_MS has passed since
+the last flush, or sooner when COUNTER_MAX_PENDING combinations are
+waiting. The check runs when an invocation ends (a metrics.at_finish
+hook - Lambda freezes the container once the handler returns) and on a
+background thread during long invocations. So writes grow with the
+number of distinct combinations per COUNTER_FLUSH_MS, not with traffic.
+
+The price is a bounded loss window: tallies wait in memory, so when
+Lambda reclaims an idle environment it loses what was counted since its
+last flush - at most COUNTER_FLUSH_MS of its calls (fewer combinations
+than COUNTER_MAX_PENDING). A clean shutdown outside Lambda still sends
+them (atexit).
+
+Item layout (one item per day, shard and combination):
+
+    counter_shard   "circular#2026-10-17#3"     partition key
+    combination     "jeans#fair#repair"         sort key
+    <labels>        garment_type, condition... for reading the item
+    count           ADDed
+    expires_at      TTL, COUNTER_TTL_DAYS after the day
+
+Each flush adds to a random one of COUNTER_SHARDS partitions for the day,
+so a hot day (or a hot combination) is spread over several partitions
+instead of throttling one; rollup() sums the shards back together.
+
+An ADD isn't idempotent, so a flush is never retried blindly: tallies the
+service rejected (throttling, an open circuit) go back into the next
+flush, while a write that timed out may have landed and is dropped rather
+than counted twice. Tallies the service keeps rejecting until a
+container is reaped are lost - counters are best-effort, like the
+records they replace.
+
+Environment:
+    COUNTERS_ENABLED      set to false to stop counting (default true)
+    COUNTER_FLUSH_MS      how long tallies are kept before they are sent (default 10000)
+    COUNTER_MAX_PENDING   combinations waiting that force a flush sooner (default 200)
+    COUNTER_SHARDS        partitions per day (default 4)
+    COUNTER_TTL_DAYS      how long a day's counters are kept (default 400)
+
+Usage:
+    usage = counters.Counters('circular', 'ThreadHer-CircularUsage', ('garment_type', 'condition', 'recommended_action'))
+    usage.add({'garment_type': 'jeans', 'condition': 'fair', 'recommended_action': 'repair'})
+    usage.rollup('2026-10-01', '2026-10-17', garment_type='jeans')
+"""
+import atexit
+import calendar
+import functools
+import os
+import random
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from threadher_common import clients, logs, metrics, resilience
+
+COUNTERS_ENABLED = os.environ.get('COUNTERS_ENABLED', 'true').lower() == 'true'
+COUNTER_FLUSH_MS = int(os.environ.get('COUNTER_FLUSH_MS', 10000))
+COUNTER_MAX_PENDING = int(os.environ.get('COUNTER_MAX_PENDING', 200))
+COUNTER_SHARDS = int(os.environ.get('COUNTER_SHARDS', 4))
+COUNTER_TTL_DAYS = int(os.environ.get('COUNTER_TTL_DAYS', 400))
+
+MAX_ROLLUP_DAYS = 366
+SEPARATOR = '#'
+
+logger = logs.get_logger()
+
+# A timed-out ADD may have been applied - only rejected ones are retried
+counter_writes = resilience.Dependency('dynamodb', idempotent=False)
+counter_reads = resilience.Dependency('dynamodb', hedge=True)
+
+_registry = []
+_lock = threading.Lock()
+_worker = None
+# time.monotonic() of the last flush - the first is due COUNTER_FLUSH_MS after init
+_last_flush = time.monotonic()
+
+# Container totals, for tests and the benchmark
+stats = {'added': 0, 'updates': 0, 'requeued': 0, 'dropped': 0}
+
+def label_value(value):
+    """A label as it is stored - the separator can't appear inside a combination"""
+    return str(value or 'unknown').replace(SEPARATOR, '_')
+
+class Counters:
+    """Daily counters per combination of labels, in one table"""
+    
+    def __init__(self, name, table_name, dimensions, shards=COUNTER_SHARDS):
+        self.name = name
+        self.table_name = table_name
+        self.dimensions = tuple(dimensions)
+        self.shards = max(1, shards)
+        self.dynamodb = clients.resource('dynamodb', region_name='us-east-1')
+        self.table = clients.table(self.dynamodb, table_name)
+        # (day, label values) -> count not yet written
+        self._pending = {}
+        self._lock = threading.Lock()
+        with _lock:
+            _registry.append(self)
+    
+    def add(self, labels, count=1):
+        """Count labels (dimension -> value) for today, UTC"""
+        if not COUNTERS_ENABLED:
+            return
+        values = tuple(label_value(labels.get(d)) for d in self.dimensions)
+        tally = (datetime.utcnow().strftime('%Y-%m-%d'), values)
+        with self._lock:
+            self._pending[tally] = self._pending.get(tally, 0) + count
+        stats['added'] += count
+        _ensure_worker()
+    
+    def flush(self, direct=False):
+        """
+        Send every pending tally now, one UpdateItem ADD per day and combination
+        direct skips the dependency wrapper - its thread pool is gone at exit
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        
+        for (day, values), count in pending.items():
+            try:
+                self._update(day, values, count, direct)
+                stats['updates'] += 1
+            except resilience.DependencyUnavailable as e:
+                if isinstance(e, resilience.CircuitOpen) or getattr(e.cause, 'response', None):
+                    # Rejected, so not applied - add it to the next flush
+                    with self._lock:
+                        self._pending[(day, values)] = self._pending.get((day, values), 0) + count
+                    stats['requeued'] += 1
+                else:
+                    stats['dropped'] += 1
+                    logger.warning("Counter update lost", counter=self.name, day=day, count=count, reason=e.reason)
+            except Exception as e:
+                stats['dropped'] += 1
+                logger.error("Counter update rejected", counter=self.name, day=day, count=count, error=str(e))
+    
+    def rollup(self, start_day, end_day=None, by_day=False, **filters):
+        """
+        Totals per combination from start_day to end_day (inclusive,
+        YYYY-MM-DD), with the shards summed - per day too when by_day.
+        filters (dimension=value) narrow the combinations; the leading
+        ones become a key prefix, so only matching items are read.
+        Returns [{<labels>, ['day',] 'count'}], largest count first.
+        """
+        start = date.fromisoformat(start_day)
+        end = date.fromisoformat(end_day) if end_day else start
+        if end < start:
+            raise ValueError("end_day is before start_day")
+        if (end - start).days >= MAX_ROLLUP_DAYS:
+            raise ValueError(f"at most {MAX_ROLLUP_DAYS} days per rollup")
+        unknown = set(filters) - set(self.dimensions)
+        if unknown:
+            raise ValueError(f"unknown dimensions: {', '.join(sorted(unknown))}")
+        
+        prefix = []
+        for dimension in self.dimensions:
+            if filters.get(dimension) is None:
+                break
+            prefix.append(label_value(filters[dimension]))
+        
+        totals = {}
+        day = start
+        while day <= end:
+            for shard in range(self.shards):
+                for item in self._query(self._partition(day.isoformat(), shard), SEPARATOR.join(prefix)):
+                    values = tuple(item['combination'].split(SEPARATOR))
+                    labels = dict(zip(self.dimensions, values))
+                    if any(value is not None and labels.get(d) != label_value(value) for d, value in filters.items()):
+                        continue
+                    group = (day.isoformat() if by_day else None, values)
+                    totals[group] = totals.get(group, 0) + int(item['count'])
+            day += timedelta(days=1)
+        
+        rows = []
+        for (row_day, values), count in totals.items():
+            row = dict(zip(self.dimensions, values))
+            if by_day:
+                row['day'] = row_day
+            row['count'] = count
+            rows.append(row)
+        rows.sort(key=lambda row: (-row['count'], row.get('day', '')))
+        return rows
+    
+    def _partition(self, day, shard):
+        return SEPARATOR.join((self.name, day, str(shard)))
+    
+    def _update(self, day, values, count, direct=False):
+        names = {f"#d{i}": d for i, d in enumerate(self.dimensions)}
+        names['#count'] = 'count'
+        expression_values = {f":d{i}": v for i, v in enumerate(values)}
+        expression_values[':count'] = count
+        expression_values[':expires_at'] = calendar.timegm(date.fromisoformat(day).timetuple()) + COUNTER_TTL_DAYS * 86400
+        labels = ', '.join(f"#d{i} = :d{i}" for i in range(len(values)))
+        
+        update = self.table.update_item if direct else functools.partial(counter_writes.call, self.table.update_item)
+        update(
+            Key={
+                'counter_shard': self._partition(day, random.randrange(self.shards)),
+                'combination': SEPARATOR.join(values)
+            },
+            UpdateExpression=f"ADD #count :count SET {labels}, expires_at = :expires_at",
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=expression_values
+        )
+    
+    def _query(self, partition, prefix):
+        """Every item of one day and shard, starting with prefix (paginated)"""
+        condition = 'counter_shard = :partition'
+        values = {':partition': partition}
+        if prefix:
+            condition += ' AND begins_with(combination, :prefix)'
+            values[':prefix'] = prefix
+        
+        kwargs = {'KeyConditionExpression': condition, 'ExpressionAttributeValues': values}
+        while True:
+            response = counter_reads.call(self.table.query, **kwargs)
+            yield from response.get('Items', [])
+            if 'LastEvaluatedKey' not in response:
+                return
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+def flush(direct=False):
+    """Send the pending tallies of every counter in the container"""
+    global _last_flush
+    _last_flush = time.monotonic()
+    with _lock:
+        registered = list(_registry)
+    for counter in registered:
+        counter.flush(direct)
+
+def flush_due():
+    """True once COUNTER_FLUSH_MS has passed since the last flush, or too many combinations are waiting"""
+    with _lock:
+        registered = list(_registry)
+    pending = sum(len(counter._pending) for counter in registered)
+    if not pending:
+        return False
+    return pending >= COUNTER_MAX_PENDING or (time.monotonic() - _last_flush) * 1000 >= COUNTER_FLUSH_MS
+
+def flush_before_freeze():
+    """flush() at the end of an invocation when it is due - tallies otherwise wait for a later one"""
+    if flush_due():
+        with metrics.phase('counter_flush'):
+            flush()
+
+def _ensure_worker():
+    global _worker
+    if _worker is None:
+        with _lock:
+            if _worker is None:
+                _worker = threading.Thread(target=_run, name='counters', daemon=True)
+                _worker.start()
+
+def _run():
+    while True:
+        time.sleep(COUNTER_FLUSH_MS / 1000)
+        try:
+            flush()
+        except Exception as e:
+            logger.exception("Counter flush failed", error=str(e))
+
+metrics.at_finish(flush_before_freeze)
+# Outside Lambda (scripts, the stream server) also send what's been counted at a clean shutdown
+atexit.register(flush, True)
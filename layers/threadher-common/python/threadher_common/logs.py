@@ -0,0 +1,209 @@
+# layers/threadher-common/python/threadher_common/logs.py
+"""
+Bounded, redacting structured logging for every ThreadHer handler
+
+Each call writes one JSON line to stdout (CloudWatch Logs). Field values
+are sanitized before serialization: image and base64 payloads are
+replaced by a short marker, long strings are cut to LOG_MAX_FIELD_CHARS,
+containers are capped in depth and length, and the whole line is capped
+at LOG_MAX_LINE_CHARS. Nothing is serialized for a disabled level.
+
+Environment:
+    LOG_LEVEL            DEBUG | INFO | WARNING | ERROR (default INFO)
+    LOG_SAMPLE_RATE      fraction of invocations logged at DEBUG (default 0)
+    LOG_MAX_FIELD_CHARS  per string value (default 500)
+    LOG_MAX_LINE_CHARS   per log line (default 8000)
+
+Usage:
+    logger = logs.get_logger('ImageAnalyzer')
+    logger.start_invocation(context)
+    logger.info("Analyzing image", key=image_s3_key)
+"""
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import traceback
+
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+
+LOG_LEVEL = LEVELS.get(os.environ.get('LOG_LEVEL', 'INFO').upper(), 20)
+LOG_SAMPLE_RATE = float(os.environ.get('LOG_SAMPLE_RATE', 0))
+LOG_MAX_FIELD_CHARS = int(os.environ.get('LOG_MAX_FIELD_CHARS', 500))
+LOG_MAX_LINE_CHARS = int(os.environ.get('LOG_MAX_LINE_CHARS', 8000))
+MAX_DEPTH = 4
+MAX_ITEMS = 20
+
+# Keys whose values are never logged
+REDACTED_KEYS = re.compile(r'image_?data|^image$|base64|data_?url|_bytes$|authorization|secret|password|session_?token|api_?key', re.I)
+# data:image/png;base64,.... and long runs of base64 text
+DATA_URL = re.compile(r'^data:[\w/+.-]+;base64,', re.I)
+BASE64_RUN = re.compile(r'^[A-Za-z0-9+/=\r\n]{256,}$')
+
+_invocation = threading.local()
+_invocations = 0
+
+class Logger:
+    """
+    JSON line logger with per-invocation level sampling
+    Invocation state (ids, cold start, sampled level) is per thread, not
+    per logger, so tool modules running in-process inherit the caller's
+    """
+    
+    def __init__(self, function_name):
+        self.function_name = function_name
+    
+    def start_invocation(self, context=None, correlation_id=None):
+        """Bind the request/correlation ids and roll the DEBUG sampling dice for this invocation"""
+        global _invocations
+        _invocations += 1
+        _invocation.request_id = getattr(context, 'aws_request_id', None)
+        _invocation.correlation_id = correlation_id
+        _invocation.cold_start = _invocations == 1
+        _invocation.level = LOG_LEVEL
+        if LOG_SAMPLE_RATE and random.random() < LOG_SAMPLE_RATE:
+            _invocation.level = LEVELS['DEBUG']
+    
+    @property
+    def level(self):
+        return getattr(_invocation, 'level', LOG_LEVEL)
+    
+    @level.setter
+    def level(self, value):
+        _invocation.level = value
+    
+    @property
+    def request_id(self):
+        return getattr(_invocation, 'request_id', None)
+    
+    @property
+    def correlation_id(self):
+        return getattr(_invocation, 'correlation_id', None)
+    
+    @property
+    def cold_start(self):
+        return getattr(_invocation, 'cold_start', _invocations == 0)
+    
+    def is_enabled(self, level):
+        return LEVELS[level] >= self.level
+    
+    def debug(self, message, **fields):
+        self._log('DEBUG', message, fields)
+    
+    def info(self, message, **fields):
+        self._log('INFO', message, fields)
+    
+    def warning(self, message, **fields):
+        self._log('WARNING', message, fields)
+    
+    def error(self, message, **fields):
+        self._log('ERROR', message, fields)
+    
+    def exception(self, message, **fields):
+        """ERROR with the current traceback (last frames only)"""
+        fields['traceback'] = traceback.format_exc()[-LOG_MAX_FIELD_CHARS * 4:]
+        self._log('ERROR', message, fields, max_field_chars=LOG_MAX_FIELD_CHARS * 4)
+    
+    def _log(self, level, message, fields, max_field_chars=LOG_MAX_FIELD_CHARS):
+        if LEVELS[level] < self.level:
+            return
+        
+        record = {
+            'timestamp': round(time.time(), 3),
+            'level': level,
+            'function': self.function_name,
+            'message': truncate(str(message), max_field_chars)
+        }
+        if self.request_id:
+            record['request_id'] = self.request_id
+        if self.correlation_id and self.correlation_id != self.request_id:
+            record['correlation_id'] = self.correlation_id
+        if self.cold_start:
+            record['cold_start'] = True
+        
+        for key, value in fields.items():
+            record[key] = sanitize(key, value, 0, max_field_chars)
+        
+        line = json.dumps(record, default=str, separators=(',', ':'))
+        if len(line) > LOG_MAX_LINE_CHARS:
+            line = json.dumps({
+                'timestamp': record['timestamp'],
+                'level': level,
+                'function': self.function_name,
+                'message': record['message'],
+                'request_id': self.request_id,
+                'truncated': True,
+                'fields': line[:LOG_MAX_LINE_CHARS // 2]
+            }, separators=(',', ':'))
+        
+        sys.stdout.write(line + '\n')
+
+def sanitize(key, value, depth=0, max_field_chars=LOG_MAX_FIELD_CHARS):
+    """Redact and bound one field value before it is serialized"""
+    if isinstance(key, str) and REDACTED_KEYS.search(key) and value:
+        return redaction_marker(value)
+    
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    
+    if isinstance(value, (bytes, bytearray)):
+        return f"[{len(value)} bytes]"
+    
+    if isinstance(value, str):
+        if DATA_URL.match(value) or BASE64_RUN.match(value):
+            return redaction_marker(value)
+        # API Gateway bodies arrive as JSON strings - redact inside them too
+        if value[:1] == '{' and '"' in value and len(value) > max_field_chars // 2:
+            try:
+                return sanitize(key, json.loads(value), depth, max_field_chars)
+            except ValueError:
+                pass
+        return truncate(value, max_field_chars)
+    
+    if depth >= MAX_DEPTH:
+        return f"[{type(value).__name__} depth>{MAX_DEPTH}]"
+    
+    if isinstance(value, dict):
+        items = list(value.items())
+        result = {str(k): sanitize(k, v, depth + 1, max_field_chars) for k, v in items[:MAX_ITEMS]}
+        if len(items) > MAX_ITEMS:
+            result['_omitted_keys'] = len(items) - MAX_ITEMS
+        return result
+    
+    if isinstance(value, (list, tuple, set)):
+        items = list(value)
+        result = [sanitize(key, v, depth + 1, max_field_chars) for v in items[:MAX_ITEMS]]
+        if len(items) > MAX_ITEMS:
+            result.append(f"[{len(items) - MAX_ITEMS} more]")
+        return result
+    
+    return truncate(str(value), max_field_chars)
+
+def redaction_marker(value):
+    size = len(value) if hasattr(value, '__len__') else 0
+    return f"[redacted {size} chars]" if isinstance(value, str) else f"[redacted {type(value).__name__}]"
+
+def truncate(text, limit):
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}...[+{len(text) - limit} chars]"
+
+def current_invocation():
+    """This thread's invocation state, to hand to worker threads"""
+    return dict(vars(_invocation))
+
+def bind_invocation(state):
+    """Adopt an invocation's state (ids, sampled level) on a worker thread"""
+    vars(_invocation).update(state)
+
+_loggers = {}
+
+def get_logger(function_name=None):
+    """One logger per function name (defaults to the Lambda function name)"""
+    name = function_name or os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'threadher')
+    if name not in _loggers:
+        _loggers[name] = Logger(name)
+    return _loggers[name]
@@ -0,0 +1,167 @@
+# layers/threadher-common/python/threadher_common/memo.py
+"""
+Two-tier memoization for pure tool results
+
+Tier 1 is an in-process LRU with a TTL that lives as long as the warm
+container. Tier 2 is an optional DynamoDB table shared by every
+container and function, expired by TTL. Keys are the SHA-256 of the
+tool name, its data version and the canonicalized parameters (sorted
+keys, compact JSON), so equal calls hit whatever order or container
+they come from.
+
+A tool's data version is a hash of the factor tables it reads
+(data_version(RECOMMENDED_LIFESPAN, ...)): editing a table changes every
+key, and entries computed from the old data are never read again. Bump
+TOOL_MEMO_VERSION after changing how a result is computed. A version may
+be a callable, resolved when the first key is made - for data that is
+only loaded on first use.
+
+Every lookup counts memo_hits / memo_misses on the invocation's metrics
+record, with the tier per tool and the container hit rate as properties.
+
+Environment:
+    TOOL_MEMO_ENABLED       set to false to always recompute
+    TOOL_MEMO_TTL_SECONDS   entry lifetime in both tiers (default 86400)
+    TOOL_MEMO_MAX_ENTRIES   in-process LRU size (default 512)
+    TOOL_MEMO_TABLE         shared tier table (e.g. ThreadHer-ToolMemo); unset keeps memoization in-process
+    TOOL_MEMO_VERSION       bump to drop every memoized result
+
+Usage:
+    carbon_memo = memo.Memo('carbon', memo.data_version(RECOMMENDED_LIFESPAN))
+    key = carbon_memo.key(params)
+    result, tier = carbon_memo.get(key)
+    if tier is None:
+        result = compute(params)
+        carbon_memo.put(key, result)
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from threadher_common import clients, logs, metrics
+
+MEMO_ENABLED = os.environ.get('TOOL_MEMO_ENABLED', 'true').lower() == 'true'
+MEMO_TTL_SECONDS = int(os.environ.get('TOOL_MEMO_TTL_SECONDS', 24 * 3600))
+MEMO_MAX_ENTRIES = int(os.environ.get('TOOL_MEMO_MAX_ENTRIES', 512))
+MEMO_TABLE = os.environ.get('TOOL_MEMO_TABLE', '')
+MEMO_VERSION = os.environ.get('TOOL_MEMO_VERSION', '1')
+
+logger = logs.get_logger()
+
+# One LRU for every tool in the container - memo_key -> (expires_at, JSON text)
+_memory = OrderedDict()
+_lock = threading.Lock()
+
+stats = {'memory_hits': 0, 'dynamodb_hits': 0, 'misses': 0}
+
+def data_version(*tables):
+    """Short hash of the data a tool computes from"""
+    text = json.dumps(tables, sort_keys=True, default=str, separators=(',', ':'))
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()[:12]
+
+def canonical(params):
+    """Order-independent text for a parameter dict"""
+    return json.dumps(params, sort_keys=True, default=str, separators=(',', ':'))
+
+class Memo:
+    """Memoized results of one tool"""
+    
+    def __init__(self, name, version='', shared=True):
+        """shared=False keeps results in-process - for tools cheaper than a DynamoDB read"""
+        self.name = name
+        self.version = version
+        self.table = None
+        if shared and MEMO_TABLE:
+            dynamodb = clients.resource('dynamodb', region_name='us-east-1')
+            self.table = clients.table(dynamodb, MEMO_TABLE)
+    
+    def key(self, params):
+        version = self.version
+        if callable(version):
+            version = self.version = version()
+        raw_key = '|'.join([MEMO_VERSION, self.name, version, canonical(params)])
+        return hashlib.sha256(raw_key.encode('utf-8')).hexdigest()
+    
+    def get(self, memo_key):
+        """Return (result, tier) for a memoized result, or (None, None)"""
+        if not MEMO_ENABLED:
+            return None, None
+        
+        now = time.time()
+        
+        with _lock:
+            entry = _memory.get(memo_key)
+            if entry and entry[0] <= now:
+                del _memory[memo_key]
+                entry = None
+            if entry:
+                _memory.move_to_end(memo_key)
+        if entry:
+            self._record('memory')
+            # Stored as JSON so callers can't mutate the cached copy
+            return json.loads(entry[1]), 'memory'
+        
+        if self.table is not None:
+            try:
+                with metrics.phase('memo_dynamodb_get'):
+                    item = self.table.get_item(Key={'memo_key': memo_key}).get('Item')
+                # DynamoDB TTL deletes lazily, so check expiry ourselves
+                if item and int(item['expires_at']) > now:
+                    remember(memo_key, item['result'], int(item['expires_at']))
+                    self._record('dynamodb')
+                    return json.loads(item['result']), 'dynamodb'
+            except Exception as e:
+                logger.warning("Tool memo read error", tool=self.name, error=str(e))
+        
+        self._record(None)
+        return None, None
+    
+    def put(self, memo_key, result):
+        """Store a result in both tiers"""
+        if not MEMO_ENABLED:
+            return
+        
+        text = json.dumps(result, default=str, separators=(',', ':'))
+        expires_at = int(time.time()) + MEMO_TTL_SECONDS
+        remember(memo_key, text, expires_at)
+        
+        if self.table is not None:
+            try:
+                with metrics.phase('memo_dynamodb_put'):
+                    self.table.put_item(Item={
+                        'memo_key': memo_key,
+                        'tool': self.name,
+                        'result': text,
+                        'expires_at': expires_at
+                    })
+            except Exception as e:
+                logger.warning("Tool memo write error", tool=self.name, error=str(e))
+    
+    def _record(self, tier):
+        timer = metrics.current()
+        if tier is None:
+            stats['misses'] += 1
+            timer.count('memo_misses')
+        else:
+            stats[f"{tier}_hits"] += 1
+            timer.count('memo_hits')
+        
+        lookups = stats['memory_hits'] + stats['dynamodb_hits'] + stats['misses']
+        timer.set_property(f"Memo_{self.name}", tier or 'miss')
+        timer.set_property('MemoContainerHitRate', round((lookups - stats['misses']) / lookups, 3))
+
+def remember(memo_key, text, expires_at):
+    """Insert into the in-process LRU, evicting the oldest entry when full"""
+    with _lock:
+        _memory[memo_key] = (expires_at, text)
+        _memory.move_to_end(memo_key)
+        while len(_memory) > MEMO_MAX_ENTRIES:
+            _memory.popitem(last=False)
+
+def clear():
+    """Drop the in-process tier (tests and benchmarks)"""
+    with _lock:
+        _memory.clear()
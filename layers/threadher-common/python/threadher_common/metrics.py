@@ -0,0 +1,249 @@
+# layers/threadher-common/python/threadher_common/metrics.py
+"""
+Per-phase latency metrics for ThreadHer handlers
+
+Each invocation gets a PhaseTimer. Handlers time the interesting parts
+of a request (S3 get, Rekognition, Claude, agent first chunk, DynamoDB
+write...) and one CloudWatch Embedded Metric Format record is written
+when the invocation ends, so CloudWatch builds p50/p99 per phase and
+function without any PutMetricData calls.
+
+The correlation id comes from the caller (X-Correlation-Id header,
+correlation_id field or Bedrock session attribute) and falls back to
+the Lambda request id. It is written as a property, not a dimension,
+so it can be searched in Logs Insights without exploding metric cost.
+
+Environment:
+    METRICS_NAMESPACE  CloudWatch namespace (default ThreadHer)
+    METRICS_ENABLED    set to false to drop every record
+
+Usage:
+    @metrics.timed('ImageAnalyzer')
+    def lambda_handler(event, context):
+        with metrics.phase('rekognition'):
+            labels = detect_labels(...)
+
+Work that must land before the container is frozen (queued writes,
+pending counters) registers an at_finish() hook: it runs when the
+invocation ends, inside its timer, before the record is emitted.
+
+Tests swap the stdout exporter for a MemoryExporter:
+    exporter = metrics.MemoryExporter()
+    metrics.set_exporter(exporter)
+    lambda_handler(event, None)
+    exporter.phases()  # {'rekognition': 12.3, ..., 'total': 40.1}
+"""
+import functools
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+from threadher_common import logs, warmup
+
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'ThreadHer')
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+
+CORRELATION_HEADER = 'x-correlation-id'
+CORRELATION_FIELD = 'correlation_id'
+
+_local = threading.local()
+_finish_hooks = []
+
+class PhaseTimer:
+    """Collects phase durations (ms) for one invocation"""
+    
+    def __init__(self, function_name, correlation_id=None):
+        self.function_name = function_name
+        self.correlation_id = correlation_id or str(uuid.uuid4())
+        self.started = time.perf_counter()
+        self.phases = {}
+        self.counts = {}
+        self.properties = {}
+        # Phases may be recorded from worker threads (see bind)
+        self._lock = threading.Lock()
+    
+    @contextmanager
+    def phase(self, name):
+        """Time a block; repeated phases add up"""
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.record(name, (time.perf_counter() - start) * 1000)
+    
+    def record(self, name, duration_ms):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + duration_ms
+    
+    def mark(self, name):
+        """Record the time since the invocation started (e.g. first agent chunk)"""
+        if name not in self.phases:
+            self.phases[name] = (time.perf_counter() - self.started) * 1000
+    
+    def count(self, name, value=1):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+    
+    def set_property(self, key, value):
+        """Attach a searchable, non-metric field to the record"""
+        self.properties[key] = value
+    
+    def summary(self):
+        """Rounded phase durations, including the running total"""
+        phases = {name: round(ms, 2) for name, ms in self.phases.items()}
+        phases['total'] = round((time.perf_counter() - self.started) * 1000, 2)
+        return phases
+    
+    def emit(self):
+        """Write the EMF record for this invocation and return it"""
+        phases = self.summary()
+        
+        definitions = [{'Name': name, 'Unit': 'Milliseconds'} for name in phases]
+        definitions += [{'Name': name, 'Unit': 'Count'} for name in self.counts]
+        
+        record = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': METRICS_NAMESPACE,
+                    'Dimensions': [['Function']],
+                    'Metrics': definitions
+                }]
+            },
+            'Function': self.function_name,
+            'CorrelationId': self.correlation_id
+        }
+        record.update(self.properties)
+        record.update(phases)
+        record.update(self.counts)
+        
+        export(record)
+        return record
+
+class StdoutExporter:
+    """Default exporter: one JSON line per record, picked up by CloudWatch Logs"""
+    
+    def __call__(self, record):
+        sys.stdout.write(json.dumps(record, default=str, separators=(',', ':')) + '\n')
+
+class MemoryExporter:
+    """Keeps records in memory - for tests and local benchmarks"""
+    
+    def __init__(self):
+        self.records = []
+    
+    def __call__(self, record):
+        self.records.append(record)
+    
+    def phases(self, index=-1):
+        """Phase durations of one captured record (the latest by default)"""
+        record = self.records[index]
+        names = [m['Name'] for m in record['_aws']['CloudWatchMetrics'][0]['Metrics']]
+        return {name: record[name] for name in names}
+    
+    def clear(self):
+        self.records.clear()
+
+_exporter = StdoutExporter()
+
+def set_exporter(exporter):
+    """Replace the exporter (any callable taking the record); returns the old one"""
+    global _exporter
+    previous, _exporter = _exporter, exporter
+    return previous
+
+def export(record):
+    if METRICS_ENABLED:
+        _exporter(record)
+
+def correlation_id_from(event, context=None):
+    """Caller-supplied correlation id, else the Lambda request id"""
+    if isinstance(event, dict):
+        headers = event.get('headers') or {}
+        for key, value in headers.items():
+            if key.lower() == CORRELATION_HEADER and value:
+                return str(value)
+        
+        # Bedrock Agent action groups receive it as a session attribute
+        attributes = event.get('sessionAttributes') or {}
+        if attributes.get(CORRELATION_FIELD):
+            return str(attributes[CORRELATION_FIELD])
+        
+        # Tool invocations from the action handler carry it in the payload
+        if event.get(CORRELATION_FIELD):
+            return str(event[CORRELATION_FIELD])
+        
+        body = event.get('body', event)
+        if isinstance(body, str) and CORRELATION_FIELD in body:
+            try:
+                body = json.loads(body)
+            except ValueError:
+                body = {}
+        if isinstance(body, dict) and body.get(CORRELATION_FIELD):
+            return str(body[CORRELATION_FIELD])
+    
+    return getattr(context, 'aws_request_id', None)
+
+def start(function_name, event=None, context=None):
+    """Begin timing an invocation on this thread"""
+    timer = PhaseTimer(function_name, correlation_id_from(event, context))
+    _local.timer = timer
+    return timer
+
+def current():
+    """The active timer on this thread (a detached one outside handlers)"""
+    timer = getattr(_local, 'timer', None)
+    if timer is None:
+        timer = _local.timer = PhaseTimer('unknown')
+    return timer
+
+def bind(timer):
+    """Make timer the active one on this thread - for work handed to a thread pool"""
+    _local.timer = timer
+
+def phase(name):
+    """Time a block against the active invocation"""
+    return current().phase(name)
+
+def at_finish(hook):
+    """Call hook() at the end of every invocation (see finish)"""
+    if hook not in _finish_hooks:
+        _finish_hooks.append(hook)
+    return hook
+
+def finish():
+    """Run the at_finish hooks, then emit the active invocation's record and detach it"""
+    timer = getattr(_local, 'timer', None)
+    if timer is not None:
+        # Lambda freezes the container as soon as the handler returns -
+        # background threads would only get to run on the next invocation
+        for hook in _finish_hooks:
+            try:
+                hook()
+            except Exception as e:
+                logs.get_logger().exception("Invocation end hook failed", hook=getattr(hook, '__qualname__', str(hook)), error=str(e))
+    _local.timer = None
+    if timer is not None and timer.function_name != 'unknown':
+        return timer.emit()
+    return None
+
+def timed(function_name):
+    """Decorator: time the whole handler and emit one record when it returns"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            # Keeper pings would only skew the latency percentiles
+            if warmup.is_warmup_event(event):
+                return handler(event, context)
+            
+            start(function_name, event, context)
+            try:
+                return handler(event, context)
+            finally:
+                finish()
+        return wrapper
+    return decorator
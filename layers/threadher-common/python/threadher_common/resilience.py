@@ -0,0 +1,497 @@
+# layers/threadher-common/python/threadher_common/resilience.py
+"""
+Deadlines, timeouts, retries, hedging and circuit breaking for downstream calls
+
+Each invocation gets a deadline: the Lambda's remaining time minus a
+safety margin, or the caller's deadline when it is sooner (tool Lambdas
+receive it as deadline_at_ms in their payload). Every downstream call
+goes through a Dependency, which:
+
+    - runs the call with timeout = min(the dependency's timeout, time left)
+    - retries throttling and transient errors with full-jitter backoff;
+      delays grow with the dependency's recent throttle rate, and a
+      retry budget (tokens refilled by successes) stops retry storms.
+      A call that isn't idempotent (it changes state) is only retried
+      when it certainly wasn't applied - the service rejected it, or it
+      never left - never after a timeout, when it may still be running
+    - hedges idempotent calls: when the first attempt is slower than the
+      dependency's recent p90, a second identical request is sent and
+      the first answer wins
+    - keeps a circuit breaker: after CIRCUIT_FAILURE_THRESHOLD straight
+      failures calls fail fast for CIRCUIT_COOLDOWN_SECONDS, then one
+      trial call decides whether it closes again
+
+When a call can't succeed in time it raises DependencyUnavailable, or
+returns fallback(error) when the caller passes a degraded result:
+
+    rekognition_dep = resilience.Dependency('rekognition', hedge=True)
+    labels = rekognition_dep.call(rekognition.detect_labels, fallback=lambda e: {'Labels': []}, Image=...)
+
+botocore's own retries would stack up behind ours, so clients that go
+through a Dependency are declared with client_config(name): read
+timeout of the dependency, a single attempt.
+
+Work that fans out over many calls (batches) sizes itself with an
+AdaptiveLimiter: concurrency grows by one per round of completions and
+halves when the dependencies it watches were throttled, so a batch
+settles just below the account's limits instead of retrying into them.
+
+Environment:
+    DEADLINE_MARGIN_MS             kept back from the Lambda timeout to answer in (default 1000)
+    DEFAULT_DEADLINE_MS            budget when there is no Lambda context, e.g. streaming (default 29000)
+    DEPENDENCY_TIMEOUTS_MS         per dependency overrides, "s3=2000,rekognition=4000"
+    DEPENDENCY_MAX_RETRIES         retries per call (default 2)
+    CIRCUIT_FAILURE_THRESHOLD      consecutive failures that open a circuit (default 5)
+    CIRCUIT_COOLDOWN_SECONDS       how long an open circuit fails fast (default 30)
+    DEPENDENCY_POOL_SIZE           threads per dependency running its calls and hedges (default 8)
+"""
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from threadher_common import logs, metrics
+
+DEADLINE_MARGIN_MS = int(os.environ.get('DEADLINE_MARGIN_MS', 1000))
+DEFAULT_DEADLINE_MS = int(os.environ.get('DEFAULT_DEADLINE_MS', 29000))
+DEPENDENCY_MAX_RETRIES = int(os.environ.get('DEPENDENCY_MAX_RETRIES', 2))
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', 5))
+CIRCUIT_COOLDOWN_SECONDS = float(os.environ.get('CIRCUIT_COOLDOWN_SECONDS', 30))
+DEPENDENCY_POOL_SIZE = int(os.environ.get('DEPENDENCY_POOL_SIZE', 8))
+
+DEADLINE_FIELD = 'deadline_at_ms'
+
+# Per dependency timeout (ms) - overridable with DEPENDENCY_TIMEOUTS_MS
+TIMEOUTS_MS = {
+    's3': 3000,
+    'rekognition': 5000,
+    'bedrock-runtime': 25000,
+    'bedrock-agent-runtime': 25000,
+    'lambda': 25000,
+    'dynamodb': 1000,
+    'default': 5000
+}
+for _override in filter(None, os.environ.get('DEPENDENCY_TIMEOUTS_MS', '').split(',')):
+    _name, _, _ms = _override.partition('=')
+    TIMEOUTS_MS[_name.strip()] = int(_ms)
+
+# Error codes worth another attempt; anything else is the caller's problem
+THROTTLE_CODES = {
+    'ThrottlingException', 'Throttling', 'TooManyRequestsException', 'ProvisionedThroughputExceededException',
+    'RequestLimitExceeded', 'SlowDown', 'ThrottledException', 'RequestThrottled', 'RequestThrottledException',
+    'LimitExceededException'
+}
+TRANSIENT_CODES = {
+    'InternalServerError', 'InternalFailure', 'ServiceUnavailable', 'ServiceUnavailableException',
+    'InternalServerException', 'ModelNotReadyException', 'RequestTimeout', 'RequestTimeoutException'
+}
+# botocore network errors, matched by name so botocore isn't imported
+NETWORK_ERRORS = {'EndpointConnectionError', 'ConnectTimeoutError', 'ReadTimeoutError', 'ConnectionClosedError'}
+# The ones raised before the request reached the service
+NOT_SENT_ERRORS = {'EndpointConnectionError', 'ConnectTimeoutError'}
+
+BACKOFF_BASE_MS = 50
+BACKOFF_CAP_MS = 2000
+RETRY_TOKENS = 10.0
+
+logger = logs.get_logger()
+
+_local = threading.local()
+# Dependency name -> (pool, free threads); see Dependency._start
+_pools = {}
+_pools_lock = threading.Lock()
+
+class DependencyUnavailable(Exception):
+    """A downstream call gave up: deadline, timeout, open circuit or exhausted retries"""
+    
+    def __init__(self, dependency, reason, cause=None):
+        super().__init__(f"{dependency} unavailable: {reason}")
+        self.dependency = dependency
+        self.reason = reason
+        self.cause = cause
+
+class DeadlineExceeded(DependencyUnavailable):
+    pass
+
+class CircuitOpen(DependencyUnavailable):
+    pass
+
+class Saturated(DependencyUnavailable):
+    """Every thread of the dependency is busy - the request was never sent"""
+    pass
+
+def start(context=None, event=None):
+    """Set this invocation's deadline (epoch ms) from the Lambda context and the caller's payload"""
+    now_ms = time.time() * 1000
+    if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        deadline = now_ms + context.get_remaining_time_in_millis() - DEADLINE_MARGIN_MS
+    else:
+        deadline = now_ms + DEFAULT_DEADLINE_MS
+    
+    caller_deadline = event.get(DEADLINE_FIELD) if isinstance(event, dict) else None
+    if caller_deadline:
+        deadline = min(deadline, float(caller_deadline))
+    
+    _local.deadline = deadline
+    return deadline
+
+def deadline():
+    """This invocation's deadline in epoch ms, or None outside an invocation"""
+    return getattr(_local, 'deadline', None)
+
+def remaining_ms():
+    """Milliseconds left before the deadline (None when there is none)"""
+    current = deadline()
+    return None if current is None else current - time.time() * 1000
+
+def propagate(payload):
+    """payload plus the deadline field, for a downstream Lambda"""
+    current = deadline()
+    return dict(payload, **{DEADLINE_FIELD: int(current)}) if current else payload
+
+def submit(pool, fn, *args, **kwargs):
+    """Run fn on a pool thread with this invocation's metrics timer, log ids and deadline"""
+    timer = metrics.current()
+    log_state = logs.current_invocation()
+    current = deadline()
+    
+    def run():
+        metrics.bind(timer)
+        logs.bind_invocation(log_state)
+        _local.deadline = current
+        return fn(*args, **kwargs)
+    
+    return pool.submit(run)
+
+def client_config(name, **config_options):
+    """botocore Config options for a client behind Dependency(name)"""
+    timeout_s = TIMEOUTS_MS.get(name, TIMEOUTS_MS['default']) / 1000
+    config_options.setdefault('connect_timeout', min(timeout_s, 2))
+    config_options.setdefault('read_timeout', timeout_s)
+    config_options.setdefault('retries', {'total_max_attempts': 1})
+    return config_options
+
+def error_kind(error):
+    """'throttle', 'transient' or None (not worth retrying)"""
+    if isinstance(error, (DependencyUnavailable, TimeoutError)):
+        return 'transient'
+    if type(error).__name__ in NETWORK_ERRORS:
+        return 'transient'
+    
+    response = getattr(error, 'response', None) or {}
+    code = (response.get('Error') or {}).get('Code', '')
+    status = (response.get('ResponseMetadata') or {}).get('HTTPStatusCode', 0)
+    if code in THROTTLE_CODES or status == 429:
+        return 'throttle'
+    if code in TRANSIENT_CODES or status >= 500:
+        return 'transient'
+    return None
+
+def rejected(error):
+    """True when the request certainly wasn't applied: the service answered with an error, or it never left"""
+    if isinstance(error, Saturated) or type(error).__name__ in NOT_SENT_ERRORS:
+        return True
+    response = getattr(error, 'response', None) or {}
+    return bool((response.get('Error') or {}).get('Code') or (response.get('ResponseMetadata') or {}).get('HTTPStatusCode'))
+
+class CircuitBreaker:
+    """closed -> open after consecutive failures -> half-open trial after the cooldown"""
+    
+    def __init__(self, failure_threshold=CIRCUIT_FAILURE_THRESHOLD, cooldown_seconds=CIRCUIT_COOLDOWN_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.failures = 0
+        self.opened_at = None
+        self.trial_running = False
+        self._lock = threading.Lock()
+    
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.time() - self.opened_at < self.cooldown_seconds:
+            return 'open'
+        return 'half_open'
+    
+    def allow(self):
+        """May a call go out now? In half-open state only one trial at a time"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self.trial_running:
+                self.trial_running = True
+                return True
+            return False
+    
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial_running = False
+    
+    def release(self):
+        """Give up a half-open trial without a verdict (e.g. out of time)"""
+        with self._lock:
+            self.trial_running = False
+    
+    def record_failure(self):
+        """Returns True when this failure opened the circuit"""
+        with self._lock:
+            self.failures += 1
+            was_open = self.opened_at is not None
+            if self.trial_running or self.failures >= self.failure_threshold:
+                self.opened_at = time.time()
+            self.trial_running = False
+            return self.opened_at is not None and not was_open
+
+class Dependency:
+    """One downstream service, with its own timeout, retry budget, hedging and circuit"""
+    
+    def __init__(self, name, timeout_ms=None, hedge=False, hedge_after_ms=None, max_retries=DEPENDENCY_MAX_RETRIES, idempotent=True):
+        """
+        idempotent=False for calls that change state: they are retried only
+        when rejected (throttled, 5xx), never after a timeout, and never hedged
+        """
+        if hedge and not idempotent:
+            raise ValueError(f"{name}: a call that isn't idempotent can't be hedged")
+        self.name = name
+        self.idempotent = idempotent
+        self.metric = name.replace('-', '_')
+        self.timeout_ms = timeout_ms or TIMEOUTS_MS.get(name, TIMEOUTS_MS['default'])
+        self.hedge = hedge
+        self.hedge_after_ms = hedge_after_ms or self.timeout_ms / 4
+        self.max_retries = max_retries
+        self.circuit = CircuitBreaker()
+        self.retry_tokens = RETRY_TOKENS
+        self.throttle_rate = 0.0  # EWMA of throttled attempts
+        self.throttles = 0  # throttled attempts, retried or not
+        self.latencies = deque(maxlen=50)
+        self._lock = threading.Lock()
+    
+    def call(self, fn, *args, fallback=None, **kwargs):
+        """
+        fn(*args, **kwargs) within the deadline, with retries and hedging
+        On failure returns fallback(error) when given, else raises
+        """
+        timer = metrics.current()
+        try:
+            return self._call(timer, fn, args, kwargs)
+        except DependencyUnavailable as e:
+            if fallback is None:
+                raise
+            logger.warning("Degraded result", dependency=self.name, reason=e.reason)
+            timer.count(f"{self.metric}_degraded")
+            timer.set_property('Degraded', sorted(set(timer.properties.get('Degraded', [])) | {self.name}))
+            return fallback(e)
+    
+    def _call(self, timer, fn, args, kwargs):
+        if not self.circuit.allow():
+            timer.count(f"{self.metric}_circuit_open")
+            raise CircuitOpen(self.name, 'circuit open')
+        
+        attempt = 0
+        while True:
+            left = remaining_ms()
+            if left is not None and left <= 0:
+                self.circuit.release()
+                raise DeadlineExceeded(self.name, 'deadline exceeded')
+            timeout_ms = self.timeout_ms if left is None else min(self.timeout_ms, left)
+            
+            try:
+                result = self._attempt(timer, fn, args, kwargs, timeout_ms)
+            except Exception as e:
+                kind = error_kind(e)
+                self._observe(throttled=kind == 'throttle')
+                if kind is None:
+                    # The service answered - the request itself was wrong
+                    self.circuit.record_success()
+                    raise
+                
+                delay_ms = self._backoff_ms(attempt)
+                left = remaining_ms()
+                out_of_time = left is not None and left <= delay_ms + 50
+                # A timed-out state change may have run (or still be running) - don't send it again
+                may_have_run = not self.idempotent and not rejected(e)
+                if attempt >= self.max_retries or out_of_time or may_have_run or not self._take_retry_token():
+                    if self.circuit.record_failure():
+                        logger.warning("Circuit opened", dependency=self.name, cooldown_seconds=self.circuit.cooldown_seconds)
+                    reason = 'timed out' if isinstance(e, TimeoutError) else f"{kind} error: {e}"
+                    raise DependencyUnavailable(self.name, reason, e) from e
+                
+                attempt += 1
+                timer.count(f"{self.metric}_retries")
+                time.sleep(delay_ms / 1000)
+                continue
+            
+            self._observe(throttled=False)
+            with self._lock:
+                self.retry_tokens = min(RETRY_TOKENS, self.retry_tokens + 0.1)
+            self.circuit.record_success()
+            return result
+    
+    def _attempt(self, timer, fn, args, kwargs, timeout_ms):
+        """
+        One attempt (plus a hedge), bounded by timeout_ms from when it starts
+        running; raises TimeoutError, or Saturated when no thread is free
+        """
+        first = self._start(fn, args, kwargs)
+        if first is None:
+            timer.count(f"{self.metric}_saturated")
+            raise Saturated(self.name, 'every thread busy')
+        future, running = first
+        
+        # The clock starts when the call runs, not while it waits for a thread
+        if not running.wait(timeout=timeout_ms / 1000) and future.cancel():
+            self._slots().release()
+            timer.count(f"{self.metric}_timeouts")
+            raise TimeoutError(f"{self.name} didn't start within {round(timeout_ms)} ms")
+        started = time.perf_counter()
+        futures = [future]
+        
+        if self.hedge:
+            hedge_ms = min(self.hedge_delay_ms(), timeout_ms)
+            done, _ = wait(futures, timeout=hedge_ms / 1000)
+            if not done and (time.perf_counter() - started) * 1000 < timeout_ms:
+                # No thread to spare - the first request carries on alone
+                second = self._start(fn, args, kwargs)
+                if second is not None:
+                    timer.count(f"{self.metric}_hedges")
+                    futures.append(second[0])
+        
+        deadline_s = started + timeout_ms / 1000
+        pending = set(futures)
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=max(0, deadline_s - time.perf_counter()), return_when=FIRST_COMPLETED)
+            if not done:
+                break
+            for future in done:
+                if future.exception() is None:
+                    self.latencies.append((time.perf_counter() - started) * 1000)
+                    return future.result()
+                error = future.exception()
+        
+        if error is not None and not pending:
+            raise error
+        timer.count(f"{self.metric}_timeouts")
+        raise TimeoutError(f"{self.name} took longer than {round(timeout_ms)} ms")
+    
+    def _slots(self):
+        return _dependency_pool(self.name)[1]
+    
+    def _start(self, fn, args, kwargs):
+        """
+        (future, running event) for fn on this dependency's own pool, or None
+        when all its threads are taken. A thread stays taken until its call
+        returns, even after the caller timed out - so a slow dependency fills
+        its own pool, never the other dependencies'
+        """
+        pool, slots = _dependency_pool(self.name)
+        if not slots.acquire(blocking=False):
+            return None
+        running = threading.Event()
+        
+        def run():
+            running.set()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                slots.release()
+        
+        try:
+            return submit(pool, run), running
+        except BaseException:
+            slots.release()
+            raise
+    
+    def hedge_delay_ms(self):
+        """Recent p90 latency once there are enough samples"""
+        samples = sorted(self.latencies)
+        if len(samples) < 10:
+            return self.hedge_after_ms
+        return max(10, samples[int(len(samples) * 0.9) - 1])
+    
+    def _backoff_ms(self, attempt):
+        # Full jitter; a dependency that keeps throttling gets up to 5x longer waits
+        ceiling = min(BACKOFF_CAP_MS, BACKOFF_BASE_MS * 2 ** attempt) * (1 + 4 * self.throttle_rate)
+        return random.uniform(0, ceiling)
+    
+    def _observe(self, throttled):
+        with self._lock:
+            self.throttle_rate = 0.8 * self.throttle_rate + (0.2 if throttled else 0.0)
+            if throttled:
+                self.throttles += 1
+    
+    def _take_retry_token(self):
+        with self._lock:
+            if self.retry_tokens < 1:
+                return False
+            self.retry_tokens -= 1
+            return True
+
+def _dependency_pool(name):
+    """The thread pool of one dependency name and the semaphore of its free threads"""
+    entry = _pools.get(name)
+    if entry is None:
+        with _pools_lock:
+            entry = _pools.get(name)
+            if entry is None:
+                pool = ThreadPoolExecutor(max_workers=DEPENDENCY_POOL_SIZE, thread_name_prefix=f"downstream-{name}")
+                entry = _pools[name] = (pool, threading.BoundedSemaphore(DEPENDENCY_POOL_SIZE))
+    return entry
+
+class AdaptiveLimiter:
+    """
+    Additive-increase / multiplicative-decrease concurrency limit
+    acquire() a slot per unit of work and release() it when the work is
+    done: a release that saw new throttles on the watched dependencies
+    halves the limit (once per round - work started before the last cut
+    doesn't cut again), any other adds 1/limit, so +1 per round
+    """
+    
+    def __init__(self, name, max_limit, min_limit=1, dependencies=()):
+        self.name = name
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.dependencies = tuple(dependencies)
+        self.limit = float(self.max_limit)
+        self.in_flight = 0
+        self._throttles_seen = self._throttles()
+        self._decreased_at = 0.0
+        self._lock = threading.Lock()
+    
+    def _throttles(self):
+        return sum(dependency.throttles for dependency in self.dependencies)
+    
+    def acquire(self):
+        """A token for release() when a slot is free under the current limit, else None"""
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                return None
+            self.in_flight += 1
+            return time.monotonic()
+    
+    def release(self, token):
+        """Give back the slot of acquire(); True when the limit was cut"""
+        with self._lock:
+            self.in_flight -= 1
+            throttles = self._throttles()
+            throttled = throttles > self._throttles_seen
+            self._throttles_seen = throttles
+            if not throttled:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+                return False
+            if token < self._decreased_at:
+                return False
+            previous = int(self.limit)
+            self.limit = max(self.min_limit, self.limit / 2)
+            self._decreased_at = time.monotonic()
+            limit = int(self.limit)
+            if limit == previous:
+                return False
+        logger.warning("Concurrency reduced after throttling", limiter=self.name, limit=limit)
+        metrics.current().count(f"{self.name}_backoffs")
+        return True
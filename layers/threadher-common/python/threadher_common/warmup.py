@@ -0,0 +1,111 @@
+# layers/threadher-common/python/threadher_common/warmup.py
+"""
+Warm-up and health checks shared by every ThreadHer handler
+
+A warm-up event makes the handler build its clients and open pooled TLS
+connections to their endpoints, then return immediately - no Bedrock,
+Rekognition or DynamoDB request is made.
+
+Recognized events:
+    {"threadher_warmup": true, "delay_ms": 0}   - scheduled keeper ping
+    EventBridge "Scheduled Event"               - direct schedule target
+    GET/POST .../health                         - API Gateway health check
+    body {"warmup": true}                       - frontend connectivity check
+"""
+import json
+import time
+
+from threadher_common import logs
+
+WARMUP_FLAG = 'threadher_warmup'
+MAX_DELAY_MS = 5000
+
+_cold_start = True
+
+def is_warmup_event(event):
+    """True for keeper pings and health checks"""
+    if not isinstance(event, dict):
+        return False
+    
+    if event.get(WARMUP_FLAG):
+        return True
+    
+    if event.get('source') == 'aws.events' and event.get('detail-type') == 'Scheduled Event':
+        return True
+    
+    path = event.get('path') or event.get('rawPath') or ''
+    if path.rstrip('/').endswith('/health'):
+        return True
+    
+    body = event.get('body')
+    if isinstance(body, str):
+        # Cheap substring test before paying for a full parse
+        if '"warmup"' not in body:
+            return False
+        try:
+            body = json.loads(body)
+        except ValueError:
+            return False
+    
+    return isinstance(body, dict) and body.get('warmup') is True
+
+def handle_warmup(event, function_name, clients=()):
+    """
+    Prime the given boto3 clients/resources and report container state
+    
+    delay_ms keeps the container busy for a moment so that concurrent
+    keeper pings land on separate containers instead of reusing one.
+    """
+    global _cold_start
+    
+    logger = logs.get_logger(function_name)
+    start = time.time()
+    opened = sum(1 for client in clients if open_connection(client, logger))
+    
+    delay_ms = event.get('delay_ms', 0) if isinstance(event, dict) else 0
+    try:
+        delay_ms = max(0, min(int(delay_ms), MAX_DELAY_MS))
+    except (ValueError, TypeError):
+        delay_ms = 0
+    if delay_ms:
+        time.sleep(delay_ms / 1000)
+    
+    result = {
+        'status': 'warm',
+        'function': function_name,
+        'cold_start': _cold_start,
+        'connections_opened': opened,
+        'duration_ms': round((time.time() - start) * 1000, 1)
+    }
+    _cold_start = False
+    
+    logger.info("Warm-up", **result)
+    return result
+
+def open_connection(client, logger=None):
+    """
+    Open one TLS connection to the client's endpoint and return it to the
+    client's own urllib3 pool, so the next real call skips the handshake
+    """
+    try:
+        # boto3 resources wrap a client
+        if hasattr(client.meta, 'client'):
+            client = client.meta.client
+        
+        url = client.meta.endpoint_url
+        http_session = client._endpoint.http_session
+        proxy_url = http_session._proxy_config.proxy_url_for(url)
+        pool = http_session._get_connection_manager(url, proxy_url).connection_from_url(url)
+        http_session._setup_ssl_cert(pool, url, http_session._verify)
+        
+        conn = pool._get_conn()
+        try:
+            conn.connect()
+        finally:
+            pool._put_conn(conn)
+        return True
+    
+    except Exception as e:
+        # Priming is best effort - the real call will connect on its own
+        (logger or logs.get_logger()).warning("Warm-up connection failed", endpoint=getattr(getattr(client, 'meta', None), 'endpoint_url', '?'), error=str(e))
+        return False
@@ -0,0 +1,260 @@
+# layers/threadher-common/python/threadher_common/writebehind.py
+"""
+Write-behind DynamoDB puts, batched while the handler works
+
+Tools that store a record for later (carbon calculations)
+don't need the write to finish where it is made. put() converts
+nothing and waits for nothing - it queues the item, and one background
+thread per container drains the queue with BatchWriteItem: up to 25
+items per request, across tables, after waiting FLUSH_MS for a batch
+to fill.
+
+Writes are retried until they land or run out of attempts:
+UnprocessedItems, throttling and transient errors go back on the queue
+after a full-jitter backoff, waited out on a timer rather than by the
+worker. A PutRequest of the same item is idempotent,
+so a retried batch can't duplicate a record, and within one batch the
+last item per key wins (BatchWriteItem rejects duplicate keys).
+
+Lambda freezes the container as soon as the handler returns, and a
+frozen worker writes nothing. So every invocation ends by having the
+worker send what is queued without waiting for a batch to fill (a
+metrics.at_finish hook), and waits for that one BatchWriteItem attempt
+per batch - never for a retry's backoff. Items that attempt leaves
+unprocessed or throttled stay queued for the worker to retry during a
+later invocation, so DynamoDB throttling costs the response nothing.
+Records are lost when they still fail after MAX_ATTEMPTS, or when Lambda
+reclaims the environment while they wait for a retry - the same
+best-effort contract as a failed synchronous put.
+
+Environment:
+    WRITE_BEHIND_ENABLED        set to false to write synchronously (default true)
+    WRITE_BEHIND_FLUSH_MS       how long a batch waits to fill (default 20)
+    WRITE_BEHIND_MAX_ATTEMPTS   attempts per item before it is dropped (default 5)
+    WRITE_BEHIND_MAX_QUEUE      queued items before put() writes inline (default 10000)
+
+Usage:
+    writebehind.put(dynamodb, 'ThreadHerCalculations', item, ('calculation_id',), prepare=convert_to_decimal)
+"""
+import atexit
+import json
+import os
+import queue
+import random
+import threading
+import time
+
+from threadher_common import logs, metrics, resilience
+
+WRITE_BEHIND_ENABLED = os.environ.get('WRITE_BEHIND_ENABLED', 'true').lower() == 'true'
+FLUSH_MS = int(os.environ.get('WRITE_BEHIND_FLUSH_MS', 20))
+MAX_ATTEMPTS = int(os.environ.get('WRITE_BEHIND_MAX_ATTEMPTS', 5))
+MAX_QUEUE = int(os.environ.get('WRITE_BEHIND_MAX_QUEUE', 10000))
+
+BATCH_SIZE = 25
+BACKOFF_BASE_MS = 50
+BACKOFF_CAP_MS = 2000
+
+logger = logs.get_logger()
+
+# Queued by flush(): stop filling the batch and send it now
+_FLUSH = object()
+FLUSH_TIMEOUT_SECONDS = 10.0
+
+_queue = queue.Queue()
+_lock = threading.Lock()
+_worker = None
+# Queued items the worker hasn't tried to write yet - what an invocation waits for
+_unattempted = 0
+_attempted = threading.Condition()
+
+# Container totals, for tests and the benchmark
+stats = {'queued': 0, 'written': 0, 'retried': 0, 'dropped': 0, 'batches': 0}
+
+class _Pending:
+    """One queued put"""
+    __slots__ = ('dynamodb', 'table_name', 'item', 'key_fields', 'prepare', 'prepared', 'attempts')
+    
+    def __init__(self, dynamodb, table_name, item, key_fields, prepare):
+        self.dynamodb = dynamodb
+        self.table_name = table_name
+        self.item = item
+        self.key_fields = key_fields
+        self.prepare = prepare
+        self.prepared = None
+        self.attempts = 0
+    
+    def key(self):
+        return _key(self.table_name, _prepared(self), self.key_fields)
+
+def _key(table_name, item, key_fields):
+    return (table_name, json.dumps([item.get(f) for f in key_fields], default=str))
+
+def put(dynamodb, table_name, item, key_fields, prepare=None):
+    """
+    Queue item for table_name (through the dynamodb resource) and return
+    prepare(item) (e.g. convert_to_decimal) runs on the writer thread; the
+    caller must not change item afterwards
+    """
+    global _unattempted
+    pending = _Pending(dynamodb, table_name, item, tuple(key_fields), prepare)
+    timer = metrics.current()
+    
+    if not WRITE_BEHIND_ENABLED or _queue.qsize() >= MAX_QUEUE:
+        with timer.phase('dynamodb_put'):
+            dynamodb.Table(table_name).put_item(Item=_prepared(pending))
+        return
+    
+    _ensure_worker()
+    with _attempted:
+        _unattempted += 1
+    _queue.put(pending)
+    stats['queued'] += 1
+    timer.count('write_behind_queued')
+
+def flush(timeout=FLUSH_TIMEOUT_SECONDS):
+    """Send what's queued now and wait until the queue is empty (retries on their backoff timer aside); True when drained"""
+    if _worker is None or not _queue.unfinished_tasks:
+        return True
+    _queue.put(_FLUSH)
+    deadline = time.time() + timeout
+    while _queue.unfinished_tasks:
+        if time.time() >= deadline:
+            return False
+        time.sleep(0.005)
+    return True
+
+def _ensure_worker():
+    global _worker
+    if _worker is None:
+        with _lock:
+            if _worker is None:
+                _worker = threading.Thread(target=_drain, name='write-behind', daemon=True)
+                _worker.start()
+
+def flush_before_freeze():
+    """At the end of an invocation: one write attempt for everything queued, no retries waited for"""
+    if _worker is None or not _unattempted:
+        return
+    remaining = resilience.remaining_ms()
+    timeout = FLUSH_TIMEOUT_SECONDS if remaining is None else max(0.1, min(FLUSH_TIMEOUT_SECONDS, remaining / 1000))
+    with metrics.phase('write_behind_flush'):
+        _queue.put(_FLUSH)
+        with _attempted:
+            sent = _attempted.wait_for(lambda: not _unattempted, timeout)
+    if not sent:
+        metrics.current().count('write_behind_unflushed', _unattempted)
+        logger.warning("Write-behind records not sent before the invocation ended", queued=_unattempted)
+
+def _drain():
+    while True:
+        first = _queue.get()
+        if first is _FLUSH:
+            _queue.task_done()
+            continue
+        batch = [first]
+        fill_until = time.perf_counter() + FLUSH_MS / 1000
+        while len(batch) < BATCH_SIZE:
+            try:
+                pending = _queue.get(timeout=max(0, fill_until - time.perf_counter()))
+            except queue.Empty:
+                break
+            if pending is _FLUSH:
+                _queue.task_done()
+                break
+            batch.append(pending)
+        fresh = sum(1 for pending in batch if pending.attempts == 0)
+        try:
+            _write(batch)
+        except Exception as e:
+            logger.exception("Write-behind batch failed", error=str(e))
+        finally:
+            _mark_attempted(fresh)
+            for _ in batch:
+                _queue.task_done()
+
+def _mark_attempted(count):
+    global _unattempted
+    if count:
+        with _attempted:
+            _unattempted -= count
+            _attempted.notify_all()
+
+def _write(batch):
+    # Last write per key wins; a retry reuses the same item, so it's idempotent
+    latest = {}
+    for pending in batch:
+        latest[pending.key()] = pending
+    
+    by_dynamodb = {}
+    for pending in latest.values():
+        by_dynamodb.setdefault(id(pending.dynamodb), []).append(pending)
+    
+    for group in by_dynamodb.values():
+        request_items = {}
+        by_key = {}
+        key_fields = {}
+        for pending in group:
+            request_items.setdefault(pending.table_name, []).append({'PutRequest': {'Item': pending.prepared}})
+            by_key[pending.key()] = pending
+            key_fields[pending.table_name] = pending.key_fields
+        
+        stats['batches'] += 1
+        try:
+            response = group[0].dynamodb.meta.client.batch_write_item(RequestItems=request_items)
+        except Exception as e:
+            if resilience.error_kind(e) is None:
+                logger.error("Write-behind batch rejected", tables=sorted(request_items), error=str(e))
+                stats['dropped'] += len(group)
+                continue
+            _retry(group, str(e))
+            continue
+        
+        unprocessed = response.get('UnprocessedItems') or {}
+        retry = []
+        for table_name, requests in unprocessed.items():
+            for request in requests:
+                pending = by_key.get(_key(table_name, request['PutRequest']['Item'], key_fields[table_name]))
+                if pending is not None:
+                    retry.append(pending)
+        stats['written'] += len(group) - len(retry)
+        if retry:
+            _retry(retry, 'unprocessed items')
+
+def _prepared(pending):
+    """The item as DynamoDB takes it - prepared once, reused by retries"""
+    if pending.prepared is None:
+        pending.prepared = pending.prepare(pending.item) if pending.prepare else pending.item
+    return pending.prepared
+
+def _retry(group, reason):
+    """Back on the queue after a full-jitter pause (on a timer), or dropped after MAX_ATTEMPTS"""
+    again = []
+    for pending in group:
+        pending.attempts += 1
+        if pending.attempts >= MAX_ATTEMPTS:
+            stats['dropped'] += 1
+            logger.error("Write-behind item dropped", table=pending.table_name, attempts=pending.attempts, reason=reason)
+        else:
+            again.append(pending)
+    if not again:
+        return
+    
+    attempt = max(p.attempts for p in again)
+    stats['retried'] += len(again)
+    logger.warning("Write-behind retry", items=len(again), reason=reason)
+    _later(random.uniform(0, min(BACKOFF_CAP_MS, BACKOFF_BASE_MS * 2 ** attempt)) / 1000, _requeue, again)
+
+def _later(delay_seconds, fn, *args):
+    """fn(*args) after delay_seconds, off the worker so it keeps sending fresh items"""
+    timer = threading.Timer(delay_seconds, fn, args)
+    timer.daemon = True
+    timer.start()
+
+def _requeue(group):
+    for pending in group:
+        _queue.put(pending)
+
+metrics.at_finish(flush_before_freeze)
+# Outside Lambda (scripts, the stream server) also flush at a clean shutdown
+atexit.register(flush, 2.0)
@@ -0,0 +1,37 @@
+# layers/threadher-common/python/threadher_tools/__init__.py
+"""
+ThreadHer tool logic as an importable library
+
+The tool Lambdas (ImageAnalyzer, CarbonCalculator, CircularOptions) are
+thin wrappers around these modules, and the action handler calls them
+in-process instead of invoking another Lambda. Every tool entry point
+takes the same event the tool Lambda receives and returns
+(status_code, body) - the wrapper turns that into the HTTP response,
+the action handler hands the body to the agent.
+"""
+import json
+from decimal import Decimal
+
+def parse_body(event):
+    """Tool parameters from a direct invocation or an API Gateway event"""
+    if isinstance(event.get('body'), str):
+        return json.loads(event['body'])
+    return event.get('body', event)
+
+def convert_to_decimal(obj):
+    """Convert floats to Decimal for DynamoDB"""
+    if isinstance(obj, float):
+        return Decimal(str(obj))
+    elif isinstance(obj, dict):
+        return {k: convert_to_decimal(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [convert_to_decimal(i) for i in obj]
+    return obj
+
+def http_response(status_code, body):
+    """API Gateway / Lambda response for a tool result (or a body already rendered to JSON bytes)"""
+    return {
+        'statusCode': status_code,
+        'headers': {'Content-Type': 'application/json', 'Access-Control-Allow-Origin': '*'},
+        'body': body.decode('utf-8') if isinstance(body, bytes) else json.dumps(body)
+    }
@@ -0,0 +1,379 @@
+# layers/threadher-common/python/threadher_tools/carbon.py
+"""
+Carbon footprint and sustainability metrics for a garment
+
+Used by the CarbonCalculator Lambda and in-process by the action handler.
+
+Footprints come from the emission factor cube (threadher_tools.factors):
+kg CO2e per garment type x material x origin x lifecycle stage, memory
+mapped on first use. Results carry the per-stage breakdown.
+
+calculate_batch() scores a whole wardrobe in one request: every item
+goes through footprint(), and the results are queued for write-behind
+(BatchWriteItem, 25 items per request, sent before the invocation ends).
+"""
+import functools
+import json
+import os
+import uuid
+from datetime import datetime
+
+from threadher_common import clients, logs, memo, metrics, resilience, writebehind
+from threadher_tools import convert_to_decimal, factors, normalize, parse_body
+
+# Largest wardrobe one batch request may carry
+BATCH_MAX_ITEMS = int(os.environ.get('CARBON_BATCH_MAX_ITEMS', 1000))
+# Bucket of NDJSON wardrobe files sent as {"garments_s3_key": ...}
+S3_BUCKET = os.environ.get('S3_BUCKET', '')
+
+# Initialize DynamoDB (created on first use unless CLIENT_INIT_MODE=primed)
+dynamodb = clients.resource('dynamodb', region_name='us-east-1')
+# DYNAMODB_TABLE is what the CarbonCalculator function was deployed with
+table_name = os.environ.get('CALCULATIONS_TABLE', os.environ.get('DYNAMODB_TABLE', 'ThreadHerCalculations'))
+table = clients.table(dynamodb, table_name)
+s3 = clients.client('s3', region_name='us-east-1', config_options=resilience.client_config('s3'))
+s3_dependency = resilience.Dependency('s3')
+# S3 error codes for a wardrobe file that isn't there, matched by code so botocore isn't imported
+MISSING_FILE_CODES = {'NoSuchKey', 'NoSuchBucket', '404'}
+
+logger = logs.get_logger('CarbonCalculator')
+
+# Recommended lifespan (years)
+RECOMMENDED_LIFESPAN = {
+    'tshirt': 2,
+    'jeans': 5,
+    'dress': 3,
+    'jacket': 7,
+    'sweater': 5,
+    'shoes': 3,
+    'default': 3
+}
+
+# Results only depend on the parameters, the factor cube and this table.
+# The cube's checksum is read when the first key is made, not at import
+calculation_memo = memo.Memo('carbon', lambda: memo.data_version(factors.cube().checksum, RECOMMENDED_LIFESPAN))
+
+def get_carbon_footprint(garment_type, material, origin='unknown'):
+    """Get carbon footprint based on garment type, material and origin (all stages)"""
+    garment_type = garment_type.lower() if garment_type else 'default'
+    material = material.lower() if material else 'default'
+    
+    return round(sum(factors.cube().stage_factors(garment_type, material, normalize.origin(origin))), 6)
+
+def calculate_sustainability_score(age_years, recommended_years, material):
+    """Calculate sustainability score (0-100)"""
+    # Base score
+    score = 50
+    
+    # Longevity bonus (up to +40 points)
+    if age_years >= recommended_years:
+        longevity_bonus = min(40, (age_years / recommended_years) * 20)
+        score += longevity_bonus
+    else:
+        # Penalty for short use
+        score -= (recommended_years - age_years) * 5
+    
+    # Sustainable material bonus (up to +10 points)
+    score += material_bonus(material)
+    
+    return max(0, min(100, score))
+
+@functools.lru_cache(maxsize=256)
+def material_bonus(material):
+    """Score points for a sustainable material"""
+    if material and 'organic' in material.lower():
+        return 10
+    if material and any(m in material.lower() for m in ['recycled', 'hemp', 'linen']):
+        return 8
+    return 0
+
+def garment_params(body):
+    """
+    Calculation parameters with the type and material normalized to factor
+    keys ("T-shirt" -> tshirt); a missing one becomes 'default'. Blends keep
+    their components in material_blend, the main one in material
+    """
+    estimated_age_years = body.get('estimated_age_years', 0)
+    
+    # Convert age to float if it's a string
+    try:
+        estimated_age_years = float(estimated_age_years) if estimated_age_years else 0
+    except (ValueError, TypeError):
+        estimated_age_years = 0
+    
+    blend = normalize.material_blend(body.get('material'))
+    params = {
+        'garment_type': normalize.garment_type(body.get('garment_type')),
+        'material': blend[0][0],
+        'origin': str(body.get('origin', 'unknown') or '').strip(),
+        'estimated_age_years': estimated_age_years
+    }
+    if len(blend) > 1:
+        params['material_blend'] = [list(component) for component in blend]
+    return params
+
+def blend_of(params):
+    """[(material, weight)] of a garment - one component unless it is a blend"""
+    return params.get('material_blend') or [(params['material'], 1.0)]
+
+def lifecycle_footprint(params):
+    """kg CO2e per lifecycle stage - blends weigh each material's factors"""
+    cube = factors.cube()
+    origin = normalize.origin(params['origin'])
+    by_stage = [0.0] * len(cube.stages)
+    for material, weight in blend_of(params):
+        for stage, kg in enumerate(cube.stage_factors(params['garment_type'], material, origin)):
+            by_stage[stage] += weight * kg
+    return by_stage
+
+def footprint(params):
+    """Footprint, per-year carbon, savings and score of one garment"""
+    garment_type = params['garment_type']
+    estimated_age_years = params['estimated_age_years']
+    
+    # Get carbon footprint for the garment's origin, per lifecycle stage
+    by_stage = lifecycle_footprint(params)
+    total_carbon = round(sum(by_stage), 6)
+    
+    # Calculate metrics
+    recommended_years = RECOMMENDED_LIFESPAN.get(garment_type, 3)
+    carbon_per_year = total_carbon / max(estimated_age_years, 1)
+    
+    # Calculate potential savings (if kept vs buying new)
+    remaining_years = max(0, recommended_years - estimated_age_years)
+    potential_savings = carbon_per_year * remaining_years if remaining_years > 0 else 0
+    
+    return {
+        'total_carbon_footprint_kg': total_carbon,
+        'carbon_per_year_kg': carbon_per_year,
+        'potential_savings_kg': potential_savings,
+        'remaining_recommended_years': remaining_years,
+        'sustainability_score': calculate_sustainability_score(estimated_age_years, recommended_years, params['material']),
+        'lifecycle_kg': dict(zip(factors.cube().stages, (round(kg, 6) for kg in by_stage)))
+    }
+
+def calculate(event, calculation_id=None):
+    """
+    Calculate carbon footprint and sustainability metrics for a garment
+    Returns (status_code, body) - the CarbonCalculator response contract
+    """
+    try:
+        # Parse the request body - handle both direct invocation and API Gateway
+        body = parse_body(event)
+        
+        # Extract parameters with defaults
+        params = garment_params(body)
+        
+        # Validation
+        if not body.get('garment_type'):
+            logger.warning("No garment_type provided, using 'default'")
+        
+        if not body.get('material'):
+            logger.warning("No material provided, using 'default'")
+        
+        logger.info("Calculating", garment_type=params['garment_type'], material=params['material'], origin=params['origin'])
+        
+        # Same parameters and factor tables give the same result - skip the math and the write
+        memo_key = calculation_memo.key(params)
+        memoized, tier = calculation_memo.get(memo_key)
+        if tier is not None:
+            logger.debug("Memoized calculation", tier=tier)
+            return 200, memoized
+        
+        # Prepare results
+        calculation_results = footprint(params)
+        calculation_results['calculated_at'] = datetime.utcnow().isoformat()
+        calculation_results.update(params)
+        
+        logger.debug("Calculation results", results=calculation_results)
+        
+        # Store in DynamoDB after the response - Decimal conversion happens on the writer thread
+        try:
+            dynamodb_item = dict(calculation_results, calculation_id=calculation_id or str(datetime.utcnow().timestamp()))
+            writebehind.put(dynamodb, table_name, dynamodb_item, ('calculation_id',), prepare=convert_to_decimal)
+        except Exception as db_error:
+            logger.warning("Could not store in DynamoDB", error=str(db_error))
+            # Continue even if DynamoDB fails
+        
+        calculation_memo.put(memo_key, calculation_results)
+        
+        # Return response (keep as regular floats for API response)
+        return 200, calculation_results
+        
+    except Exception as e:
+        logger.exception("Error in carbon calculation", error=str(e))
+        
+        return 500, {
+            'error': str(e),
+            'message': 'Failed to calculate carbon footprint'
+        }
+
+def batch_garments(event):
+    """
+    The garments of a batch request, or None for a single garment
+    Accepts a JSON array, {"garments": [...]}, NDJSON text (as the body or
+    "garments_ndjson") or {"garments_s3_key": ...} naming an NDJSON file
+    that is streamed line by line. NDJSON is parsed lazily - errors surface
+    as ValueError when the batch is read.
+    """
+    body = event.get('body', event)
+    if isinstance(body, str):
+        try:
+            body = json.loads(body)
+        except ValueError:
+            return ndjson_garments(body.splitlines())
+    
+    if isinstance(body, list):
+        return body
+    if not isinstance(body, dict):
+        return None
+    if 'garments' in body:
+        if not isinstance(body['garments'], list):
+            return invalid_batch('garments must be an array')
+        return body['garments']
+    if 'garments_ndjson' in body:
+        if not isinstance(body['garments_ndjson'], str):
+            return invalid_batch('garments_ndjson must be NDJSON text')
+        return ndjson_garments(body['garments_ndjson'].splitlines())
+    if 'garments_s3_key' in body:
+        return s3_garments(body.get('bucket') or S3_BUCKET, body['garments_s3_key'])
+    return None
+
+def invalid_batch(reason):
+    """A batch that raises ValueError when read, like malformed NDJSON"""
+    raise ValueError(reason)
+    yield
+
+def ndjson_garments(lines):
+    for line_number, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError as e:
+            raise ValueError(f"line {line_number}: {e}")
+
+def s3_garments(bucket, key):
+    with metrics.phase('s3_get'):
+        stream = s3_dependency.call(s3.get_object, Bucket=bucket, Key=key)['Body']
+    # botocore's StreamingBody yields lines through iter_lines, file objects by iterating
+    yield from ndjson_garments(stream.iter_lines() if hasattr(stream, 'iter_lines') else stream)
+
+def s3_error_code(error):
+    """The error code of a botocore ClientError, None for anything else"""
+    response = getattr(error, 'response', None) or {}
+    return (response.get('Error') or {}).get('Code')
+
+def batch_columns(items):
+    """Per-item metrics as columns, one list per result field"""
+    rows = [footprint(params) for params in items]
+    return {field: [row[field] for row in rows] for field in rows[0]} if rows else {}
+
+def batch_summary(items, columns):
+    """Wardrobe totals, the average score and a breakdown by garment type"""
+    by_type = {}
+    for params, carbon_kg in zip(items, columns['total_carbon_footprint_kg']):
+        entry = by_type.setdefault(params['garment_type'], {'items': 0, 'total_carbon_footprint_kg': 0.0})
+        entry['items'] += 1
+        entry['total_carbon_footprint_kg'] += carbon_kg
+    
+    by_stage = {}
+    for stages in columns['lifecycle_kg']:
+        for stage, kg in stages.items():
+            by_stage[stage] = by_stage.get(stage, 0.0) + kg
+    
+    scores = columns['sustainability_score']
+    return {
+        'items': len(items),
+        'total_carbon_footprint_kg': sum(columns['total_carbon_footprint_kg']),
+        'carbon_per_year_kg': sum(columns['carbon_per_year_kg']),
+        'potential_savings_kg': sum(columns['potential_savings_kg']),
+        'average_sustainability_score': sum(scores) / len(scores),
+        'by_garment_type': by_type,
+        'lifecycle_kg': by_stage
+    }
+
+def calculate_batch(garments, batch_id=None):
+    """
+    Carbon metrics for a whole wardrobe in one pass
+    garments is what batch_garments() returned; returns (status_code, body)
+    with one result per garment (in order) and the wardrobe summary
+    """
+    try:
+        items = []
+        garment_ids = []
+        problems = []
+        for index, garment in enumerate(garments):
+            if len(items) >= BATCH_MAX_ITEMS:
+                problems.append(f"more than {BATCH_MAX_ITEMS} garments")
+                break
+            if not isinstance(garment, dict):
+                problems.append(f"garment {index} must be an object")
+                continue
+            items.append(garment_params(garment))
+            garment_ids.append(garment.get('garment_id'))
+    except ValueError as e:
+        problems = [str(e)]
+    except resilience.DependencyUnavailable as e:
+        return 503, {'error': str(e), 'message': 'Wardrobe file unavailable', 'degraded': True}
+    except Exception as e:
+        # S3 refused the wardrobe file (NoSuchKey, AccessDenied...) - the caller named it
+        code = s3_error_code(e)
+        if code is None:
+            logger.exception("Error reading garment batch", error=str(e))
+            return 500, {'error': str(e), 'message': 'Failed to calculate carbon footprint'}
+        if code in MISSING_FILE_CODES:
+            return 404, {'error': str(e), 'message': 'Wardrobe file not found'}
+        return 400, {'error': str(e), 'message': 'Wardrobe file could not be read'}
+    
+    if problems or not items:
+        return 400, {
+            'error': '; '.join(problems) or 'no garments',
+            'message': 'Invalid garment batch'
+        }
+    
+    try:
+        batch_id = batch_id or str(uuid.uuid4())
+        calculated_at = datetime.utcnow().isoformat()
+        logger.info("Calculating batch", batch_id=batch_id, items=len(items))
+        
+        with metrics.phase('batch_compute'):
+            columns = batch_columns(items)
+            results = []
+            for index, params in enumerate(items):
+                result = {field: values[index] for field, values in columns.items()}
+                result.update(params)
+                if garment_ids[index] is not None:
+                    result['garment_id'] = garment_ids[index]
+                results.append(result)
+            summary = batch_summary(items, columns)
+        
+        # Queued for write-behind (25 per BatchWriteItem) and flushed before the invocation ends
+        stored = True
+        try:
+            for index, result in enumerate(results):
+                dynamodb_item = dict(result, calculation_id=f"{batch_id}#{index}", batch_id=batch_id, calculated_at=calculated_at)
+                writebehind.put(dynamodb, table_name, dynamodb_item, ('calculation_id',), prepare=convert_to_decimal)
+        except Exception as db_error:
+            stored = False
+            logger.warning("Could not store batch in DynamoDB", batch_id=batch_id, error=str(db_error))
+        
+        metrics.current().count('batch_items', len(results))
+        
+        return 200, {
+            'batch_id': batch_id,
+            'calculated_at': calculated_at,
+            'stored': stored,
+            'summary': summary,
+            'results': results
+        }
+        
+    except Exception as e:
+        logger.exception("Error in batch carbon calculation", error=str(e))
+        
+        return 500, {
+            'error': str(e),
+            'message': 'Failed to calculate carbon footprint'
+        }
@@ -0,0 +1,339 @@
+# layers/threadher-common/python/threadher_tools/circular.py
+"""
+Circular economy options (repair, resale, recycling, upcycling) for a garment
+
+Used by the CircularOptions Lambda and in-process by the action handler.
+Every response body the Lambda can return is rendered to JSON at import
+(render_options); get_options builds the same body as a dict. Requests
+with a position also get the nearest services from the location index.
+"""
+import os
+from datetime import datetime
+
+from threadher_common import clients, counters, logs, metrics, resilience
+from threadher_tools import normalize, parse_body, services, snapshot
+
+# Initialize DynamoDB (created on first use unless CLIENT_INIT_MODE=primed)
+dynamodb = clients.resource('dynamodb', region_name='us-east-1')
+usage_table_name = os.environ.get('CIRCULAR_USAGE_TABLE', 'ThreadHer-CircularUsage')
+NEARBY_SERVICES = int(os.environ.get('NEARBY_SERVICES', 3))
+NEARBY_MAX_KM = float(os.environ.get('NEARBY_MAX_KM', 50))
+
+# How often each action is recommended - one counter per combination and day
+USAGE_DIMENSIONS = ('garment_type', 'condition', 'recommended_action')
+usage = counters.Counters('circular', usage_table_name, USAGE_DIMENSIONS)
+
+logger = logs.get_logger('CircularOptions')
+
+# Circular economy options database
+REPAIR_SERVICES = {
+    'default': [
+        {'name': 'Local tailor', 'type': 'repair', 'avg_cost': 15},
+        {'name': 'Dry cleaner with alterations', 'type': 'repair', 'avg_cost': 20},
+        {'name': 'DIY repair kits', 'type': 'diy', 'avg_cost': 10}
+    ],
+    'jeans': [
+        {'name': 'Denim repair specialist', 'type': 'repair', 'avg_cost': 25},
+        {'name': 'Visible mending workshop', 'type': 'workshop', 'avg_cost': 30}
+    ],
+    'shoes': [
+        {'name': 'Cobbler/shoe repair', 'type': 'repair', 'avg_cost': 35},
+        {'name': 'Sole replacement service', 'type': 'repair', 'avg_cost': 50}
+    ]
+}
+
+RESALE_PLATFORMS = [
+    {'name': 'ThredUp', 'type': 'online', 'commission': 0.2},
+    {'name': 'Poshmark', 'type': 'online', 'commission': 0.2},
+    {'name': 'Depop', 'type': 'online', 'commission': 0.1},
+    {'name': 'The RealReal', 'type': 'luxury', 'commission': 0.3},
+    {'name': 'Local consignment shop', 'type': 'local', 'commission': 0.5}
+]
+
+RECYCLING_OPTIONS = [
+    {'name': 'H&M garment collection', 'type': 'brand', 'incentive': 'discount coupon'},
+    {'name': 'Textile recycling center', 'type': 'municipal', 'incentive': 'environmental impact'},
+    {'name': 'For Days take-back program', 'type': 'brand', 'incentive': 'store credit'},
+    {'name': 'Donation to thrift store', 'type': 'charity', 'incentive': 'tax deduction'}
+]
+
+UPCYCLING_IDEAS = {
+    'tshirt': ['tote bag', 'cleaning rags', 'pet toy', 'headband'],
+    'jeans': ['denim bag', 'pillow cover', 'plant holder', 'organizer'],
+    'dress': ['apron', 'fabric panels', 'scarf', 'quilt squares'],
+    'default': ['fabric scrap art', 'patchwork project', 'stuffing material']
+}
+
+# Environmental impact potential of each recommended action
+IMPACT_ESTIMATES = {
+    'repair': {
+        'carbon_saved_kg': 10.0,
+        'water_saved_liters': 2000,
+        'message': 'Repairing extends garment life and saves resources'
+    },
+    'resale': {
+        'carbon_saved_kg': 8.0,
+        'water_saved_liters': 1500,
+        'message': 'Reselling prevents one new item from being produced'
+    },
+    'recycle': {
+        'carbon_saved_kg': 3.0,
+        'water_saved_liters': 500,
+        'message': 'Recycling keeps textiles out of landfills'
+    },
+    'upcycle': {
+        'carbon_saved_kg': 5.0,
+        'water_saved_liters': 1000,
+        'message': 'Upcycling creates new value without new production'
+    }
+}
+
+LOCATION_NOTE = "Options shown are general. Check local options in {}."
+
+# Location index service type for each kind of option
+NEARBY_SERVICE_TYPES = ('repair', 'resale', 'recycling')
+NEARBY_MAX_RESULTS = 20
+
+def get_condition_recommendations(condition):
+    """Get recommendations based on garment condition"""
+    condition = condition.lower()
+    
+    # The agent also says 'new' and 'worn'
+    if condition in ['excellent', 'good', 'new']:
+        return {
+            'primary_action': 'resale',
+            'message': 'This item is in great condition for resale!',
+            'priority_options': ['resale', 'donation', 'keep']
+        }
+    elif condition in ['fair', 'worn']:
+        return {
+            'primary_action': 'repair',
+            'message': 'Consider repairing before resale or continued use.',
+            'priority_options': ['repair', 'resale', 'donation']
+        }
+    else:  # poor condition
+        return {
+            'primary_action': 'recycle',
+            'message': 'This item is best suited for textile recycling or upcycling.',
+            'priority_options': ['recycle', 'upcycle', 'textile-waste']
+        }
+
+def options_parameters(event):
+    """
+    (garment_type, condition, user_location, nearby_query) of a request, normalized
+    nearby_query is (latitude, longitude, k, max_km), or None without a position
+    """
+    body = parse_body(event)
+    # "Skinny jeans" and "denim" get the jeans options
+    garment_type = normalize.garment_type(body.get('garment_type'))
+    condition = body.get('condition', 'unknown').strip().lower()
+    user_location = body.get('user_location', 'US').strip()
+    
+    nearby_query = None
+    point = position(body.get('latitude'), body.get('longitude'))
+    if point is None and ',' in user_location:
+        # user_location may be "40.7128,-74.0060"
+        point = position(*user_location.split(',', 1))
+    if point is not None:
+        try:
+            k = min(NEARBY_MAX_RESULTS, max(1, int(body.get('nearby_k', NEARBY_SERVICES))))
+            max_km = min(NEARBY_MAX_KM, max(0.1, float(body.get('radius_km', NEARBY_MAX_KM))))
+        except (TypeError, ValueError):
+            k, max_km = NEARBY_SERVICES, NEARBY_MAX_KM
+        nearby_query = (point[0], point[1], k, max_km)
+    return garment_type, condition, user_location, nearby_query
+
+def position(latitude, longitude):
+    """(latitude, longitude) as floats, or None when they aren't a position"""
+    try:
+        latitude = float(latitude)
+        longitude = float(longitude)
+    except (TypeError, ValueError):
+        return None
+    if -90 <= latitude <= 90 and -180 <= longitude <= 180:
+        return latitude, longitude
+    return None
+
+def find_nearby(nearby_query):
+    """{service type: nearest services} for a nearby query - None without one or without the index"""
+    if nearby_query is None:
+        return None
+    index = services.index()
+    if index is None:
+        return None
+    latitude, longitude, k, max_km = nearby_query
+    with metrics.phase('nearby_services'):
+        return {
+            service_type: index.nearest(service_type, latitude, longitude, k=k, max_km=max_km)
+            for service_type in NEARBY_SERVICE_TYPES
+        }
+
+def build_options(garment_type, condition, user_location, nearby=None):
+    """The options body for normalized parameters (and find_nearby's result)"""
+    # Get condition-based recommendations
+    recommendations = get_condition_recommendations(condition)
+    
+    # Compile circular options
+    circular_options = {
+        'repair_options': REPAIR_SERVICES.get(garment_type, REPAIR_SERVICES['default']),
+        'resale_platforms': RESALE_PLATFORMS,
+        'recycling_options': RECYCLING_OPTIONS,
+        'upcycling_ideas': UPCYCLING_IDEAS.get(garment_type, UPCYCLING_IDEAS['default']),
+        'recommended_action': recommendations['primary_action'],
+        'priority_options': recommendations['priority_options'],
+        'message': recommendations['message']
+    }
+    
+    # Add location-specific options if available
+    if user_location and user_location != 'US':
+        circular_options['note'] = LOCATION_NOTE.format(user_location)
+    
+    circular_options['environmental_impact'] = IMPACT_ESTIMATES.get(
+        recommendations['primary_action'],
+        IMPACT_ESTIMATES['recycle']
+    )
+    
+    if nearby is not None:
+        circular_options['nearby_services'] = nearby
+    
+    return {
+        'garment_type': garment_type,
+        'condition': condition,
+        'circular_options': circular_options,
+        'generated_at': datetime.utcnow().isoformat()
+    }
+
+# The body only varies with the garment type's table entries, the condition
+# branch, whether a location was given and whether nearby services were
+# found - each combination is rendered once, at init, with the echoed
+# parameters, the nearby services and the timestamp spliced in
+SNAPSHOT_GARMENT_TYPES = frozenset(REPAIR_SERVICES) | frozenset(UPCYCLING_IDEAS)
+# condition -> the condition standing for its branch; anything else is 'poor'
+CONDITION_BRANCHES = {'excellent': 'good', 'good': 'good', 'new': 'good', 'fair': 'fair', 'worn': 'fair'}
+
+def snapshot_key(garment_type, condition, user_location, nearby=None):
+    return (
+        garment_type if garment_type in SNAPSHOT_GARMENT_TYPES else 'default',
+        CONDITION_BRANCHES.get(condition, 'poor'),
+        bool(user_location and user_location != 'US'),
+        nearby is not None
+    )
+
+def render_snapshots():
+    """{snapshot_key: (Snapshot, recommended_action)} for every combination"""
+    snapshots = {}
+    for garment_type in sorted(SNAPSHOT_GARMENT_TYPES):
+        for condition in ('good', 'fair', 'poor'):
+            for located in (False, True):
+                for with_nearby in (False, True):
+                    body = build_options(
+                        garment_type,
+                        condition,
+                        snapshot.marker('user_location') if located else 'US',
+                        snapshot.marker('nearby', raw=True) if with_nearby else None
+                    )
+                    body['garment_type'] = snapshot.marker('garment_type')
+                    body['condition'] = snapshot.marker('condition')
+                    body['generated_at'] = snapshot.marker('generated_at')
+                    action = body['circular_options']['recommended_action']
+                    snapshots[(garment_type, condition, located, with_nearby)] = (snapshot.Snapshot(body), action)
+    return snapshots
+
+SNAPSHOTS = render_snapshots()
+
+def get_options(event):
+    """
+    Provide circular economy options for garments
+    Returns (status_code, body) - the CircularOptions response contract
+    """
+    try:
+        garment_type, condition, user_location, nearby_query = options_parameters(event)
+        result = build_options(garment_type, condition, user_location, find_nearby(nearby_query))
+        action = result['circular_options']['recommended_action']
+        
+        logger.info("Recommended action", garment_type=garment_type, condition=condition, action=action)
+        count_usage(garment_type, condition, action)
+        
+        return 200, result
+        
+    except Exception as e:
+        logger.exception("Error getting circular options", error=str(e))
+        
+        return 500, {'error': str(e), 'message': 'Failed to get circular options'}
+
+def render_options(event):
+    """
+    get_options as pre-rendered JSON: a snapshot lookup plus the volatile fields
+    Returns (status_code, body) - body is bytes on success, the same bytes
+    json.dumps would make of get_options' body
+    """
+    try:
+        garment_type, condition, user_location, nearby_query = options_parameters(event)
+        nearby = find_nearby(nearby_query)
+        rendered, action = SNAPSHOTS[snapshot_key(garment_type, condition, user_location, nearby)]
+        body = rendered.render(
+            garment_type=garment_type,
+            condition=condition,
+            user_location=user_location,
+            nearby=nearby,
+            generated_at=datetime.utcnow().isoformat()
+        )
+        
+        logger.info("Recommended action", garment_type=garment_type, condition=condition, action=action)
+        count_usage(garment_type, condition, action)
+        
+        return 200, body
+        
+    except Exception as e:
+        logger.exception("Error getting circular options", error=str(e))
+        
+        return 500, {'error': str(e), 'message': 'Failed to get circular options'}
+
+def count_usage(garment_type, condition, action):
+    """Count one recommendation - written in batches after the response"""
+    try:
+        usage.add({'garment_type': garment_type, 'condition': condition, 'recommended_action': action})
+    except Exception as e:
+        logger.warning("Could not count usage", error=str(e))
+
+def usage_query(event):
+    """The rollup filters of a usage request ({"usage": {...}}), or None for an options request"""
+    try:
+        body = parse_body(event)
+    except ValueError:
+        # get_options reports the bad body
+        return None
+    query = body.get('usage') if isinstance(body, dict) else None
+    return query if isinstance(query, dict) else None
+
+def get_usage(query):
+    """
+    Usage rollups: {"start_day": "2026-10-01", "end_day": "2026-10-17",
+    "by_day": false, "garment_type": ..., "condition": ..., "recommended_action": ...}
+    start_day defaults to today (UTC). Returns (status_code, body)
+    """
+    start_day = query.get('start_day') or datetime.utcnow().strftime('%Y-%m-%d')
+    end_day = query.get('end_day') or start_day
+    filters = {d: query[d] for d in USAGE_DIMENSIONS if query.get(d)}
+    if 'garment_type' in filters:
+        filters['garment_type'] = normalize.garment_type(filters['garment_type'])
+    if 'condition' in filters:
+        filters['condition'] = str(filters['condition']).strip().lower()
+    
+    try:
+        rows = usage.rollup(start_day, end_day, by_day=bool(query.get('by_day')), **filters)
+    except ValueError as e:
+        return 400, {'error': str(e), 'message': 'Invalid usage query'}
+    except resilience.DependencyUnavailable as e:
+        return 503, {'error': str(e), 'message': 'Usage counters unavailable', 'degraded': True}
+    except Exception as e:
+        logger.exception("Error reading usage counters", error=str(e))
+        return 500, {'error': str(e), 'message': 'Failed to read usage counters'}
+    
+    return 200, {
+        'start_day': start_day,
+        'end_day': end_day,
+        'filters': filters,
+        'total': sum(row['count'] for row in rows),
+        'rollups': rows
+    }
@@ -0,0 +1,99 @@
+# layers/threadher-common/python/threadher_tools/factors.py
+"""
+Emission factor cube: garment type x material x origin x lifecycle stage
+
+The factors ship as one binary file (data/emission_factors.cube, built
+from setup/emission_factors.csv by setup/build_factor_cube.py):
+
+    header     magic "THFC", format version, dimension count,
+               metadata length, data offset       (struct '<4sHHII')
+    metadata   JSON: dimension labels, checksum
+    data       little-endian float64, C order, 8-byte aligned
+
+Nothing is read at import. The first lookup memory-maps the file and
+parses the small metadata block; the factors themselves stay in the page
+cache and are indexed in place, so a lookup is a few dict hits and one
+slice however many rows the CSV grows to. Every cell is filled at build
+time (missing combinations take their fallback's factors), and labels
+the cube doesn't know resolve to 'default' / 'unknown' here.
+
+Usage:
+    cube = factors.cube()
+    by_stage = cube.stage_factors('tshirt', 'cotton', 'bangladesh')   # [kg per stage]
+    dict(zip(cube.stages, by_stage))
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+
+from threadher_common import metrics
+
+FACTOR_CUBE_PATH = os.environ.get(
+    'FACTOR_CUBE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'emission_factors.cube')
+)
+
+MAGIC = b'THFC'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHHII')
+DIMENSIONS = ('garment_type', 'material', 'origin', 'stage')
+# Position used for a label the cube doesn't have, per dimension
+FALLBACK_LABELS = ('default', 'default', 'unknown')
+
+_cube = None
+_lock = threading.Lock()
+
+class FactorCube:
+    """A memory-mapped factor file"""
+    
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        magic, version, ndim, metadata_length, data_offset = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION or ndim != len(DIMENSIONS):
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} factor cube")
+        
+        metadata = json.loads(self._mmap[HEADER.size:HEADER.size + metadata_length])
+        self.labels = tuple(tuple(labels) for labels in metadata['labels'])
+        self.stages = self.labels[3]
+        self.shape = tuple(len(labels) for labels in self.labels)
+        self.checksum = metadata['checksum']
+        self._positions = [{label: i for i, label in enumerate(labels)} for labels in self.labels[:3]]
+        self._fallbacks = [positions[label] for positions, label in zip(self._positions, FALLBACK_LABELS)]
+        
+        count = self.shape[0] * self.shape[1] * self.shape[2] * self.shape[3]
+        if sys.byteorder == 'little':
+            # Zero-copy: pages are read from the file on first touch
+            self.values = memoryview(self._mmap)[data_offset:data_offset + count * 8].cast('d')
+        else:
+            self.values = array('d', self._mmap[data_offset:data_offset + count * 8])
+            self.values.byteswap()
+    
+    def position(self, garment_type, material, origin):
+        """(type, material, origin) positions - unknown labels take the fallback's"""
+        return tuple(
+            positions.get(label, fallback)
+            for positions, label, fallback in zip(self._positions, (garment_type, material, origin), self._fallbacks)
+        )
+    
+    def stage_factors(self, garment_type, material, origin):
+        """kg CO2e per lifecycle stage, in self.stages order"""
+        t, m, o = self.position(garment_type, material, origin)
+        stages = self.shape[3]
+        start = ((t * self.shape[1] + m) * self.shape[2] + o) * stages
+        return self.values[start:start + stages].tolist()
+
+def cube():
+    """The factor cube, mapped on first use"""
+    global _cube
+    if _cube is None:
+        with _lock:
+            if _cube is None:
+                with metrics.phase('factor_cube_load'):
+                    _cube = FactorCube(FACTOR_CUBE_PATH)
+    return _cube
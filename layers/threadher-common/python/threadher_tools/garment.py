@@ -0,0 +1,555 @@
+# layers/threadher-common/python/threadher_tools/garment.py
+"""
+Garment image analysis (Rekognition labels + Claude vision)
+
+Used by the ImageAnalyzer Lambda and in-process by the action handler.
+Analyses are indexed by image content hash, so the same photo is never
+analyzed twice. Rekognition (which reads the image from S3 itself) runs
+alongside the download and the Claude call, so an analysis takes about
+as long as its slowest call rather than the sum.
+
+Batches (a list of keys or an S3 prefix) run several images at a time
+under an adaptive limit that halves when Bedrock or Rekognition throttle;
+results are yielded as they finish and stored with BatchWriteItem.
+"""
+import json
+import os
+import re
+import time
+import uuid
+import hashlib
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+from threadher_common import clients, logs, metrics, resilience
+from threadher_tools import convert_to_decimal, parse_body
+
+# Initialize AWS clients (created on first use unless CLIENT_INIT_MODE=primed)
+s3_client = clients.client('s3', region_name='us-east-1', config_options=resilience.client_config('s3'))
+rekognition = clients.client('rekognition', region_name='us-east-1', config_options=resilience.client_config('rekognition'))
+bedrock_runtime = clients.client('bedrock-runtime', region_name='us-east-1', config_options=resilience.client_config('bedrock-runtime'))
+dynamodb = clients.resource('dynamodb', region_name='us-east-1')
+
+# Reads are idempotent and hedged; a model call is too expensive to send twice
+s3_dependency = resilience.Dependency('s3', hedge=True)
+rekognition_dependency = resilience.Dependency('rekognition', hedge=True)
+claude_dependency = resilience.Dependency('bedrock-runtime')
+dynamodb_reads = resilience.Dependency('dynamodb', hedge=True)
+dynamodb_writes = resilience.Dependency('dynamodb')
+
+# DYNAMODB_TABLE is what the ImageAnalyzer function was deployed with
+table_name = os.environ.get('GARMENTS_TABLE', os.environ.get('DYNAMODB_TABLE', 'ThreadHerGarments'))
+table = clients.table(dynamodb, table_name)
+
+# Analysis results indexed by image content hash
+index_table_name = os.environ.get('ANALYSIS_INDEX_TABLE', 'ThreadHer-AnalysisIndex')
+index_table = clients.table(dynamodb, index_table_name)
+
+logger = logs.get_logger('ImageAnalyzer')
+
+# Bump when the prompt or models change so stored analyses are not reused
+ANALYSIS_VERSION = os.environ.get('ANALYSIS_VERSION', '1')
+
+# Rekognition runs on this pool while the handler thread downloads the
+# image and calls Claude; the size bounds the calls in flight per container
+ANALYZER_POOL_SIZE = int(os.environ.get('ANALYZER_POOL_SIZE', 4))
+analyzer_pool = ThreadPoolExecutor(max_workers=ANALYZER_POOL_SIZE, thread_name_prefix='analyzer')
+# How long a finished Claude analysis waits for late labels before answering without them
+LABELS_GRACE_MS = int(os.environ.get('REKOGNITION_GRACE_MS', 500))
+
+# Batches (bulk wardrobe onboarding): largest request, and images in flight -
+# each holds an analyzer pool thread for its Rekognition call
+BATCH_MAX_IMAGES = int(os.environ.get('IMAGE_BATCH_MAX_IMAGES', 100))
+BATCH_CONCURRENCY = max(1, min(int(os.environ.get('IMAGE_BATCH_CONCURRENCY', ANALYZER_POOL_SIZE)), ANALYZER_POOL_SIZE))
+# An image isn't started with less time left than this; it is reported as not analyzed
+BATCH_MIN_START_MS = int(os.environ.get('IMAGE_BATCH_MIN_START_MS', 5000))
+batch_pool = ThreadPoolExecutor(max_workers=BATCH_CONCURRENCY, thread_name_prefix='batch')
+# Shared by every batch in the container, so what it learns about the account's limits carries over
+batch_limiter = resilience.AdaptiveLimiter('image_batch', BATCH_CONCURRENCY, dependencies=(claude_dependency, rekognition_dependency))
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png')
+
+# The formats both Rekognition and Claude read, by their leading bytes
+IMAGE_SIGNATURES = {
+    b'\xff\xd8\xff': 'image/jpeg',
+    b'\x89PNG\r\n\x1a\n': 'image/png'
+}
+
+# Content-addressed upload keys: uploads/sha256/<hex digest>.<ext>
+CONTENT_KEY = re.compile(r'(?:^|/)sha256/([0-9a-f]{64})\.[a-z0-9]+$')
+
+def analyze_image_with_rekognition(bucket_name, image_key):
+    """Use AWS Rekognition to detect labels in the image"""
+    try:
+        response = rekognition_dependency.call(
+            rekognition.detect_labels,
+            Image={
+                'S3Object': {
+                    'Bucket': bucket_name,
+                    'Name': image_key
+                }
+            },
+            MaxLabels=20,
+            MinConfidence=70
+        )
+        return response.get('Labels', [])
+    except Exception as e:
+        logger.warning("Rekognition error", error=str(e))
+        return []
+
+def image_media_type(image_bytes):
+    """'image/jpeg' or 'image/png' from the image's own bytes, None for anything else"""
+    for signature, media_type in IMAGE_SIGNATURES.items():
+        if image_bytes.startswith(signature):
+            return media_type
+    return None
+
+def analyze_with_claude(image_bytes, media_type='image/jpeg'):
+    """Use Claude 3 via Bedrock to analyze garment details"""
+    try:
+        import base64
+        image_base64 = base64.b64encode(image_bytes).decode('utf-8')
+        
+        prompt = """Analyze this clothing item and provide:
+1. Garment type (e.g., t-shirt, jeans, dress, jacket)
+2. Primary material (e.g., cotton, polyester, denim, wool)
+3. Condition (excellent, good, fair, poor)
+4. Style category (casual, formal, athletic, etc.)
+5. Estimated age/wear level
+6. Any visible brand logos or tags
+
+Respond in JSON format."""
+
+        body = json.dumps({
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": 1000,
+            "messages": [{
+                "role": "user",
+                "content": [
+                    {
+                        "type": "image",
+                        "source": {
+                            "type": "base64",
+                            "media_type": media_type,
+                            "data": image_base64
+                        }
+                    },
+                    {
+                        "type": "text",
+                        "text": prompt
+                    }
+                ]
+            }]
+        })
+        
+        response_body = claude_dependency.call(invoke_claude, body, fallback=lambda e: None)
+        if response_body is None:
+            return None
+        analysis_text = response_body['content'][0]['text']
+        
+        # Try to parse JSON from response
+        try:
+            return json.loads(analysis_text)
+        except:
+            # If not valid JSON, create structured response from text
+            return {
+                'raw_analysis': analysis_text,
+                'garment_type': 'unknown',
+                'material': 'unknown',
+                'condition': 'unknown'
+            }
+            
+    except Exception as e:
+        logger.warning("Claude analysis error", error=str(e))
+        return None
+
+def start_labels(bucket_name, image_key):
+    """Rekognition labels for an S3 object, as a future on the analyzer pool"""
+    def labels():
+        with metrics.phase('rekognition'):
+            return analyze_image_with_rekognition(bucket_name, image_key)
+    
+    return resilience.submit(analyzer_pool, labels)
+
+def collect_labels(future, wait_ms=None):
+    """
+    The labels of start_labels, waiting at most wait_ms (and never past the
+    deadline) - labels that arrive later are dropped, not waited for
+    """
+    remaining = resilience.remaining_ms()
+    if remaining is not None:
+        wait_ms = max(0, remaining) if wait_ms is None else min(wait_ms, max(0, remaining))
+    try:
+        return future.result(timeout=None if wait_ms is None else wait_ms / 1000)
+    except TimeoutError:
+        future.cancel()
+        logger.warning("Rekognition labels dropped", waited_ms=wait_ms)
+        metrics.current().count('rekognition_dropped')
+        return []
+
+def read_image(bucket_name, image_key):
+    """Image bytes from S3 - the download is part of the timed call"""
+    return s3_client.get_object(Bucket=bucket_name, Key=image_key)['Body'].read()
+
+def invoke_claude(body):
+    """Claude's parsed response - reading the body is part of the timed call"""
+    response = bedrock_runtime.invoke_model(
+        modelId='anthropic.claude-3-sonnet-20240229-v1:0',
+        body=body
+    )
+    return json.loads(response['body'].read())
+
+def content_hash_from_key(image_key):
+    """Return the SHA-256 embedded in a content-addressed key, or None"""
+    match = CONTENT_KEY.search(image_key)
+    return match.group(1) if match else None
+
+def get_indexed_analysis(image_sha256):
+    """Look up a stored analysis for this image content"""
+    try:
+        with metrics.phase('index_lookup'):
+            response = dynamodb_reads.call(index_table.get_item, Key={'image_sha256': image_sha256})
+        item = response.get('Item')
+        if not item or item.get('analysis_version') != ANALYSIS_VERSION:
+            return None
+        return {
+            'garment_id': item['garment_id'],
+            'analysis': json.loads(item['analysis_json'])
+        }
+    except Exception as e:
+        logger.warning("Analysis index lookup error", error=str(e))
+        return None
+
+def index_item(image_sha256, analysis_result):
+    """The analysis index entry - the analysis is stored as a JSON string, no Decimal round trip on the read path"""
+    return {
+        'image_sha256': image_sha256,
+        'garment_id': analysis_result['garment_id'],
+        'analysis_version': ANALYSIS_VERSION,
+        'analysis_json': json.dumps(analysis_result),
+        'indexed_at': datetime.utcnow().isoformat()
+    }
+
+def index_analysis(image_sha256, analysis_result):
+    """Remember a successful analysis so the same image is never re-analyzed"""
+    try:
+        with metrics.phase('index_put'):
+            dynamodb_writes.call(index_table.put_item, Item=index_item(image_sha256, analysis_result))
+        logger.debug("Indexed analysis", image_sha256=image_sha256[:12])
+    except Exception as e:
+        logger.warning("Could not index analysis", error=str(e))
+
+def cached_analysis_response(cached, user_id, image_s3_key):
+    """Build the normal analyzer (status_code, body) from an indexed analysis"""
+    analysis = dict(cached['analysis'])
+    analysis['user_id'] = user_id
+    analysis['image_s3_key'] = image_s3_key
+    
+    logger.info("Analysis index hit", garment_type=analysis.get('garment_type'), material=analysis.get('material'))
+    metrics.current().set_property('Cached', True)
+    
+    return 200, {
+        'garment_id': cached['garment_id'],
+        'analysis': analysis,
+        'cached': True
+    }
+
+def analyze(event):
+    """
+    Analyze a garment image using computer vision
+    Returns (status_code, body) - the ImageAnalyzer response contract
+    """
+    try:
+        # Parse request body
+        body = parse_body(event)
+        
+        # Extract parameters
+        image_s3_key = body.get('image_s3_key', '').strip()
+        bucket_name = body.get('bucket_name', '').strip()
+        user_id = body.get('user_id', 'anonymous').strip()
+        
+        # Validation
+        if not image_s3_key or not bucket_name:
+            return 400, {'error': 'image_s3_key and bucket_name are required'}
+        
+        return analyze_object(bucket_name, image_s3_key, user_id)
+        
+    except Exception as e:
+        logger.exception("Error analyzing garment", error=str(e))
+        
+        return 500, {'error': str(e), 'message': 'Failed to analyze garment'}
+
+def analyze_object(bucket_name, image_s3_key, user_id, store=True):
+    """
+    Analyze one S3 object - (status_code, body) as analyze() returns it
+    With store=False nothing is written; the caller stores body['analysis']
+    (and indexes it unless it is cached or degraded)
+    """
+    try:
+        logger.info("Analyzing image", bucket=bucket_name, key=image_s3_key)
+        
+        # Content-addressed keys can be looked up before downloading anything
+        image_sha256 = content_hash_from_key(image_s3_key)
+        if image_sha256:
+            cached = get_indexed_analysis(image_sha256)
+            if cached:
+                return cached_analysis_response(cached, user_id, image_s3_key)
+        
+        # Rekognition reads the object itself - no need to wait for our download
+        labels_future = start_labels(bucket_name, image_s3_key)
+        
+        # Get image from S3
+        try:
+            with metrics.phase('s3_get'):
+                image_bytes = s3_dependency.call(read_image, bucket_name, image_s3_key)
+        except resilience.DependencyUnavailable as s3_error:
+            labels_future.cancel()
+            return 503, {'error': str(s3_error), 'message': 'Image storage unavailable', 'degraded': True}
+        except Exception as s3_error:
+            labels_future.cancel()
+            return 404, {'error': f'Image not found: {str(s3_error)}'}
+        
+        # Rekognition only reads JPEG and PNG - and Claude must be told which
+        media_type = image_media_type(image_bytes)
+        if media_type is None:
+            labels_future.cancel()
+            return 415, {'error': 'Only JPEG and PNG images can be analyzed'}
+        
+        # Other keys are hashed after download, still ahead of the Claude call
+        if not image_sha256:
+            with metrics.phase('hash'):
+                image_sha256 = hashlib.sha256(image_bytes).hexdigest()
+            cached = get_indexed_analysis(image_sha256)
+            if cached:
+                labels_future.cancel()
+                return cached_analysis_response(cached, user_id, image_s3_key)
+        
+        # Analyze with Claude for detailed info, while Rekognition runs
+        with metrics.phase('claude'):
+            claude_analysis = analyze_with_claude(image_bytes, media_type)
+        
+        # Labels are a garnish on Claude's analysis - a late Rekognition call
+        # only gets a grace period; without Claude they're all there is
+        with metrics.phase('rekognition_wait'):
+            rekognition_labels = collect_labels(labels_future, LABELS_GRACE_MS if claude_analysis else None)
+        
+        # Generate garment ID
+        garment_id = str(uuid.uuid4())
+        
+        # Compile analysis results
+        analysis_result = {
+            'garment_id': garment_id,
+            'user_id': user_id,
+            'image_s3_key': image_s3_key,
+            'image_sha256': image_sha256,
+            'analyzed_at': datetime.utcnow().isoformat(),
+            'rekognition_labels': [
+                {'name': label['Name'], 'confidence': label['Confidence']}
+                for label in rekognition_labels[:10]
+            ],
+            'claude_analysis': claude_analysis or {},
+            'garment_type': (claude_analysis or {}).get('garment_type', 'unknown'),
+            'material': (claude_analysis or {}).get('material', 'unknown'),
+            'condition': (claude_analysis or {}).get('condition', 'unknown'),
+            'style': (claude_analysis or {}).get('style_category', 'casual')
+        }
+        if claude_analysis is None:
+            # Labels only - the model call failed or ran out of time
+            analysis_result['degraded'] = True
+        
+        logger.info("Analysis complete", garment_type=analysis_result['garment_type'], material=analysis_result['material'])
+        
+        if not store:
+            return 200, {'garment_id': garment_id, 'analysis': analysis_result}
+        
+        # Store in DynamoDB
+        try:
+            dynamodb_item = convert_to_decimal(analysis_result)
+            with metrics.phase('dynamodb_put'):
+                dynamodb_writes.call(table.put_item, Item=dynamodb_item)
+            logger.debug("Stored analysis in DynamoDB")
+        except Exception as db_error:
+            logger.warning("Could not store in DynamoDB", error=str(db_error))
+        
+        # Only index real model output - failed analyses are retried next time
+        if claude_analysis:
+            index_analysis(image_sha256, analysis_result)
+        
+        # Return response
+        return 200, {
+            'garment_id': garment_id,
+            'analysis': analysis_result
+        }
+        
+    except Exception as e:
+        logger.exception("Error analyzing garment", error=str(e))
+        
+        return 500, {'error': str(e), 'message': 'Failed to analyze garment'}
+
+def batch_request(event):
+    """The body of a batch request ("image_s3_keys" or "image_s3_prefix"), or None for one image"""
+    body = parse_body(event)
+    if isinstance(body, dict) and ('image_s3_keys' in body or 'image_s3_prefix' in body):
+        return body
+    return None
+
+def batch_keys(request):
+    """
+    (bucket_name, image keys, user_id) of a batch request - the keys in
+    request order without repeats, or the images listed under the prefix
+    Raises ValueError when the request can't be run
+    """
+    bucket_name = (request.get('bucket_name') or '').strip()
+    user_id = (request.get('user_id') or 'anonymous').strip()
+    if not bucket_name:
+        raise ValueError('bucket_name is required')
+    
+    if 'image_s3_keys' in request:
+        keys = request['image_s3_keys']
+        if not isinstance(keys, list) or not all(isinstance(key, str) and key.strip() for key in keys):
+            raise ValueError('image_s3_keys must be a list of keys')
+        keys = list(dict.fromkeys(key.strip() for key in keys))
+    else:
+        prefix = (request.get('image_s3_prefix') or '').strip()
+        if not prefix:
+            raise ValueError('image_s3_prefix must not be empty')
+        with metrics.phase('s3_list'):
+            keys = list_images(bucket_name, prefix, BATCH_MAX_IMAGES + 1)
+    
+    if not keys:
+        raise ValueError('no images')
+    if len(keys) > BATCH_MAX_IMAGES:
+        raise ValueError(f"more than {BATCH_MAX_IMAGES} images")
+    return bucket_name, keys, user_id
+
+def list_images(bucket_name, prefix, limit):
+    """Up to limit image keys under prefix (paginated ListObjectsV2)"""
+    keys = []
+    kwargs = {'Bucket': bucket_name, 'Prefix': prefix}
+    while len(keys) < limit:
+        response = s3_dependency.call(s3_client.list_objects_v2, **kwargs)
+        keys.extend(item['Key'] for item in response.get('Contents', []) if item['Key'].lower().endswith(IMAGE_SUFFIXES))
+        if not response.get('IsTruncated'):
+            break
+        kwargs['ContinuationToken'] = response['NextContinuationToken']
+    return keys[:limit]
+
+def out_of_batch_time():
+    remaining = resilience.remaining_ms()
+    return remaining is not None and remaining < BATCH_MIN_START_MS
+
+def iter_batch(bucket_name, keys, user_id, batch_id=None):
+    """
+    Analyze keys, as many at a time as batch_limiter allows, yielding
+    ('result', result) as each image finishes (completion order; 'index'
+    is its position in keys), then ('done', summary). Records are stored
+    with BatchWriteItem while results arrive. Closing the generator early
+    stops starting images and still stores the finished ones.
+    """
+    batch_id = batch_id or str(uuid.uuid4())
+    timer = metrics.current()
+    logger.info("Analyzing batch", batch_id=batch_id, images=len(keys), limit=int(batch_limiter.limit))
+    
+    counts = {'analyzed': 0, 'cached': 0, 'degraded': 0, 'failed': 0}
+    stored = True
+    next_index = 0
+    running = {}
+    try:
+        # boto3 sends 25 puts per BatchWriteItem and resends unprocessed items;
+        # the same image twice in a batch is one index entry
+        with table.batch_writer() as records, index_table.batch_writer(overwrite_by_pkeys=['image_sha256']) as index_entries:
+            while True:
+                # Start what the limit allows - never with too little time left for an image
+                while next_index < len(keys) and not out_of_batch_time():
+                    token = batch_limiter.acquire()
+                    if token is None:
+                        break
+                    future = resilience.submit(batch_pool, analyze_object, bucket_name, keys[next_index], user_id, store=False)
+                    future.add_done_callback(lambda _, token=token: batch_limiter.release(token))
+                    running[future] = next_index
+                    next_index += 1
+                
+                if not running:
+                    if next_index >= len(keys) or out_of_batch_time():
+                        break
+                    # Every slot is held by other batches in this container
+                    time.sleep(0.05)
+                    continue
+                
+                done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = running.pop(future)
+                    status_code, body = future.result()
+                    analysis = body.get('analysis') if status_code == 200 else None
+                    if analysis is None:
+                        counts['failed'] += 1
+                    elif body.get('cached'):
+                        counts['cached'] += 1
+                    else:
+                        counts['analyzed'] += 1
+                        if analysis.get('degraded'):
+                            counts['degraded'] += 1
+                        try:
+                            with timer.phase('dynamodb_batch_write'):
+                                dynamodb_item = convert_to_decimal(analysis)
+                                dynamodb_item['batch_id'] = batch_id
+                                records.put_item(Item=dynamodb_item)
+                                # Only index real model output - failed analyses are retried next time
+                                if not analysis.get('degraded'):
+                                    index_entries.put_item(Item=index_item(analysis['image_sha256'], analysis))
+                        except Exception as db_error:
+                            stored = False
+                            logger.warning("Could not store batch result", batch_id=batch_id, error=str(db_error))
+                    
+                    yield 'result', dict(body, index=index, image_s3_key=keys[index], status_code=status_code)
+    except Exception as db_error:
+        # What's left in the writers is sent when the with block exits
+        stored = False
+        logger.warning("Could not store batch in DynamoDB", batch_id=batch_id, error=str(db_error))
+    finally:
+        for future in running:
+            future.cancel()
+    
+    timer.count('batch_images', next_index)
+    logger.info("Batch complete", batch_id=batch_id, not_analyzed=len(keys) - next_index, limit=int(batch_limiter.limit), **counts)
+    
+    summary = {'batch_id': batch_id, 'images': len(keys)}
+    summary.update(counts)
+    summary.update({
+        'stored': stored,
+        'concurrency': int(batch_limiter.limit),
+        # Never started (out of time) - send them again as a new batch
+        'not_analyzed': keys[next_index:]
+    })
+    yield 'done', summary
+
+def analyze_batch(request, batch_id=None):
+    """
+    Analyze every image of a batch request (batch_request())
+    Returns (status_code, body): the summary plus one result per image, in
+    request order - the buffered form of iter_batch for the Lambda
+    """
+    try:
+        bucket_name, keys, user_id = batch_keys(request)
+    except ValueError as e:
+        return 400, {'error': str(e), 'message': 'Invalid image batch'}
+    except resilience.DependencyUnavailable as e:
+        return 503, {'error': str(e), 'message': 'Image storage unavailable', 'degraded': True}
+    except Exception as e:
+        return 404, {'error': f'Images not listed: {str(e)}'}
+    
+    try:
+        results = []
+        summary = None
+        for kind, data in iter_batch(bucket_name, keys, user_id, batch_id):
+            if kind == 'result':
+                results.append(data)
+            else:
+                summary = data
+        
+        results.sort(key=lambda result: result['index'])
+        return 200, dict(summary, results=results)
+        
+    except Exception as e:
+        logger.exception("Error analyzing batch", error=str(e))
+        
+        return 500, {'error': str(e), 'message': 'Failed to analyze garment batch'}
@@ -0,0 +1,199 @@
+# layers/threadher-common/python/threadher_tools/normalize.py
+"""
+Free-text garment types and materials -> canonical factor keys
+
+The image analyzer and the agent describe garments the way people do
+("T-shirt", "100% cotton", "Cotton blend (cotton/polyester)"), while the
+factor tables are keyed on tshirt, cotton, organic_cotton... This module
+maps one onto the other, shared by the carbon calculator and the
+circular options tool.
+
+Everything is compiled at import: each alias phrase becomes a path in a
+token trie (so "organic cotton" wins over "cotton", "tank top" is one
+match), and lookups are cached, so a repeated string costs a dict hit.
+
+    garment_type("Denim jacket")                  -> 'jacket'
+    material_blend("60% cotton, 40% polyester")   -> (('cotton', 0.6), ('polyester', 0.4))
+    material_blend("Cotton blend (cotton/poly)")  -> (('cotton', 0.5), ('polyester', 0.5))
+    origin("Made in Bangladesh")                  -> 'bangladesh'
+
+Strings nothing matches keep a slug of their words ("kimono"), so the
+factor lookups fall back to their 'default' entries as before. Origins
+nothing matches are 'unknown' - the global average factors.
+"""
+import functools
+import re
+import unicodedata
+
+# Canonical key -> the ways people write it. The key itself (with _ as
+# a space) always matches too
+GARMENT_TYPE_ALIASES = {
+    'tshirt': ['t shirt', 'tee', 'tee shirt', 'top', 'tank top', 'tank', 'camisole', 'cami', 'blouse', 'shirt', 'polo', 'crop top'],
+    'jeans': ['jean', 'denim jeans', 'denims', 'denim'],
+    'dress': ['gown', 'sundress', 'frock', 'maxi', 'midi dress', 'maxi dress', 'shirt dress', 'slip dress'],
+    'jacket': ['coat', 'blazer', 'parka', 'windbreaker', 'bomber', 'puffer', 'raincoat', 'trench', 'trench coat', 'overcoat', 'anorak', 'gilet'],
+    'sweater': ['jumper', 'pullover', 'cardigan', 'knit', 'knitwear', 'hoodie', 'hoody', 'sweatshirt', 'turtleneck'],
+    'shoes': ['shoe', 'sneaker', 'trainer', 'boot', 'sandal', 'heel', 'loafer', 'footwear', 'pump', 'flat', 'mule', 'espadrille']
+}
+
+MATERIAL_ALIASES = {
+    'cotton': ['cotton jersey', 'jersey', 'cotton twill', 'twill', 'canvas', 'chambray', 'poplin', 'flannel'],
+    'organic_cotton': ['organic', 'gots cotton', 'bio cotton', 'organic cotton jersey'],
+    'recycled_cotton': ['reclaimed cotton'],
+    'polyester': ['poly', 'pet', 'fleece', 'microfiber', 'microfibre'],
+    'recycled_polyester': ['rpet', 'recycled pet', 'recycled poly'],
+    'denim': ['jean', 'jeans', 'denim cotton'],
+    'silk': ['satin', 'mulberry silk', 'chiffon'],
+    'wool': ['merino', 'merino wool', 'lambswool', 'cashmere', 'alpaca', 'mohair', 'tweed', 'felt'],
+    'leather': ['genuine leather', 'real leather', 'suede', 'nubuck', 'patent leather'],
+    'synthetic': ['faux leather', 'vegan leather', 'pu', 'pu leather', 'pvc', 'rubber', 'synthetics', 'man made'],
+    'acrylic': ['acrylic knit'],
+    'nylon': ['polyamide'],
+    'elastane': ['spandex', 'lycra'],
+    'viscose': ['rayon', 'modal', 'lyocell', 'tencel'],
+    'linen': ['flax'],
+    'hemp': []
+}
+
+# Countries with their own factors in the emission factor cube. Two-letter
+# codes that are also English words ("in", "it") are left out
+ORIGIN_ALIASES = {
+    'bangladesh': ['bd', 'bgd'],
+    'cambodia': ['kh', 'khm'],
+    'china': ['cn', 'chn', 'prc', 'peoples republic of china'],
+    'india': ['ind'],
+    'indonesia': ['idn'],
+    'italy': ['ita', 'italia'],
+    'mexico': ['mx', 'mex'],
+    'pakistan': ['pk', 'pak'],
+    'portugal': ['pt', 'prt'],
+    'turkey': ['tr', 'tur', 'turkiye'],
+    'uk': ['gb', 'gbr', 'united kingdom', 'great britain', 'britain', 'england', 'scotland', 'wales'],
+    'usa': ['us', 'united states', 'united states of america', 'america'],
+    'vietnam': ['vn', 'vnm', 'viet nam']
+}
+
+# Never part of a type or material - dropped before matching
+NOISE_WORDS = frozenset({
+    'a', 'an', 'and', 'the', 'of', 'with', 'in', 'made', 'from', 'fabric', 'material', 'blend', 'blended',
+    'mix', 'mixed', 'pure', 'style', 'type', 'womens', 'mens', 'kids', 'ladies', 'unisex'
+})
+
+_TERMINAL = ''
+_TOKEN = re.compile(r'(\d+(?:\.\d+)?)\s*%|([a-z]+)')
+
+def _compile(aliases):
+    """Token trie of every alias phrase, plus the vocabulary for plural folding"""
+    trie = {}
+    vocabulary = set()
+    for canonical, phrases in aliases.items():
+        for phrase in [canonical.replace('_', ' ')] + phrases:
+            node = trie
+            for word in phrase.split():
+                vocabulary.add(word)
+                node = node.setdefault(word, {})
+            node[_TERMINAL] = canonical
+    return trie, frozenset(vocabulary)
+
+TYPE_TRIE, TYPE_WORDS = _compile(GARMENT_TYPE_ALIASES)
+MATERIAL_TRIE, MATERIAL_WORDS = _compile(MATERIAL_ALIASES)
+ORIGIN_TRIE, ORIGIN_WORDS = _compile(ORIGIN_ALIASES)
+
+def tokens(text, vocabulary):
+    """Lowercase ASCII words (plurals folded onto known words) and percentages as floats"""
+    text = unicodedata.normalize('NFKD', str(text or '')).encode('ascii', 'ignore').decode('ascii')
+    result = []
+    for percent, word in _TOKEN.findall(text.lower()):
+        if percent:
+            result.append(float(percent))
+        elif word not in NOISE_WORDS:
+            if word not in vocabulary:
+                for suffix in ('es', 's'):
+                    if word.endswith(suffix) and word[:-len(suffix)] in vocabulary:
+                        word = word[:-len(suffix)]
+                        break
+            result.append(word)
+    return result
+
+def matches(words, trie):
+    """[(start, end, canonical)] - the longest alias at each position, left to right"""
+    found = []
+    i = 0
+    while i < len(words):
+        node = trie
+        longest = None
+        j = i
+        while j < len(words) and isinstance(words[j], str) and words[j] in node:
+            node = node[words[j]]
+            j += 1
+            if _TERMINAL in node:
+                longest = (i, j, node[_TERMINAL])
+        if longest:
+            found.append(longest)
+            i = longest[1]
+        else:
+            i += 1
+    return found
+
+def slug(words):
+    """Key for a string no alias matched"""
+    return '_'.join(w for w in words if isinstance(w, str))[:40] or 'default'
+
+@functools.lru_cache(maxsize=1024)
+def garment_type(text):
+    """Canonical garment type for free text; the last match wins ("denim jacket" -> jacket)"""
+    words = tokens(text, TYPE_WORDS)
+    found = matches(words, TYPE_TRIE)
+    return found[-1][2] if found else slug(words)
+
+@functools.lru_cache(maxsize=1024)
+def material_blend(text):
+    """
+    ((material, weight), ...) for free text, heaviest first, weights summing to 1
+    Percentages go with the material they're written next to - before it
+    ("60% cotton") unless the text puts them after ("cotton 60%"). Materials
+    without one share whatever the percentages leave.
+    """
+    words = tokens(text, MATERIAL_WORDS)
+    found = matches(words, MATERIAL_TRIE)
+    if not found:
+        return ((slug(words), 1.0),)
+    
+    # "cotton 60%, polyester 40%" - the last material is followed by its percentage
+    after = found[-1][1] < len(words) and isinstance(words[found[-1][1]], float)
+    
+    weighted = {}
+    unweighted = []
+    for start, end, canonical in found:
+        position = end if after else start - 1
+        percent = words[position] if 0 <= position < len(words) and isinstance(words[position], float) else None
+        if percent is None:
+            unweighted.append(canonical)
+        else:
+            weighted[canonical] = weighted.get(canonical, 0.0) + percent
+    
+    # "Cotton blend (95% cotton, ...)" - the weighted mention wins
+    unweighted = [m for m in dict.fromkeys(unweighted) if m not in weighted]
+    total = sum(weighted.values())
+    if unweighted:
+        share = (100.0 - total) / len(unweighted) if total else 100.0 / len(unweighted)
+        if share > 0:
+            for canonical in unweighted:
+                weighted[canonical] = share
+            total += share * len(unweighted)
+    if total <= 0:
+        # Only "0%" weights - nothing to go on but the first material named
+        return ((found[0][2], 1.0),)
+    
+    blend = sorted(weighted.items(), key=lambda item: -item[1])
+    return tuple((canonical, round(weight / total, 3)) for canonical, weight in blend)
+
+def material(text):
+    """The main material of free text"""
+    return material_blend(text)[0][0]
+
+@functools.lru_cache(maxsize=256)
+def origin(text):
+    """Canonical origin country for free text, or 'unknown'"""
+    found = matches(tokens(text, ORIGIN_WORDS), ORIGIN_TRIE)
+    return found[-1][2] if found else 'unknown'
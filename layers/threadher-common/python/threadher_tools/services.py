@@ -0,0 +1,227 @@
+# layers/threadher-common/python/threadher_tools/services.py
+"""
+Service locations near a garment's owner: nearest repair, resale and
+recycling places from a memory-mapped geohash index
+
+The locations ship as one binary file (data/service_locations.idx, built
+from a CSV by setup/build_service_index.py):
+
+    header     magic "THSI", format version, geohash bits per axis,
+               metadata length, data offset       (struct '<4sHHII')
+    metadata   JSON: row count, [start, end) row range per service type,
+               section offsets, checksum
+    codes      uint64 geohash per row - latitude and longitude bits
+               interleaved - sorted within each service type
+    latitude   float32 per row
+    longitude  float32 per row
+    text       uint32 offsets + UTF-8 "name<US>address" per row
+
+A query covers its circle with at most 3 x 3 geohash cells of about the
+radius' size; each cell is a contiguous run of codes, found by binary
+search, so only the rows in those cells are read - a few hundred at most
+for hundreds of thousands of rows. k-nearest starts at a small radius
+and doubles it until k rows are inside.
+
+Nothing is read at import. The first query memory-maps the file; the
+rows stay in the page cache. Without the file there are no nearby
+services and the options are the generic ones.
+
+Usage:
+    services = services.index()
+    services.nearest('repair', 40.7128, -74.0060, k=3, max_km=25)
+    services.within('recycling', 51.5072, -0.1276, radius_km=5)
+"""
+import heapq
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+
+from threadher_common import logs, metrics
+
+SERVICE_INDEX_PATH = os.environ.get(
+    'SERVICE_INDEX_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'service_locations.idx')
+)
+
+MAGIC = b'THSI'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHHII')
+BITS = 26
+FIELD_SEPARATOR = '\x1f'
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+# k-nearest searches start here and double
+FIRST_RADIUS_KM = 1.0
+
+logger = logs.get_logger()
+
+_index = None
+_loaded = False
+_lock = threading.Lock()
+
+def spread(value):
+    """The low 32 bits of value, moved to the even bit positions"""
+    value &= 0xFFFFFFFF
+    value = (value | (value << 16)) & 0x0000FFFF0000FFFF
+    value = (value | (value << 8)) & 0x00FF00FF00FF00FF
+    value = (value | (value << 4)) & 0x0F0F0F0F0F0F0F0F
+    value = (value | (value << 2)) & 0x3333333333333333
+    return (value | (value << 1)) & 0x5555555555555555
+
+def cell(latitude, longitude, bits=BITS):
+    """(x, y) grid position of a point, bits per axis"""
+    scale = 1 << bits
+    x = min(scale - 1, max(0, int((longitude + 180.0) / 360.0 * scale)))
+    y = min(scale - 1, max(0, int((latitude + 90.0) / 180.0 * scale)))
+    return x, y
+
+def geohash(latitude, longitude, bits=BITS):
+    """Interleaved geohash of a point as an integer (longitude bits even, latitude odd)"""
+    x, y = cell(latitude, longitude, bits)
+    return spread(x) | (spread(y) << 1)
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance (haversine)"""
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+class ServiceIndex:
+    """A memory-mapped service location file"""
+    
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        
+        magic, version, bits, metadata_length, _ = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"{path} is not a version {FORMAT_VERSION} service index")
+        
+        metadata = json.loads(self._mmap[HEADER.size:HEADER.size + metadata_length])
+        self.bits = bits
+        self.count = metadata['count']
+        self.types = {name: tuple(rows) for name, rows in metadata['types'].items()}
+        self.checksum = metadata['checksum']
+        
+        sections = metadata['sections']
+        self._codes = self._section(sections['codes'], 'Q')
+        self._latitudes = self._section(sections['latitude'], 'f')
+        self._longitudes = self._section(sections['longitude'], 'f')
+        self._text_offsets = self._section(sections['text_offsets'], 'I')
+        self._text_start = sections['text'][0]
+    
+    def _section(self, section, typecode):
+        offset, count = section
+        size = array(typecode).itemsize
+        if sys.byteorder == 'little':
+            # Zero-copy: pages are read from the file on first touch
+            return memoryview(self._mmap)[offset:offset + count * size].cast(typecode)
+        values = array(typecode, self._mmap[offset:offset + count * size])
+        values.byteswap()
+        return values
+    
+    def row(self, i, distance=None):
+        """Row i as a result dict"""
+        start = self._text_start + self._text_offsets[i]
+        end = self._text_start + self._text_offsets[i + 1]
+        name, _, address = self._mmap[start:end].decode('utf-8').partition(FIELD_SEPARATOR)
+        result = {
+            'name': name,
+            'latitude': round(self._latitudes[i], 5),
+            'longitude': round(self._longitudes[i], 5)
+        }
+        if address:
+            result['address'] = address
+        if distance is not None:
+            result['distance_km'] = round(distance, 2)
+        return result
+    
+    def within(self, service_type, latitude, longitude, radius_km, limit=None):
+        """Rows of service_type within radius_km of a point, nearest first"""
+        found = sorted(self._scan(service_type, latitude, longitude, radius_km))
+        if limit is not None:
+            found = found[:limit]
+        return [self.row(i, distance) for distance, i in found]
+    
+    def nearest(self, service_type, latitude, longitude, k=3, max_km=50.0):
+        """The k rows of service_type nearest to a point, no further than max_km"""
+        if service_type not in self.types or k <= 0:
+            return []
+        radius = min(FIRST_RADIUS_KM, max_km)
+        while True:
+            found = self._scan(service_type, latitude, longitude, radius)
+            # Every row within radius has been seen, so the k nearest of them are exact
+            if len(found) >= k or radius >= max_km:
+                return [self.row(i, distance) for distance, i in heapq.nsmallest(k, found)]
+            radius = min(radius * 2, max_km)
+    
+    def _scan(self, service_type, latitude, longitude, radius_km):
+        """[(distance_km, row)] for the rows within radius_km"""
+        rows = self.types.get(service_type)
+        if not rows or radius_km <= 0:
+            return []
+        
+        lat_span = radius_km / KM_PER_DEGREE
+        lon_span = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(latitude)), 1e-6))
+        
+        # Cells at least as large as the radius, so the circle touches at most 3 x 3
+        level = self.bits
+        for span, degrees in ((lat_span, 180.0), (min(lon_span, 360.0), 360.0)):
+            level = min(level, max(0, int(math.floor(math.log2(degrees / span)))))
+        shift = self.bits - level
+        columns = 1 << level
+        
+        min_y = cell(latitude - lat_span, 0.0, level)[1]
+        max_y = cell(latitude + lat_span, 0.0, level)[1]
+        if lon_span >= 180.0:
+            cells_x = range(columns)
+        else:
+            # Columns past the antimeridian wrap around
+            first = math.floor((longitude - lon_span + 180.0) / 360.0 * columns)
+            last = math.floor((longitude + lon_span + 180.0) / 360.0 * columns)
+            cells_x = sorted({x % columns for x in range(first, last + 1)})
+        
+        start, end = rows
+        codes = self._codes
+        latitudes = self._latitudes
+        longitudes = self._longitudes
+        found = []
+        for cell_y in range(min_y, max_y + 1):
+            for cell_x in cells_x:
+                prefix = (spread(cell_x) | (spread(cell_y) << 1)) << (2 * shift)
+                lo = bisect_left(codes, prefix, start, end)
+                hi = bisect_left(codes, prefix + (1 << (2 * shift)), lo, end)
+                for i in range(lo, hi):
+                    row_lat = latitudes[i]
+                    if abs(row_lat - latitude) > lat_span:
+                        continue
+                    row_lon = longitudes[i]
+                    # Bounding box first - haversine only for what's inside (or wraps)
+                    if abs(row_lon - longitude) > lon_span and 360.0 - abs(row_lon - longitude) > lon_span:
+                        continue
+                    distance = distance_km(latitude, longitude, row_lat, row_lon)
+                    if distance <= radius_km:
+                        found.append((distance, i))
+        return found
+
+def index():
+    """The service location index, mapped on first use - None when there is no file"""
+    global _index, _loaded
+    if not _loaded:
+        with _lock:
+            if not _loaded:
+                try:
+                    with metrics.phase('service_index_load'):
+                        _index = ServiceIndex(SERVICE_INDEX_PATH)
+                except FileNotFoundError:
+                    logger.info("No service location index", path=SERVICE_INDEX_PATH)
+                _loaded = True
+    return _index
@@ -0,0 +1,59 @@
+# layers/threadher-common/python/threadher_tools/snapshot.py
+"""
+Response bodies rendered once, with the volatile fields spliced in per call
+
+A tool whose answer is a pure function of a few parameters and static
+tables can render each distinct body to JSON at init. Fields that change
+per call (a timestamp, echoed input) are rendered as markers - a whole
+string value or part of one, or any JSON value with raw=True - and
+render() joins the pre-encoded chunks around their encoded values. A
+call costs a dict lookup and one bytes join instead of building and
+serializing the structure, and the bytes are the ones json.dumps would
+have made of the filled-in body.
+
+Usage:
+    body['generated_at'] = snapshot.marker('generated_at')
+    template = snapshot.Snapshot(body)
+    template.render(generated_at=datetime.utcnow().isoformat())   # bytes
+"""
+import json
+import re
+from json.encoder import encode_basestring_ascii
+
+# A raw marker takes its quotes with it
+_MARKER = re.compile(r'"@@=(\w+)@@"|@@(\w+)@@')
+
+def marker(field, raw=False):
+    """Placeholder for a volatile string field - or, raw, for any JSON value"""
+    return f"@@={field}@@" if raw else f"@@{field}@@"
+
+def escape(value):
+    """A value as JSON string content, without the quotes"""
+    return encode_basestring_ascii(str(value))[1:-1].encode('ascii')
+
+class Snapshot:
+    """A JSON body with markers, split into encoded chunks"""
+    __slots__ = ('chunks', 'fields')
+    
+    def __init__(self, body):
+        # The same encoder settings as http_response
+        text = json.dumps(body)
+        chunks = []
+        fields = []
+        end = 0
+        for match in _MARKER.finditer(text):
+            chunks.append(text[end:match.start()].encode('ascii'))
+            raw_field, field = match.groups()
+            fields.append((raw_field or field, raw_field is not None))
+            end = match.end()
+        chunks.append(text[end:].encode('ascii'))
+        self.chunks = tuple(chunks)
+        self.fields = tuple(fields)
+    
+    def render(self, **values):
+        """The body as bytes, every marker replaced by its field's value"""
+        out = [self.chunks[0]]
+        for (field, raw), chunk in zip(self.fields, self.chunks[1:]):
+            out.append(json.dumps(values[field]).encode('ascii') if raw else escape(values[field]))
+            out.append(chunk)
+        return b''.join(out)
@@ -0,0 +1,95 @@
+# setup/build_factor_cube.py
+"""
+Compile setup/emission_factors.csv into the factor cube the carbon
+calculator memory-maps (threadher_tools/data/emission_factors.cube)
+
+Every garment type, material and origin the normalizer can produce gets
+a slot, and every cell is filled: a combination without rows takes the
+factors of the type's 'default' material, then of the 'default' type,
+each at the row's origin first and origin 'unknown' after. Run it after
+editing the CSV and publish the layer again.
+
+Usage:
+    python setup/build_factor_cube.py
+    python setup/build_factor_cube.py --csv my_factors.csv --out /tmp/factors.cube
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import struct
+import sys
+
+SETUP_DIR = os.path.dirname(os.path.abspath(__file__))
+LAYER_PATH = os.path.join(SETUP_DIR, '..', 'layers', 'threadher-common', 'python')
+sys.path.insert(0, LAYER_PATH)
+
+from threadher_tools import factors, normalize
+
+def read_rows(path):
+    """{(type, material, origin, stage): kg} and the stages in first-seen order"""
+    rows = {}
+    stages = []
+    with open(path, newline='') as f:
+        lines = (line for line in f if line.strip() and not line.startswith('#'))
+        for line_number, row in enumerate(csv.DictReader(lines), 2):
+            key = tuple(row[name].strip() for name in factors.DIMENSIONS)
+            if key in rows:
+                raise ValueError(f"row {line_number}: duplicate factor {key}")
+            rows[key] = float(row['kg_co2e'])
+            if key[3] not in stages:
+                stages.append(key[3])
+    return rows, stages
+
+def fill(rows, garment_type, material, origin, stage):
+    """Factor for one cell, through the fallback chain"""
+    for t, m in ((garment_type, material), (garment_type, 'default'), ('default', 'default')):
+        for o in (origin, 'unknown'):
+            if (t, m, o, stage) in rows:
+                return rows[(t, m, o, stage)]
+    raise ValueError(f"no factor for {garment_type}/{material}/{origin}/{stage} and no default/default/unknown row")
+
+def build(rows, stages):
+    labels = [
+        sorted({key[0] for key in rows} | set(normalize.GARMENT_TYPE_ALIASES) | {'default'}),
+        sorted({key[1] for key in rows} | set(normalize.MATERIAL_ALIASES) | {'default'}),
+        sorted({key[2] for key in rows} | set(normalize.ORIGIN_ALIASES) | {'unknown'}),
+        stages
+    ]
+    values = [
+        fill(rows, t, m, o, s)
+        for t in labels[0] for m in labels[1] for o in labels[2] for s in labels[3]
+    ]
+    data = struct.pack(f"<{len(values)}d", *values)
+    metadata = json.dumps({
+        'dimensions': factors.DIMENSIONS,
+        'labels': labels,
+        'unit': 'kg_co2e',
+        'checksum': hashlib.sha256(data).hexdigest()[:16]
+    }, separators=(',', ':')).encode('utf-8')
+
+    # Factors start 8-byte aligned so they can be viewed as doubles in place
+    data_offset = factors.HEADER.size + len(metadata)
+    data_offset += -data_offset % 8
+    header = factors.HEADER.pack(factors.MAGIC, factors.FORMAT_VERSION, len(factors.DIMENSIONS), len(metadata), data_offset)
+    padding = b'\0' * (data_offset - len(header) - len(metadata))
+    return header + metadata + padding + data, labels
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the emission factor cube from CSV rows')
+    parser.add_argument('--csv', default=os.path.join(SETUP_DIR, 'emission_factors.csv'))
+    parser.add_argument('--out', default=factors.FACTOR_CUBE_PATH)
+    args = parser.parse_args()
+
+    rows, stages = read_rows(args.csv)
+    cube, labels = build(rows, stages)
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, 'wb') as f:
+        f.write(cube)
+
+    shape = ' x '.join(str(len(l)) for l in labels)
+    print(f"{len(rows)} rows -> {args.out} ({shape} = {len(cube)} bytes)")
+
+if __name__ == '__main__':
+    main()
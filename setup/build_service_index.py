@@ -0,0 +1,154 @@
+# setup/build_service_index.py
+"""
+Compile a CSV of service locations into the geohash index the circular
+options tool memory-maps (threadher_tools/data/service_locations.idx)
+
+CSV columns: service_type, name, latitude, longitude and optionally
+address. service_type is what the tool looks up per option - repair,
+resale and recycling - but any label works. Rows are sorted by type,
+then by geohash, so each type and each geohash cell is one contiguous
+run. Run it after updating the CSV and publish the layer again.
+
+--synthetic N writes N random rows around a few cities instead, for
+benchmarks and local testing (never publish that index).
+
+Usage:
+    python setup/build_service_index.py --csv service_locations.csv
+    python setup/build_service_index.py --synthetic 300000 --out /tmp/services.idx
+"""
+import argparse
+import csv
+import hashlib
+import json
+import os
+import random
+import sys
+from array import array
+
+SETUP_DIR = os.path.dirname(os.path.abspath(__file__))
+LAYER_PATH = os.path.join(SETUP_DIR, '..', 'layers', 'threadher-common', 'python')
+sys.path.insert(0, LAYER_PATH)
+
+from threadher_tools import services
+
+# (latitude, longitude) of the synthetic clusters
+SYNTHETIC_CENTERS = [
+    (40.7128, -74.0060), (34.0522, -118.2437), (41.8781, -87.6298), (51.5072, -0.1276),
+    (48.8566, 2.3522), (52.5200, 13.4050), (35.6762, 139.6503), (-33.8688, 151.2093),
+    (19.4326, -99.1332), (-23.5505, -46.6333), (28.6139, 77.2090), (23.8103, 90.4125)
+]
+SYNTHETIC_TYPES = ['repair', 'resale', 'recycling']
+
+def read_rows(path):
+    """[(service_type, name, latitude, longitude, address)]"""
+    rows = []
+    with open(path, newline='', encoding='utf-8') as f:
+        lines = (line for line in f if line.strip() and not line.startswith('#'))
+        for line_number, row in enumerate(csv.DictReader(lines), 2):
+            try:
+                latitude = float(row['latitude'])
+                longitude = float(row['longitude'])
+            except (TypeError, ValueError):
+                raise ValueError(f"row {line_number}: latitude and longitude must be numbers")
+            if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                raise ValueError(f"row {line_number}: ({latitude}, {longitude}) is not a position")
+            rows.append((
+                row['service_type'].strip().lower(),
+                row['name'].strip(),
+                latitude,
+                longitude,
+                (row.get('address') or '').strip()
+            ))
+    return rows
+
+def synthetic_rows(count, seed=7):
+    """count random rows, clustered like a real dataset"""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        center_lat, center_lon = rng.choice(SYNTHETIC_CENTERS)
+        service_type = SYNTHETIC_TYPES[i % len(SYNTHETIC_TYPES)]
+        rows.append((
+            service_type,
+            f"Synthetic {service_type} {i}",
+            max(-90.0, min(90.0, rng.gauss(center_lat, 0.4))),
+            (rng.gauss(center_lon, 0.5) + 180.0) % 360.0 - 180.0,
+            ''
+        ))
+    return rows
+
+def build(rows):
+    keyed = sorted((service_type, services.geohash(lat, lon), lat, lon, name, address)
+                   for service_type, name, lat, lon, address in rows)
+
+    types = {}
+    for i, (service_type, *_) in enumerate(keyed):
+        types.setdefault(service_type, [i, i])[1] = i + 1
+
+    codes = array('Q', (row[1] for row in keyed))
+    latitudes = array('f', (row[2] for row in keyed))
+    longitudes = array('f', (row[3] for row in keyed))
+    text = bytearray()
+    text_offsets = array('I', [0])
+    for row in keyed:
+        text += (row[4] + services.FIELD_SEPARATOR + row[5] if row[5] else row[4]).encode('utf-8')
+        text_offsets.append(len(text))
+
+    arrays = [('codes', codes), ('latitude', latitudes), ('longitude', longitudes), ('text_offsets', text_offsets)]
+    if sys.byteorder != 'little':
+        for _, values in arrays:
+            values.byteswap()
+    blobs = [(name, values.tobytes(), len(values)) for name, values in arrays]
+    blobs.append(('text', bytes(text), len(text)))
+
+    def layout(metadata_length):
+        # Every section starts 8-byte aligned after the header and metadata
+        offset = services.HEADER.size + metadata_length
+        sections = {}
+        for name, blob, count in blobs:
+            offset += -offset % 8
+            sections[name] = [offset, count]
+            offset += len(blob)
+        return sections
+
+    checksum = hashlib.sha256(b''.join(blob for _, blob, _ in blobs)).hexdigest()[:16]
+    # Section offsets depend on the metadata length - repeat until it settles
+    metadata_length = -1
+    metadata = b''
+    while len(metadata) != metadata_length:
+        metadata_length = len(metadata)
+        sections = layout(metadata_length)
+        metadata = json.dumps({
+            'count': len(keyed),
+            'types': types,
+            'sections': sections,
+            'checksum': checksum
+        }, separators=(',', ':')).encode('utf-8')
+
+    out = bytearray(services.HEADER.pack(services.MAGIC, services.FORMAT_VERSION, services.BITS, len(metadata), sections['codes'][0]))
+    out += metadata
+    for name, blob, _ in blobs:
+        out += b'\0' * (sections[name][0] - len(out))
+        out += blob
+    return bytes(out), types
+
+def main():
+    parser = argparse.ArgumentParser(description='Build the service location index from CSV rows')
+    parser.add_argument('--csv', help='service_type,name,latitude,longitude[,address] rows')
+    parser.add_argument('--synthetic', type=int, help='Random rows instead of a CSV (benchmarks only)')
+    parser.add_argument('--out', default=services.SERVICE_INDEX_PATH)
+    args = parser.parse_args()
+    if not args.csv and not args.synthetic:
+        parser.error('give --csv or --synthetic')
+
+    rows = synthetic_rows(args.synthetic) if args.synthetic else read_rows(args.csv)
+    index, types = build(rows)
+    os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+    with open(args.out, 'wb') as f:
+        f.write(index)
+
+    by_type = ', '.join(f"{name} {end - start}" for name, (start, end) in sorted(types.items()))
+    print(f"{len(rows)} rows ({by_type}) -> {args.out} ({len(index)} bytes)")
+
+if __name__ == '__main__':
+    main()
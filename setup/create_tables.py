@@ -110,6 +110,123 @@ def create_dynamodb_tables():
     except Exception as e:
         print(f"❌ Error creating ThreadHer-Wardrobe: {e}")
     
+    # Table 4: Analysis Index (image content hash -> stored analysis)
+    try:
+        print("\n4. Creating ThreadHer-AnalysisIndex table...")
+        index_table = dynamodb.create_table(
+            TableName='ThreadHer-AnalysisIndex',
+            KeySchema=[
+                {'AttributeName': 'image_sha256', 'KeyType': 'HASH'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'image_sha256', 'AttributeType': 'S'}
+            ],
+            ProvisionedThroughput={
+                'ReadCapacityUnits': 5,
+                'WriteCapacityUnits': 5
+            }
+        )
+        
+        index_table.meta.client.get_waiter('table_exists').wait(
+            TableName='ThreadHer-AnalysisIndex'
+        )
+        print("✅ ThreadHer-AnalysisIndex table created successfully!")
+        tables_created.append('ThreadHer-AnalysisIndex')
+        
+    except dynamodb.meta.client.exceptions.ResourceInUseException:
+        print("⚠️  ThreadHer-AnalysisIndex table already exists, skipping...")
+    except Exception as e:
+        print(f"❌ Error creating ThreadHer-AnalysisIndex: {e}")
+    
+    # Table 5: Response Cache (shared /chat answer cache, expired by TTL)
+    try:
+        print("\n5. Creating ThreadHer-ResponseCache table...")
+        cache_table = dynamodb.create_table(
+            TableName='ThreadHer-ResponseCache',
+            KeySchema=[
+                {'AttributeName': 'cache_key', 'KeyType': 'HASH'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'cache_key', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        
+        cache_table.meta.client.get_waiter('table_exists').wait(
+            TableName='ThreadHer-ResponseCache'
+        )
+        cache_table.meta.client.update_time_to_live(
+            TableName='ThreadHer-ResponseCache',
+            TimeToLiveSpecification={'Enabled': True, 'AttributeName': 'expires_at'}
+        )
+        print("✅ ThreadHer-ResponseCache table created successfully!")
+        tables_created.append('ThreadHer-ResponseCache')
+        
+    except dynamodb.meta.client.exceptions.ResourceInUseException:
+        print("⚠️  ThreadHer-ResponseCache table already exists, skipping...")
+    except Exception as e:
+        print(f"❌ Error creating ThreadHer-ResponseCache: {e}")
+    
+    # Table 6: Tool Memo (shared tier of memoized tool results, expired by TTL)
+    try:
+        print("\n6. Creating ThreadHer-ToolMemo table...")
+        memo_table = dynamodb.create_table(
+            TableName='ThreadHer-ToolMemo',
+            KeySchema=[
+                {'AttributeName': 'memo_key', 'KeyType': 'HASH'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'memo_key', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        
+        memo_table.meta.client.get_waiter('table_exists').wait(
+            TableName='ThreadHer-ToolMemo'
+        )
+        memo_table.meta.client.update_time_to_live(
+            TableName='ThreadHer-ToolMemo',
+            TimeToLiveSpecification={'Enabled': True, 'AttributeName': 'expires_at'}
+        )
+        print("✅ ThreadHer-ToolMemo table created successfully!")
+        tables_created.append('ThreadHer-ToolMemo')
+        
+    except dynamodb.meta.client.exceptions.ResourceInUseException:
+        print("⚠️  ThreadHer-ToolMemo table already exists, skipping...")
+    except Exception as e:
+        print(f"❌ Error creating ThreadHer-ToolMemo: {e}")
+    
+    # Table 7: Circular Usage (daily recommendation counters, sharded per day, expired by TTL)
+    try:
+        print("\n7. Creating ThreadHer-CircularUsage table...")
+        usage_table = dynamodb.create_table(
+            TableName='ThreadHer-CircularUsage',
+            KeySchema=[
+                {'AttributeName': 'counter_shard', 'KeyType': 'HASH'},
+                {'AttributeName': 'combination', 'KeyType': 'RANGE'}
+            ],
+            AttributeDefinitions=[
+                {'AttributeName': 'counter_shard', 'AttributeType': 'S'},
+                {'AttributeName': 'combination', 'AttributeType': 'S'}
+            ],
+            BillingMode='PAY_PER_REQUEST'
+        )
+        
+        usage_table.meta.client.get_waiter('table_exists').wait(
+            TableName='ThreadHer-CircularUsage'
+        )
+        usage_table.meta.client.update_time_to_live(
+            TableName='ThreadHer-CircularUsage',
+            TimeToLiveSpecification={'Enabled': True, 'AttributeName': 'expires_at'}
+        )
+        print("✅ ThreadHer-CircularUsage table created successfully!")
+        tables_created.append('ThreadHer-CircularUsage')
+        
+    except dynamodb.meta.client.exceptions.ResourceInUseException:
+        print("⚠️  ThreadHer-CircularUsage table already exists, skipping...")
+    except Exception as e:
+        print(f"❌ Error creating ThreadHer-CircularUsage: {e}")
+    
     # Summary
     print("\n" + "="*50)
     print("📊 SUMMARY")
@@ -0,0 +1,27 @@
+# tests/conftest.py
+"""
+Unit tests for the shared layer and the action schema
+
+Run from the repository root:
+
+    python -m pytest -q
+
+No AWS access is needed: clients are registered lazily and never built,
+and the tests hand the code under test small in-memory doubles instead.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LAYER_PATH = os.path.join(ROOT, 'layers', 'threadher-common', 'python')
+ORCHESTRATOR_PATH = os.path.join(ROOT, 'agents', 'orchestrator')
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+os.environ['LOG_LEVEL'] = 'ERROR'
+os.environ['TOOL_MEMO_TABLE'] = ''
+# Nothing is sent in the background while a test looks at pending tallies
+os.environ['COUNTER_FLUSH_MS'] = '3600000'
+
+sys.path.insert(0, LAYER_PATH)
+# action_schema lives next to the action handler
+sys.path.append(ORCHESTRATOR_PATH)
@@ -0,0 +1,159 @@
+# tests/test_action_schema.py
+import json
+
+import pytest
+
+import action_schema
+from action_schema import ActionError, Dispatcher, project
+
+
+def request_body(**values):
+    """A Bedrock requestBody with every value sent as text, the way the agent sends it"""
+    properties = [{'name': name, 'type': 'string', 'value': value} for name, value in values.items()]
+    return {'content': {'application/json': {'properties': properties}}}
+
+
+@pytest.fixture
+def actions(tmp_path):
+    schema = {'paths': {'/typed': {'post': {
+        'operationId': 'typed',
+        'x-agent-response': {'score': 'result.score', 'name': 'result.name', 'missing': 'result.nowhere'},
+        'requestBody': {'content': {'application/json': {'schema': {
+            'type': 'object',
+            'properties': {
+                'name': {'type': 'string'},
+                'age': {'type': 'number'},
+                'count': {'type': 'integer'},
+                'verbose': {'type': 'boolean'},
+                'tags': {'type': 'array'},
+                'options': {'type': 'object'}
+            },
+            'required': ['name', 'age']
+        }}}}
+    }}}}
+    path = tmp_path / 'schema.json'
+    path.write_text(json.dumps(schema))
+    return Dispatcher(str(path))
+
+
+def test_values_are_typed(actions):
+    params = actions.routes['/typed'].decode(request_body(
+        name='  coat ', age='2.5', count='3', verbose='yes', tags='["a", "b"]', options='{"k": 1}'
+    ))
+    assert params == {'name': 'coat', 'age': 2.5, 'count': 3, 'verbose': True, 'tags': ['a', 'b'], 'options': {'k': 1}}
+
+
+def test_undeclared_and_empty_optional_properties_are_dropped(actions):
+    params = actions.routes['/typed'].decode(request_body(name='coat', age='1', count='', extra='x'))
+    assert params == {'name': 'coat', 'age': 1.0}
+
+
+def test_every_problem_is_reported(actions):
+    with pytest.raises(ActionError) as raised:
+        actions.routes['/typed'].decode(request_body(
+            name='', count='2.5', verbose='maybe', tags='{"not": "a list"}', options='not json'
+        ))
+    problems = raised.value.problems
+    assert problems[:2] == ['name is required', 'age is required']
+    assert problems[2].startswith('count must be integer')
+    assert problems[3].startswith('verbose must be boolean')
+    assert problems[4].startswith('tags must be array')
+    assert problems[5].startswith('options must be object')
+    assert raised.value.api_path == '/typed'
+
+
+@pytest.mark.parametrize('age', ['abc', 'nan', 'inf'])
+def test_numbers_must_be_finite(actions, age):
+    with pytest.raises(ActionError) as raised:
+        actions.routes['/typed'].decode(request_body(name='coat', age=age))
+    assert raised.value.problems[0].startswith('age must be number')
+
+
+def test_missing_request_body_reports_the_required_properties(actions):
+    with pytest.raises(ActionError) as raised:
+        actions.routes['/typed'].decode(None)
+    assert raised.value.problems == ['name is required', 'age is required']
+
+
+def test_unbound_routes_are_not_dispatched(actions):
+    assert actions.route('/typed') is None
+    assert actions.unbound() == ['typed']
+    assert actions.route('/unknown') is None
+
+
+def test_middleware_runs_in_order(actions):
+    calls = []
+    
+    @actions.operation('typed')
+    def handler(params):
+        calls.append('handler')
+        return {'result': params}
+    
+    def outer(route, params, call_next):
+        calls.append('outer')
+        return call_next(params)
+    
+    def inner(route, params, call_next):
+        calls.append('inner')
+        return call_next(dict(params, seen=True))
+    
+    actions.use(outer)
+    actions.use(inner, ['typed'])
+    
+    assert actions.route('/typed')({'a': 1}) == {'result': {'a': 1, 'seen': True}}
+    assert calls == ['outer', 'inner', 'handler']
+
+
+def test_projection_flattens_rounds_and_drops_empty_values(actions):
+    route = actions.routes['/typed']
+    result = {'result': {'score': 72.3456, 'name': '', 'other': 'not projected'}}
+    assert project(result, route.projection) == {'score': 72.35}
+
+
+def test_tools_schema_operations_decode():
+    actions = Dispatcher()
+    with pytest.raises(ActionError) as raised:
+        actions.routes['/calculate-carbon'].decode(request_body(garment_type='tshirt', estimated_age_years='two'))
+    problems = raised.value.problems
+    assert problems[0] == 'material is required'
+    assert problems[1].startswith('estimated_age_years must be number')
+
+
+def test_list_parts_keep_the_first_items_of_each(actions):
+    result = {'options': [{'name': 'a', 'cost': 1}, {'name': 'b'}, {'cost': 3}, {'name': 'd'}], 'ideas': ['x', 'y', 'z']}
+    projection = [
+        ('names', action_schema.parse_path('options[:3].name')),
+        ('ideas', action_schema.parse_path('ideas[:2]'))
+    ]
+    assert project(result, projection) == {'names': ['a', 'b'], 'ideas': ['x', 'y']}
+
+
+@pytest.mark.parametrize('api_path, wrap', [
+    ('/get-circular-options', lambda body: body),
+    ('/assess-garment', lambda body: {'garment_id': 'g-1', 'analysis': {'garment_type': 'jeans'}, 'circular': body})
+])
+def test_circular_options_projection_is_smaller_than_the_result(api_path, wrap):
+    from threadher_tools import circular
+    route = Dispatcher().routes[api_path]
+    nearby = {service_type: [{'name': f"{service_type} {n}", 'distance_km': n * 1.5} for n in range(3)] for service_type in circular.NEARBY_SERVICE_TYPES}
+    
+    for nearby_services in (None, nearby):
+        result = wrap(circular.build_options('jeans', 'fair', 'Paris', nearby_services))
+        projected = project(result, route.projection)
+        
+        assert len(json.dumps(projected)) < len(json.dumps(result)) / 2
+        options = result.get('circular', result)['circular_options']
+        assert projected['recommended_action'] == options['recommended_action']
+        assert projected['location_note'] == options['note']
+        assert projected['repair_options'] == [option['name'] for option in options['repair_options']][:3]
+        # Each field once
+        assert 'circular_options' not in projected
+
+
+def test_assess_garment_keeps_the_agents_own_values():
+    params = Dispatcher().routes['/assess-garment'].decode(request_body(
+        image_s3_key='uploads/s/coat.jpg', bucket_name='bucket', garment_type='Trench coat', material='wool', condition='good'
+    ))
+    assert params['garment_type'] == 'Trench coat'
+    assert params['material'] == 'wool'
+    assert params['condition'] == 'good'
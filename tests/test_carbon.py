@@ -0,0 +1,42 @@
+# tests/test_carbon.py
+import json
+
+import pytest
+
+from threadher_tools import carbon
+
+
+class ClientError(Exception):
+    """Shaped like botocore's ClientError, which the layer matches by its response"""
+    
+    def __init__(self, code):
+        super().__init__(f"An error occurred ({code})")
+        self.response = {'Error': {'Code': code}, 'ResponseMetadata': {'HTTPStatusCode': 403 if code == 'AccessDenied' else 404}}
+
+
+@pytest.fixture
+def s3_refuses(monkeypatch):
+    def refuse(code):
+        def call(*args, **kwargs):
+            raise ClientError(code)
+        monkeypatch.setattr(carbon.s3_dependency, 'call', call)
+    return refuse
+
+
+@pytest.mark.parametrize('code, status', [('NoSuchKey', 404), ('AccessDenied', 400)])
+def test_unreadable_wardrobe_file_is_a_client_error(s3_refuses, code, status):
+    s3_refuses(code)
+    garments = carbon.batch_garments({'body': json.dumps({'garments_s3_key': 'wardrobes/missing.ndjson', 'bucket': 'b'})})
+    
+    status_code, body = carbon.calculate_batch(garments)
+    
+    assert status_code == status
+    assert code in body['error']
+
+
+@pytest.mark.parametrize('body', [{'garments_ndjson': ['{"garment_type": "jeans"}']}, {'garments': 'jeans'}])
+def test_batch_of_the_wrong_type_is_invalid(body):
+    status_code, response = carbon.calculate_batch(carbon.batch_garments({'body': json.dumps(body)}))
+    
+    assert status_code == 400
+    assert response['message'] == 'Invalid garment batch'
@@ -0,0 +1,176 @@
+# tests/test_counters.py
+import pytest
+
+from threadher_common import counters, resilience
+
+
+class ClientError(Exception):
+    def __init__(self, code, status=400):
+        super().__init__(code)
+        self.response = {'Error': {'Code': code}, 'ResponseMetadata': {'HTTPStatusCode': status}}
+
+
+class FakeTable:
+    """query() answers from items keyed by partition; update_item records or raises"""
+    
+    def __init__(self, items=None, error=None):
+        self.items = items or {}
+        self.error = error
+        self.queries = []
+        self.updates = []
+    
+    def query(self, KeyConditionExpression, ExpressionAttributeValues, **kwargs):
+        self.queries.append(ExpressionAttributeValues)
+        prefix = ExpressionAttributeValues.get(':prefix', '')
+        items = self.items.get(ExpressionAttributeValues[':partition'], [])
+        return {'Items': [item for item in items if item['combination'].startswith(prefix)]}
+    
+    def update_item(self, **kwargs):
+        if self.error is not None:
+            raise self.error
+        self.updates.append(kwargs)
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(resilience._local, 'deadline', None, raising=False)
+    monkeypatch.setattr(resilience.Dependency, '_backoff_ms', lambda self, attempt: 0)
+    monkeypatch.setattr(counters.counter_writes, 'circuit', resilience.CircuitBreaker())
+
+
+@pytest.fixture
+def usage():
+    counter = counters.Counters('test', 'TestCounters', ('garment_type', 'condition'), shards=2)
+    counter.table = FakeTable()
+    yield counter
+    # Nothing left for the invocation-end and exit flushes
+    counter._pending.clear()
+    counters._registry.remove(counter)
+
+
+@pytest.mark.parametrize('value, stored', [
+    ('jeans', 'jeans'),
+    ('x#y', 'x_y'),
+    (None, 'unknown'),
+    ('', 'unknown'),
+    (3, '3'),
+])
+def test_label_value(value, stored):
+    assert counters.label_value(value) == stored
+
+
+def test_add_tallies_in_process(usage):
+    usage.add({'garment_type': 'jeans', 'condition': 'good'})
+    usage.add({'garment_type': 'jeans', 'condition': 'good'}, count=2)
+    usage.add({'garment_type': 'x#y'})
+    
+    assert sorted(usage._pending.values()) == [1, 3]
+    assert {values for _, values in usage._pending} == {('jeans', 'good'), ('x_y', 'unknown')}
+    assert usage.table.updates == []
+
+
+def test_flush_sends_one_add_per_combination(usage):
+    usage.add({'garment_type': 'jeans', 'condition': 'good'})
+    usage.add({'garment_type': 'jeans', 'condition': 'good'})
+    usage.flush()
+    
+    (update,) = usage.table.updates
+    assert update['Key']['combination'] == 'jeans#good'
+    assert update['Key']['counter_shard'].startswith('test#')
+    assert update['ExpressionAttributeValues'][':count'] == 2
+    assert usage._pending == {}
+
+
+def test_rejected_updates_are_kept_for_the_next_flush(usage):
+    usage.table.error = ClientError('ProvisionedThroughputExceededException')
+    usage.add({'garment_type': 'jeans', 'condition': 'good'}, count=5)
+    usage.flush()
+    
+    assert list(usage._pending.values()) == [5]
+    
+    usage.table.error = None
+    usage.add({'garment_type': 'jeans', 'condition': 'good'})
+    usage.flush()
+    assert usage.table.updates[0]['ExpressionAttributeValues'][':count'] == 6
+
+
+def test_timed_out_updates_are_not_resent(usage):
+    # The ADD may have been applied - counting it again would double it
+    usage.table.error = TimeoutError('no answer')
+    usage.add({'garment_type': 'jeans', 'condition': 'good'})
+    usage.flush()
+    
+    assert usage._pending == {}
+
+
+def test_rollup_sums_shards_and_days(usage):
+    usage.table.items = {
+        'test#2026-10-01#0': [{'combination': 'jeans#good', 'count': 2}, {'combination': 'dress#poor', 'count': 1}],
+        'test#2026-10-01#1': [{'combination': 'jeans#good', 'count': 3}],
+        'test#2026-10-02#1': [{'combination': 'jeans#good', 'count': 4}],
+    }
+    
+    assert usage.rollup('2026-10-01', '2026-10-02') == [
+        {'garment_type': 'jeans', 'condition': 'good', 'count': 9},
+        {'garment_type': 'dress', 'condition': 'poor', 'count': 1}
+    ]
+    assert usage.rollup('2026-10-01', '2026-10-02', by_day=True)[:2] == [
+        {'garment_type': 'jeans', 'condition': 'good', 'day': '2026-10-01', 'count': 5},
+        {'garment_type': 'jeans', 'condition': 'good', 'day': '2026-10-02', 'count': 4}
+    ]
+
+
+def test_rollup_filters_match_stored_labels(usage):
+    usage.table.items = {'test#2026-10-01#0': [
+        {'combination': 'x_y#good', 'count': 2},
+        {'combination': 'x_y#poor', 'count': 1},
+        {'combination': 'jeans#good', 'count': 7}
+    ]}
+    
+    assert usage.rollup('2026-10-01', garment_type='x#y', condition='good') == [
+        {'garment_type': 'x_y', 'condition': 'good', 'count': 2}
+    ]
+    assert usage.table.queries[0][':prefix'] == 'x_y#good'
+    # A filter after a missing one can't be a key prefix - it is applied to the items read
+    assert usage.rollup('2026-10-01', condition='good') == [
+        {'garment_type': 'jeans', 'condition': 'good', 'count': 7},
+        {'garment_type': 'x_y', 'condition': 'good', 'count': 2}
+    ]
+
+
+@pytest.mark.parametrize('start_day, end_day, filters', [
+    ('2026-10-02', '2026-10-01', {}),
+    ('2025-01-01', '2026-10-01', {}),
+    ('2026-10-01', None, {'colour': 'red'}),
+    ('01/10/2026', None, {}),
+])
+def test_rollup_rejects_bad_queries(usage, start_day, end_day, filters):
+    with pytest.raises(ValueError):
+        usage.rollup(start_day, end_day, **filters)
+
+
+def test_tallies_wait_for_the_flush_interval(usage, monkeypatch):
+    monkeypatch.setattr(counters, '_last_flush', counters.time.monotonic())
+    usage.add({'garment_type': 'jeans', 'condition': 'good'})
+    counters.flush_before_freeze()
+    assert usage.table.updates == []
+    
+    # A later invocation past the interval sends everything counted since
+    usage.add({'garment_type': 'jeans', 'condition': 'good'})
+    monkeypatch.setattr(counters, '_last_flush', counters.time.monotonic() - counters.COUNTER_FLUSH_MS / 1000)
+    counters.flush_before_freeze()
+    (update,) = usage.table.updates
+    assert update['ExpressionAttributeValues'][':count'] == 2
+
+
+def test_many_pending_combinations_flush_early(usage, monkeypatch):
+    monkeypatch.setattr(counters, '_last_flush', counters.time.monotonic())
+    monkeypatch.setattr(counters, 'COUNTER_MAX_PENDING', 3)
+    for garment_type in ('jeans', 'dress'):
+        usage.add({'garment_type': garment_type, 'condition': 'good'})
+    assert not counters.flush_due()
+    
+    usage.add({'garment_type': 'shoes', 'condition': 'good'})
+    assert counters.flush_due()
+    counters.flush_before_freeze()
+    assert len(usage.table.updates) == 3
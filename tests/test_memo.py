@@ -0,0 +1,76 @@
+# tests/test_memo.py
+import pytest
+
+from threadher_common import memo
+
+
+@pytest.fixture(autouse=True)
+def empty_memory():
+    memo.clear()
+    yield
+    memo.clear()
+
+
+def test_key_ignores_parameter_order():
+    tool = memo.Memo('test')
+    assert tool.key({'a': 1, 'b': 2}) == tool.key({'b': 2, 'a': 1})
+    assert tool.key({'a': 1}) != tool.key({'a': 2})
+
+
+def test_key_changes_with_the_data_version():
+    assert memo.Memo('test', 'v1').key({'a': 1}) != memo.Memo('test', 'v2').key({'a': 1})
+    assert memo.Memo('test').key({'a': 1}) != memo.Memo('other').key({'a': 1})
+
+
+def test_version_is_computed_once_on_first_key():
+    calls = []
+    tool = memo.Memo('test', lambda: calls.append(1) or memo.data_version({'tshirt': 2}))
+    
+    tool.key({'a': 1})
+    tool.key({'a': 2})
+    assert calls == [1]
+
+
+def test_memory_tier_round_trip():
+    tool = memo.Memo('test')
+    memo_key = tool.key({'a': 1})
+    assert tool.get(memo_key) == (None, None)
+    
+    tool.put(memo_key, {'kg': 1.5})
+    result, tier = tool.get(memo_key)
+    assert (result, tier) == ({'kg': 1.5}, 'memory')
+    
+    # Callers get a copy
+    result['kg'] = 99
+    assert tool.get(memo_key)[0] == {'kg': 1.5}
+
+
+def test_expired_entries_are_misses():
+    tool = memo.Memo('test')
+    memo_key = tool.key({'a': 1})
+    memo.remember(memo_key, '{"kg": 1.5}', expires_at=1)
+    
+    assert tool.get(memo_key) == (None, None)
+
+
+def test_least_recently_used_entry_is_evicted(monkeypatch):
+    monkeypatch.setattr(memo, 'MEMO_MAX_ENTRIES', 2)
+    tool = memo.Memo('test')
+    keys = [tool.key({'n': n}) for n in range(3)]
+    
+    tool.put(keys[0], 0)
+    tool.put(keys[1], 1)
+    tool.get(keys[0])
+    tool.put(keys[2], 2)
+    
+    assert tool.get(keys[1]) == (None, None)
+    assert tool.get(keys[0]) == (0, 'memory')
+
+
+def test_disabled_memo_never_hits(monkeypatch):
+    monkeypatch.setattr(memo, 'MEMO_ENABLED', False)
+    tool = memo.Memo('test')
+    memo_key = tool.key({'a': 1})
+    tool.put(memo_key, {'kg': 1.5})
+    
+    assert tool.get(memo_key) == (None, None)
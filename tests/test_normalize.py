@@ -0,0 +1,70 @@
+# tests/test_normalize.py
+import pytest
+
+from threadher_tools import normalize
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('T-shirt', 'tshirt'),
+    ('Tank tops', 'tshirt'),
+    ('tee', 'tshirt'),
+    ('Skinny jeans', 'jeans'),
+    ('denim', 'jeans'),
+    ('Denim jacket', 'jacket'),
+    ('Trench coat', 'jacket'),
+    ('Hoodie', 'sweater'),
+    ('Sneakers', 'shoes'),
+    ('dress', 'dress'),
+    ('Kimono', 'kimono'),
+    ('', 'default'),
+    (None, 'default'),
+])
+def test_garment_type(text, expected):
+    assert normalize.garment_type(text) == expected
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('100% cotton', 'cotton'),
+    ('Organic cotton', 'organic_cotton'),
+    ('Recycled polyester', 'recycled_polyester'),
+    ('Merino wool', 'wool'),
+    ('Faux leather', 'synthetic'),
+    ('Spandex', 'elastane'),
+    ('Tencel', 'viscose'),
+    ('mystery fabric', 'mystery'),
+    (None, 'default'),
+])
+def test_material(text, expected):
+    assert normalize.material(text) == expected
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('60% cotton, 40% polyester', (('cotton', 0.6), ('polyester', 0.4))),
+    ('cotton 60%, polyester 40%', (('cotton', 0.6), ('polyester', 0.4))),
+    ('Cotton blend (cotton/polyester)', (('cotton', 0.5), ('polyester', 0.5))),
+    ('95% cotton, elastane', (('cotton', 0.95), ('elastane', 0.05))),
+    ('Cotton blend (95% cotton, 5% elastane)', (('cotton', 0.95), ('elastane', 0.05))),
+    ('0% polyester', (('polyester', 1.0),)),
+])
+def test_material_blend(text, expected):
+    assert normalize.material_blend(text) == expected
+
+
+def test_blend_weights_sum_to_one():
+    blend = normalize.material_blend('50% wool, 30% nylon, acrylic, viscose')
+    assert sum(weight for _, weight in blend) == pytest.approx(1.0, abs=0.01)
+    assert [material for material, _ in blend] == ['wool', 'nylon', 'acrylic', 'viscose']
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('Made in Bangladesh', 'bangladesh'),
+    ('PRC', 'china'),
+    ('United Kingdom', 'uk'),
+    ('US', 'usa'),
+    ('Viet Nam', 'vietnam'),
+    ('Made in Italy', 'italy'),
+    ('Atlantis', 'unknown'),
+    ('', 'unknown'),
+])
+def test_origin(text, expected):
+    assert normalize.origin(text) == expected
@@ -0,0 +1,285 @@
+# tests/test_resilience.py
+import types
+
+import pytest
+
+from threadher_common import resilience
+
+
+class ClientError(Exception):
+    """Shaped like botocore's ClientError: the service answered with an error"""
+    
+    def __init__(self, code, status=400):
+        super().__init__(code)
+        self.response = {'Error': {'Code': code}, 'ResponseMetadata': {'HTTPStatusCode': status}}
+
+
+def network_error(name):
+    """botocore's network errors are matched by class name"""
+    return type(name, (Exception,), {})('connection trouble')
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+    
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(autouse=True)
+def no_deadline_or_backoff(monkeypatch):
+    monkeypatch.setattr(resilience._local, 'deadline', None, raising=False)
+    monkeypatch.setattr(resilience.Dependency, '_backoff_ms', lambda self, attempt: 0)
+
+
+def failing(*errors, result='ok'):
+    """fn raising errors one call at a time, then returning result; .calls counts the calls"""
+    remaining = list(errors)
+    
+    def fn():
+        fn.calls += 1
+        if remaining:
+            raise remaining.pop(0)
+        return result
+    fn.calls = 0
+    return fn
+
+
+@pytest.mark.parametrize('error, kind', [
+    (ClientError('ThrottlingException'), 'throttle'),
+    (ClientError('ProvisionedThroughputExceededException'), 'throttle'),
+    (ClientError('SomethingElse', status=429), 'throttle'),
+    (ClientError('ServiceUnavailable', status=503), 'transient'),
+    (ClientError('SomethingElse', status=500), 'transient'),
+    (TimeoutError('slow'), 'transient'),
+    (resilience.CircuitOpen('s3', 'circuit open'), 'transient'),
+    (network_error('ReadTimeoutError'), 'transient'),
+    (network_error('EndpointConnectionError'), 'transient'),
+    (ClientError('ValidationException'), None),
+    (ClientError('AccessDeniedException', status=403), None),
+    (ValueError('bad input'), None),
+])
+def test_error_kind(error, kind):
+    assert resilience.error_kind(error) == kind
+
+
+@pytest.mark.parametrize('error, expected', [
+    (ClientError('ThrottlingException'), True),
+    (ClientError('InternalServerError', status=500), True),
+    (network_error('EndpointConnectionError'), True),
+    (network_error('ConnectTimeoutError'), True),
+    (resilience.Saturated('s3', 'every thread busy'), True),
+    (network_error('ReadTimeoutError'), False),
+    (network_error('ConnectionClosedError'), False),
+    (TimeoutError('slow'), False),
+])
+def test_rejected_only_when_the_request_was_not_applied(error, expected):
+    assert resilience.rejected(error) is expected
+
+
+def test_throttled_calls_are_retried():
+    dependency = resilience.Dependency('test-retry', max_retries=2)
+    fn = failing(ClientError('ThrottlingException'), ClientError('ThrottlingException'))
+    
+    assert dependency.call(fn) == 'ok'
+    assert fn.calls == 3
+    assert dependency.throttles == 2
+
+
+def test_retries_are_bounded():
+    dependency = resilience.Dependency('test-retry', max_retries=1)
+    fn = failing(*[ClientError('InternalServerError', status=500)] * 3)
+    
+    with pytest.raises(resilience.DependencyUnavailable):
+        dependency.call(fn)
+    assert fn.calls == 2
+
+
+def test_client_errors_are_raised_without_retrying():
+    dependency = resilience.Dependency('test-retry')
+    fn = failing(ClientError('ValidationException'))
+    
+    with pytest.raises(ClientError):
+        dependency.call(fn)
+    assert fn.calls == 1
+    # The service answered, so the dependency itself is healthy
+    assert dependency.circuit.failures == 0
+
+
+def test_state_changes_are_not_resent_after_a_timeout():
+    dependency = resilience.Dependency('test-writes', idempotent=False)
+    fn = failing(network_error('ReadTimeoutError'))
+    
+    with pytest.raises(resilience.DependencyUnavailable) as raised:
+        dependency.call(fn)
+    assert fn.calls == 1
+    assert type(raised.value.cause).__name__ == 'ReadTimeoutError'
+
+
+def test_state_changes_are_retried_when_rejected():
+    dependency = resilience.Dependency('test-writes', idempotent=False)
+    fn = failing(ClientError('ThrottlingException'), network_error('EndpointConnectionError'))
+    
+    assert dependency.call(fn) == 'ok'
+    assert fn.calls == 3
+
+
+def test_state_changes_cannot_be_hedged():
+    with pytest.raises(ValueError):
+        resilience.Dependency('test-writes', hedge=True, idempotent=False)
+
+
+def test_fallback_replaces_the_error():
+    dependency = resilience.Dependency('test-fallback', max_retries=0)
+    fn = failing(ClientError('ServiceUnavailable', status=503))
+    
+    assert dependency.call(fn, fallback=lambda e: {'degraded': e.reason}) == {'degraded': "transient error: ServiceUnavailable"}
+
+
+def test_past_deadline_fails_without_calling(monkeypatch):
+    dependency = resilience.Dependency('test-deadline')
+    fn = failing()
+    monkeypatch.setattr(resilience._local, 'deadline', 1.0)
+    
+    with pytest.raises(resilience.DeadlineExceeded):
+        dependency.call(fn)
+    assert fn.calls == 0
+
+
+def test_propagate_adds_the_deadline(monkeypatch):
+    monkeypatch.setattr(resilience._local, 'deadline', 123456.7)
+    assert resilience.propagate({'a': 1}) == {'a': 1, resilience.DEADLINE_FIELD: 123456}
+
+
+def test_caller_deadline_wins_when_sooner():
+    context = types.SimpleNamespace(get_remaining_time_in_millis=lambda: 60000)
+    deadline = resilience.start(context, {resilience.DEADLINE_FIELD: 5000})
+    assert deadline == 5000
+
+
+class TestCircuitBreaker:
+    @pytest.fixture
+    def clock(self, monkeypatch):
+        clock = Clock()
+        monkeypatch.setattr(resilience.time, 'time', clock)
+        return clock
+    
+    def test_opens_after_consecutive_failures(self, clock):
+        breaker = resilience.CircuitBreaker(failure_threshold=3, cooldown_seconds=30)
+        
+        assert breaker.record_failure() is False
+        assert breaker.record_failure() is False
+        assert breaker.state == 'closed' and breaker.allow()
+        assert breaker.record_failure() is True
+        assert breaker.state == 'open'
+        assert not breaker.allow()
+    
+    def test_success_resets_the_count(self, clock):
+        breaker = resilience.CircuitBreaker(failure_threshold=2, cooldown_seconds=30)
+        
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        assert breaker.state == 'closed'
+    
+    def test_one_trial_after_the_cooldown(self, clock):
+        breaker = resilience.CircuitBreaker(failure_threshold=1, cooldown_seconds=30)
+        breaker.record_failure()
+        
+        clock.now += 29
+        assert not breaker.allow()
+        clock.now += 1
+        assert breaker.state == 'half_open'
+        assert breaker.allow()
+        # Only one trial at a time
+        assert not breaker.allow()
+    
+    def test_successful_trial_closes(self, clock):
+        breaker = resilience.CircuitBreaker(failure_threshold=1, cooldown_seconds=30)
+        breaker.record_failure()
+        clock.now += 30
+        breaker.allow()
+        
+        breaker.record_success()
+        assert breaker.state == 'closed' and breaker.allow()
+    
+    def test_failed_trial_reopens_for_another_cooldown(self, clock):
+        breaker = resilience.CircuitBreaker(failure_threshold=5, cooldown_seconds=30)
+        for _ in range(5):
+            breaker.record_failure()
+        clock.now += 30
+        breaker.allow()
+        
+        assert breaker.record_failure() is False  # it was already open
+        assert breaker.state == 'open'
+        clock.now += 30
+        assert breaker.allow()
+    
+    def test_released_trial_lets_the_next_one_through(self, clock):
+        breaker = resilience.CircuitBreaker(failure_threshold=1, cooldown_seconds=30)
+        breaker.record_failure()
+        clock.now += 30
+        breaker.allow()
+        
+        breaker.release()
+        assert breaker.state == 'half_open'
+        assert breaker.allow()
+    
+    def test_open_circuit_fails_fast(self, clock):
+        dependency = resilience.Dependency('test-circuit', max_retries=0)
+        dependency.circuit = resilience.CircuitBreaker(failure_threshold=1, cooldown_seconds=30)
+        with pytest.raises(resilience.DependencyUnavailable):
+            dependency.call(failing(ClientError('ServiceUnavailable', status=503)))
+        
+        fn = failing()
+        with pytest.raises(resilience.CircuitOpen):
+            dependency.call(fn)
+        assert fn.calls == 0
+
+
+class TestAdaptiveLimiter:
+    def test_acquire_stops_at_the_limit(self):
+        limiter = resilience.AdaptiveLimiter('test', max_limit=2)
+        
+        tokens = [limiter.acquire(), limiter.acquire()]
+        assert None not in tokens
+        assert limiter.acquire() is None
+        limiter.release(tokens[0])
+        assert limiter.acquire() is not None
+    
+    def test_throttles_halve_the_limit_once_per_round(self):
+        watched = types.SimpleNamespace(throttles=0)
+        limiter = resilience.AdaptiveLimiter('test', max_limit=8, dependencies=[watched])
+        tokens = [limiter.acquire() for _ in range(4)]
+        
+        watched.throttles += 1
+        assert limiter.release(tokens[0]) is True
+        assert limiter.limit == 4
+        # Started before the cut - its throttles were already counted
+        watched.throttles += 1
+        assert limiter.release(tokens[1]) is False
+        assert limiter.limit == 4
+    
+    def test_limit_grows_by_one_per_round(self):
+        watched = types.SimpleNamespace(throttles=0)
+        limiter = resilience.AdaptiveLimiter('test', max_limit=8, dependencies=[watched])
+        watched.throttles += 1
+        limiter.release(limiter.acquire())
+        assert limiter.limit == 4
+        
+        for _ in range(4):
+            limiter.release(limiter.acquire())
+        assert limiter.limit == pytest.approx(5, abs=0.1)
+    
+    def test_limit_stays_within_bounds(self):
+        watched = types.SimpleNamespace(throttles=0)
+        limiter = resilience.AdaptiveLimiter('test', max_limit=2, min_limit=1, dependencies=[watched])
+        for _ in range(5):
+            watched.throttles += 1
+            limiter.release(limiter.acquire())
+        assert limiter.limit == 1
+        
+        for _ in range(20):
+            limiter.release(limiter.acquire())
+        assert limiter.limit == 2
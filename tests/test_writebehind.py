@@ -0,0 +1,155 @@
+# tests/test_writebehind.py
+import queue
+import time
+import types
+
+import pytest
+
+from threadher_common import writebehind
+
+
+class FakeDynamoDB:
+    """A dynamodb resource whose client answers batch_write_item from a list of responses"""
+    
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+        self.meta = types.SimpleNamespace(client=self)
+    
+    def batch_write_item(self, RequestItems):
+        self.requests.append(RequestItems)
+        response = self.responses.pop(0) if self.responses else {}
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class ClientError(Exception):
+    def __init__(self, code, status=400):
+        super().__init__(code)
+        self.response = {'Error': {'Code': code}, 'ResponseMetadata': {'HTTPStatusCode': status}}
+
+
+@pytest.fixture(autouse=True)
+def isolated(monkeypatch):
+    """A queue of our own (no worker drains it), retries requeued at once and fresh stats"""
+    monkeypatch.setattr(writebehind, '_queue', queue.Queue())
+    monkeypatch.setattr(writebehind, 'stats', dict.fromkeys(writebehind.stats, 0))
+    monkeypatch.setattr(writebehind, '_later', lambda delay_seconds, fn, *args: fn(*args))
+
+
+def pending(dynamodb, calculation_id, table_name='Calculations', **fields):
+    return writebehind._Pending(dynamodb, table_name, dict(fields, calculation_id=calculation_id), ('calculation_id',), None)
+
+
+def requeued():
+    items = []
+    while not writebehind._queue.empty():
+        items.append(writebehind._queue.get_nowait())
+    return items
+
+
+def test_batch_is_one_request_across_tables():
+    dynamodb = FakeDynamoDB()
+    writebehind._write([pending(dynamodb, 'a'), pending(dynamodb, 'b'), pending(dynamodb, 'c', table_name='Other')])
+    
+    assert len(dynamodb.requests) == 1
+    assert {table: len(requests) for table, requests in dynamodb.requests[0].items()} == {'Calculations': 2, 'Other': 1}
+    assert writebehind.stats['written'] == 3
+    assert requeued() == []
+
+
+def test_last_item_per_key_wins():
+    dynamodb = FakeDynamoDB()
+    writebehind._write([pending(dynamodb, 'a', version=1), pending(dynamodb, 'a', version=2)])
+    
+    assert dynamodb.requests[0]['Calculations'] == [{'PutRequest': {'Item': {'calculation_id': 'a', 'version': 2}}}]
+
+
+def test_unprocessed_items_are_requeued():
+    dynamodb = FakeDynamoDB({'UnprocessedItems': {
+        'Calculations': [{'PutRequest': {'Item': {'calculation_id': 'b'}}}]
+    }})
+    batch = [pending(dynamodb, 'a'), pending(dynamodb, 'b'), pending(dynamodb, 'c')]
+    writebehind._write(batch)
+    
+    again = requeued()
+    assert again == [batch[1]]
+    assert again[0].attempts == 1
+    assert writebehind.stats['written'] == 2
+    assert writebehind.stats['retried'] == 1
+
+
+def test_items_are_prepared_once():
+    prepared = []
+    
+    def prepare(item):
+        prepared.append(item['calculation_id'])
+        return dict(item, prepared=True)
+    
+    dynamodb = FakeDynamoDB({'UnprocessedItems': {'Calculations': [{'PutRequest': {'Item': {'calculation_id': 'a', 'prepared': True}}}]}})
+    item = writebehind._Pending(dynamodb, 'Calculations', {'calculation_id': 'a'}, ('calculation_id',), prepare)
+    writebehind._write([item])
+    writebehind._write(requeued())
+    
+    assert prepared == ['a']
+    assert dynamodb.requests[1]['Calculations'] == [{'PutRequest': {'Item': {'calculation_id': 'a', 'prepared': True}}}]
+
+
+def test_items_are_dropped_after_max_attempts():
+    dynamodb = FakeDynamoDB({'UnprocessedItems': {'Calculations': [{'PutRequest': {'Item': {'calculation_id': 'a'}}}]}})
+    item = pending(dynamodb, 'a')
+    item.attempts = writebehind.MAX_ATTEMPTS - 1
+    writebehind._write([item])
+    
+    assert requeued() == []
+    assert writebehind.stats['dropped'] == 1
+
+
+def test_throttled_batch_is_requeued():
+    dynamodb = FakeDynamoDB(ClientError('ProvisionedThroughputExceededException'))
+    batch = [pending(dynamodb, 'a'), pending(dynamodb, 'b')]
+    writebehind._write(batch)
+    
+    assert requeued() == batch
+    assert writebehind.stats['written'] == 0
+
+
+def test_rejected_batch_is_dropped():
+    dynamodb = FakeDynamoDB(ClientError('ValidationException'))
+    writebehind._write([pending(dynamodb, 'a'), pending(dynamodb, 'b')])
+    
+    assert requeued() == []
+    assert writebehind.stats['dropped'] == 2
+
+
+def test_put_writes_inline_when_disabled(monkeypatch):
+    monkeypatch.setattr(writebehind, 'WRITE_BEHIND_ENABLED', False)
+    stored = []
+    table = types.SimpleNamespace(put_item=lambda Item: stored.append(Item))
+    dynamodb = types.SimpleNamespace(Table=lambda name: table)
+    
+    writebehind.put(dynamodb, 'Calculations', {'calculation_id': 'a', 'kg': 1.5}, ('calculation_id',), prepare=lambda item: dict(item, kg='1.5'))
+    
+    assert stored == [{'calculation_id': 'a', 'kg': '1.5'}]
+    assert requeued() == []
+
+
+def test_invocation_end_waits_for_one_attempt_only(monkeypatch):
+    """Throttled records stay queued for a later invocation - the response doesn't wait out the backoff"""
+    monkeypatch.setattr(writebehind, '_worker', None)
+    monkeypatch.setattr(writebehind, '_unattempted', 0)
+    backoffs = []
+    monkeypatch.setattr(writebehind, '_later', lambda delay_seconds, fn, *args: backoffs.append(args))
+    dynamodb = FakeDynamoDB(ClientError('ProvisionedThroughputExceededException'))
+    
+    writebehind.put(dynamodb, 'Calculations', {'calculation_id': 'a'}, ('calculation_id',))
+    writebehind.put(dynamodb, 'Calculations', {'calculation_id': 'b'}, ('calculation_id',))
+    started = time.perf_counter()
+    writebehind.flush_before_freeze()
+    
+    assert time.perf_counter() - started < writebehind.FLUSH_MS / 1000 + 0.5
+    assert len(dynamodb.requests) == 1
+    assert writebehind._unattempted == 0
+    (retry,) = backoffs
+    assert [pending.item['calculation_id'] for pending in retry[0]] == ['a', 'b']